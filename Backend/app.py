@@ -1,21 +1,64 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for, send_file
-from db import get_connection
-from datetime import datetime
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, send_file, Response, stream_with_context
+from db import get_connection, get_pool, get_query_stats, reset_query_stats, query_stats
+from attendance_stats import get_student_stats, get_teacher_stats as load_teacher_stats, record_absence
+from attendance_export import (OPENPYXL_AVAILABLE, XLSX_MIMETYPE, build_xlsx, fetch_report_info, iter_csv,
+                               iter_report_rows, report_filename)
+from response_cache import response_cache
+from datetime import date, datetime
+import base64
+import hmac
+import json
 import os
-from io import BytesIO
+import unicodedata
+from urllib.parse import quote
 
-# Cấu hình thư viện xuất Excel (Bắt buộc cài đặt: pip install openpyxl)
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
+# Xuất Excel cần thư viện openpyxl (pip install openpyxl); CSV không cần
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 # LƯU Ý: Đổi chuỗi này thành mã bí mật ngẫu nhiên để bảo mật session
 app.secret_key = 'your-super-secret-key-change-this'
+# /metrics yêu cầu header X-Metrics-Token hoặc ?token= bằng METRICS_TOKEN; chưa đặt token thì chỉ xem được
+# từ localhost. POST /metrics/reset luôn yêu cầu token.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Phân trang lịch sử điểm danh / lịch dạy: ?limit= (mặc định PAGE_SIZE, tối đa PAGE_SIZE_MAX) &cursor=
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '20'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '100'))
+
+
+def _page_limit():
+    limit = request.args.get('limit', type=int) or PAGE_SIZE
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def _encode_cursor(value, key):
+    """Cursor (chuỗi mờ) chứa giá trị sắp xếp (ngày giờ hoặc None) và khóa của dòng cuối trang"""
+    raw = json.dumps([value.isoformat() if value is not None else None, key])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, parse):
+    """(giá trị đã parse bằng `parse` hoặc None, khóa) trong cursor; ValueError nếu cursor không hợp lệ"""
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode()))
+        if not isinstance(key, str) or not (value is None or isinstance(value, str)):
+            raise ValueError
+        return (parse(value) if value is not None else None), key
+    except Exception:
+        raise ValueError('Cursor không hợp lệ')
+
+
+def _keyset_after(sort_column, key_column, after):
+    """
+    Điều kiện "đứng sau dòng cuối trang trước" khi sắp xếp `sort_column DESC, key_column DESC`
+    (SQL Server và SQLite đều xếp NULL cuối cùng khi DESC). Trả về (đoạn SQL bắt đầu bằng AND, tham số).
+    """
+    if after is None:
+        return "", ()
+    value, key = after
+    if value is None:
+        return f" AND {sort_column} IS NULL AND {key_column} < ?", (key,)
+    return (f" AND ({sort_column} < ? OR ({sort_column} = ? AND {key_column} < ?) OR {sort_column} IS NULL)",
+            (value, value, key))
 
 
 # ==========================================
@@ -130,19 +173,8 @@ def dashboard():
     try:
         conn = get_connection()
         if conn:
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT COUNT(DISTINCT MaLichHoc) FROM LichHoc_SinhVien WHERE MaSinhVien = ?",
-                           (ma_sinh_vien,))
-            stats['total'] = cursor.fetchone()[0] or 0
-
-            cursor.execute("SELECT COUNT(*) FROM DiemDanh WHERE MaSinhVien = ? AND TrangThai = N'Có mặt'",
-                           (ma_sinh_vien,))
-            stats['present'] = cursor.fetchone()[0] or 0
-
-            cursor.execute("SELECT COUNT(*) FROM DiemDanh WHERE MaSinhVien = ? AND TrangThai = N'Vắng mặt'",
-                           (ma_sinh_vien,))
-            stats['absent'] = cursor.fetchone()[0] or 0
+            # Đọc một dòng tổng hợp (attendance_stats) thay vì đếm lại toàn bộ lịch sử điểm danh
+            stats.update(get_student_stats(conn, ma_sinh_vien))
 
             if stats['total'] > 0:
                 stats['rate'] = round((stats['present'] / stats['total']) * 100, 1)
@@ -203,12 +235,26 @@ def update_student_info(ma_sinh_vien):
 
 @app.route('/student/schedule/<ma_sinh_vien>', methods=['GET'])
 def get_student_schedule(ma_sinh_vien):
+    """
+    Lịch học của sinh viên (theo lớp + đăng ký riêng). Cache kèm số dòng LichHoc_SinhVien của sinh viên:
+    tiến trình điểm danh ghi danh sinh viên vào buổi học thì số này đổi và cache được tính lại ngay.
+    Số này không đổi khi sinh viên chuyển lớp (SinhVien.MaLop) hay lớp có thêm buổi LichHoc mới,
+    nên các thay đổi đó chỉ hiện ra sau khi cache hết hạn (RESPONSE_CACHE_TTL).
+    """
+    clean_ma_sv = str(ma_sinh_vien).strip()
+    cache_key = ('student_schedule', clean_ma_sv)
+
     conn = None
     try:
-        clean_ma_sv = str(ma_sinh_vien).strip()
         conn = get_connection()
         cursor = conn.cursor()
 
+        cursor.execute("SELECT COUNT(*) FROM LichHoc_SinhVien WHERE MaSinhVien = ?", (clean_ma_sv,))
+        version = cursor.fetchone()[0]
+        cached = response_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return jsonify(cached[1])
+
         query = """
             SELECT DISTINCT
                 lh.MaLichHoc, 
@@ -251,7 +297,9 @@ def get_student_schedule(ma_sinh_vien):
             'phong': r[5]
         } for r in rows]
 
-        return jsonify({'status': 'success', 'schedules': schedule})
+        payload = {'status': 'success', 'schedules': schedule}
+        response_cache.set(cache_key, (version, payload))
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
     finally:
@@ -260,19 +308,34 @@ def get_student_schedule(ma_sinh_vien):
 
 @app.route('/student/attendance/<ma_sinh_vien>', methods=['GET'])
 def get_student_attendance(ma_sinh_vien):
+    """
+    Lịch sử điểm danh, mới nhất trước (chưa có thời gian xếp cuối), theo trang:
+    ?limit=20&cursor=<next_cursor của trang trước>. Keyset trên (ThoiGianDiemDanh, MaLichHoc) - mỗi sinh viên
+    có một bản ghi cho mỗi lịch học - nên trang nào cũng chỉ đọc limit + 1 dòng. Trang đầu kèm 'total'.
+    """
+    limit = _page_limit()
+    page_cursor = request.args.get('cursor')
+    try:
+        after = _decode_cursor(page_cursor, datetime.fromisoformat) if page_cursor else None
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT mh.TenMonHoc, dd.ThoiGianDiemDanh, dd.TrangThai, dd.GhiChu
+        after_sql, after_params = _keyset_after('dd.ThoiGianDiemDanh', 'dd.MaLichHoc', after)
+        cursor.execute(f"""
+            SELECT TOP {limit + 1} mh.TenMonHoc, dd.ThoiGianDiemDanh, dd.TrangThai, dd.GhiChu, dd.MaLichHoc
             FROM DiemDanh dd
             JOIN LichHoc lh ON dd.MaLichHoc = lh.MaLichHoc
             JOIN MonHoc mh ON lh.MaMonHoc = mh.MaMonHoc
-            WHERE dd.MaSinhVien = ?
-            ORDER BY dd.ThoiGianDiemDanh DESC
-        """, (ma_sinh_vien,))
+            WHERE dd.MaSinhVien = ?{after_sql}
+            ORDER BY dd.ThoiGianDiemDanh DESC, dd.MaLichHoc DESC
+        """, (ma_sinh_vien,) + after_params)
         rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
         data = [{
             'ten_mon_hoc': r[0],
@@ -280,7 +343,12 @@ def get_student_attendance(ma_sinh_vien):
             'trang_thai': r[2],
             'ghi_chu': r[3] if r[3] else ''
         } for r in rows]
-        return jsonify({'status': 'success', 'data': data})
+        payload = {'status': 'success', 'data': data, 'limit': limit,
+                   'next_cursor': _encode_cursor(rows[-1][1], rows[-1][4]) if has_more else None}
+        if after is None:
+            cursor.execute("SELECT COUNT(*) FROM DiemDanh WHERE MaSinhVien = ?", (ma_sinh_vien,))
+            payload['total'] = cursor.fetchone()[0]
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
     finally:
@@ -359,6 +427,7 @@ def update_attendance_note():
                 INSERT INTO DiemDanh (MaSinhVien, MaLichHoc, ThoiGianDiemDanh, TrangThai, GhiChu)
                 VALUES (?, ?, GETDATE(), N'Vắng mặt', ?)
             """, (ma_sv, ma_lh, ghi_chu))
+            record_absence(conn, ma_sv, ma_lh)
         else:
             cursor.execute("UPDATE DiemDanh SET GhiChu = ? WHERE MaSinhVien = ? AND MaLichHoc = ?",
                            (ghi_chu, ma_sv, ma_lh))
@@ -377,27 +446,8 @@ def get_teacher_stats(ma_giao_vien):
     conn = None
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT COUNT(DISTINCT MaLop) FROM LichDay WHERE MaGiaoVien = ?", (ma_giao_vien,))
-        total_classes = cursor.fetchone()[0] or 0
-
-        cursor.execute("SELECT COUNT(*) FROM LichDay WHERE MaGiaoVien = ?", (ma_giao_vien,))
-        total_sessions = cursor.fetchone()[0] or 0
-
-        cursor.execute("""
-            SELECT COUNT(*) FROM DiemDanh dd
-            JOIN LichHoc lh ON dd.MaLichHoc = lh.MaLichHoc
-            JOIN LichDay ld ON lh.MaLichDay = ld.MaLichDay
-            WHERE ld.MaGiaoVien = ? AND dd.TrangThai = N'Vắng mặt'
-        """, (ma_giao_vien,))
-        absent_records = cursor.fetchone()[0] or 0
-
-        return jsonify({'status': 'success', 'stats': {
-            'total_classes': total_classes,
-            'total_sessions': total_sessions,
-            'absent_records': absent_records
-        }})
+        # Một truy vấn: số lớp, số buổi dạy và số lượt vắng mặt từ bảng tổng hợp
+        return jsonify({'status': 'success', 'stats': load_teacher_stats(conn, ma_giao_vien)})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
     finally:
@@ -406,26 +456,46 @@ def get_teacher_stats(ma_giao_vien):
 
 @app.route('/teacher/classes/<ma_giao_vien>', methods=['GET'])
 def get_teacher_schedule_list(ma_giao_vien):
+    """
+    Lịch dạy, ngày gần nhất trước (chưa có ngày xếp cuối), theo trang: ?limit=20&cursor=<next_cursor của
+    trang trước>. Keyset trên (NgayDay, MaLichDay); trang đầu kèm 'total'.
+    """
+    limit = _page_limit()
+    page_cursor = request.args.get('cursor')
+    try:
+        after = _decode_cursor(page_cursor, date.fromisoformat) if page_cursor else None
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    cache_key = ('teacher_classes', ma_giao_vien, page_cursor, limit)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
 
-        query = """
-            SELECT 
+        after_sql, after_params = _keyset_after('ld.NgayDay', 'ld.MaLichDay', after)
+        query = f"""
+            SELECT TOP {limit + 1}
                 ISNULL(mh.TenMonHoc, N'Môn chưa định nghĩa') as TenMonHoc, 
                 ISNULL(l.TenLop, N'Lớp chưa định nghĩa') as TenLop, 
                 ld.NgayDay, 
                 ld.GioBatDau, 
-                ld.GioKetThuc
+                ld.GioKetThuc,
+                ld.MaLichDay
             FROM LichDay ld
             LEFT JOIN MonHoc mh ON ld.MaMonHoc = mh.MaMonHoc
             LEFT JOIN Lop l ON ld.MaLop = l.MaLop
-            WHERE ld.MaGiaoVien = ?
-            ORDER BY ld.NgayDay DESC
+            WHERE ld.MaGiaoVien = ?{after_sql}
+            ORDER BY ld.NgayDay DESC, ld.MaLichDay DESC
         """
-        cursor.execute(query, (ma_giao_vien,))
+        cursor.execute(query, (ma_giao_vien,) + after_params)
         rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
         classes = [{
             'ten_mon_hoc': r[0],
@@ -434,7 +504,13 @@ def get_teacher_schedule_list(ma_giao_vien):
             'gio_bat_dau': str(r[3])[:5] if r[3] else '',
             'gio_ket_thuc': str(r[4])[:5] if r[4] else ''
         } for r in rows]
-        return jsonify({'status': 'success', 'classes': classes})
+        payload = {'status': 'success', 'classes': classes, 'limit': limit,
+                   'next_cursor': _encode_cursor(rows[-1][2], rows[-1][5]) if has_more else None}
+        if after is None:
+            cursor.execute("SELECT COUNT(*) FROM LichDay WHERE MaGiaoVien = ?", (ma_giao_vien,))
+            payload['total'] = cursor.fetchone()[0]
+        response_cache.set(cache_key, payload)
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
     finally:
@@ -476,6 +552,11 @@ def get_teacher_absences(ma_giao_vien):
 
 @app.route('/api/teacher/classes-for-report/<ma_giao_vien>', methods=['GET'])
 def get_classes_for_report(ma_giao_vien):
+    cache_key = ('classes_for_report', ma_giao_vien)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
     conn = None
     try:
         conn = get_connection()
@@ -498,7 +579,9 @@ def get_classes_for_report(ma_giao_vien):
             'ten_mon_hoc': r[2],
             'ten_lop': r[3]
         } for r in rows]
-        return jsonify({'status': 'success', 'classes': classes})
+        payload = {'status': 'success', 'classes': classes}
+        response_cache.set(cache_key, payload)
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
     finally:
@@ -552,10 +635,27 @@ def get_attendance_report_detail(ma_lich_hoc):
         if conn: conn.close()
 
 
-# --- SỬA LỖI EXCEL: ÁP DỤNG CÂU QUERY "UNION" GIỐNG HỆT WEB ---
+# --- XUẤT BÁO CÁO ĐIỂM DANH (Excel mặc định, ?format=csv cho CSV) ---
+def _attachment_headers(filename):
+    """Content-Disposition có tên file tiếng Việt (RFC 5987) kèm tên ASCII dự phòng"""
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    return {'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"}
+
+
+def _close_after(body, conn):
+    """Đóng kết nối khi đã gửi xong (hoặc client ngắt) phần thân sinh từ cursor"""
+    try:
+        yield from body
+    finally:
+        conn.close()
+
+
 @app.route('/api/teacher/export-attendance/<ma_lich_hoc>', methods=['GET'])
 def export_attendance_excel(ma_lich_hoc):
-    if not OPENPYXL_AVAILABLE:
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in ('xlsx', 'csv'):
+        return "Định dạng không hỗ trợ (xlsx hoặc csv)", 400
+    if export_format == 'xlsx' and not OPENPYXL_AVAILABLE:
         return "Server chưa cài thư viện openpyxl. Vui lòng chạy: pip install openpyxl", 500
 
     conn = None
@@ -563,92 +663,22 @@ def export_attendance_excel(ma_lich_hoc):
         conn = get_connection()
         cursor = conn.cursor()
 
-        # Lấy thông tin Header
-        cursor.execute("""
-            SELECT mh.TenMonHoc, l.TenLop, lh.NgayHoc 
-            FROM LichHoc lh 
-            JOIN LichDay ld ON lh.MaLichDay = ld.MaLichDay 
-            JOIN MonHoc mh ON ld.MaMonHoc = mh.MaMonHoc 
-            JOIN Lop l ON ld.MaLop = l.MaLop
-            WHERE lh.MaLichHoc = ?
-        """, (ma_lich_hoc,))
-        info = cursor.fetchone()
-
+        info = fetch_report_info(cursor, ma_lich_hoc)
         if not info:
             return "Không tìm thấy thông tin buổi học", 404
+        rows = iter_report_rows(cursor, ma_lich_hoc)
 
-        ten_mon, ten_lop, ngay_hoc = info[0], info[1], info[2].strftime('%d/%m/%Y')
-
-        # === FIX LỖI TẠI ĐÂY ===
-        # Sử dụng UNION để lấy đủ cả 2 loại sinh viên (như trên Web)
-        # 1. Sinh viên theo Lớp
-        # 2. Sinh viên đăng ký riêng (LichHoc_SinhVien)
-        query_data = """
-            SELECT sv.MaSinhVien, sv.HoTen, sv.MaLop, ISNULL(dd.TrangThai, N'Chưa điểm danh'), ISNULL(dd.GhiChu, '')
-            FROM SinhVien sv 
-            JOIN LichDay ld ON sv.MaLop = ld.MaLop 
-            JOIN LichHoc lh ON ld.MaLichDay = lh.MaLichDay
-            LEFT JOIN DiemDanh dd ON sv.MaSinhVien = dd.MaSinhVien AND dd.MaLichHoc = lh.MaLichHoc
-            WHERE lh.MaLichHoc = ?
-
-            UNION
+        if export_format == 'csv':
+            # CSV gửi dần trong lúc đọc cursor: kết nối được đóng khi gửi xong
+            body = _close_after(iter_csv(info, rows), conn)
+            conn = None
+            return Response(stream_with_context(body), mimetype='text/csv',
+                            headers=_attachment_headers(report_filename(info, 'csv')))
 
-            SELECT sv.MaSinhVien, sv.HoTen, sv.MaLop, ISNULL(dd.TrangThai, N'Chưa điểm danh'), ISNULL(dd.GhiChu, '')
-            FROM LichHoc_SinhVien lhs
-            JOIN SinhVien sv ON lhs.MaSinhVien = sv.MaSinhVien
-            LEFT JOIN DiemDanh dd ON sv.MaSinhVien = dd.MaSinhVien AND dd.MaLichHoc = lhs.MaLichHoc
-            WHERE lhs.MaLichHoc = ?
-        """
-        # Lưu ý: Cần truyền tham số 2 lần cho 2 dấu ?
-        cursor.execute(query_data, (ma_lich_hoc, ma_lich_hoc))
-        students = cursor.fetchall()
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Diem Danh"
-
-        ws['A1'] = "BÁO CÁO ĐIỂM DANH"
-        ws['A1'].font = Font(bold=True, size=14)
-        ws.merge_cells('A1:F1')
-        ws['A1'].alignment = Alignment(horizontal='center')
-
-        ws['A2'] = f"Môn học: {ten_mon} - Lớp: {ten_lop}"
-        ws.merge_cells('A2:F2')
-        ws['A2'].alignment = Alignment(horizontal='center')
-
-        ws['A3'] = f"Ngày học: {ngay_hoc}"
-        ws.merge_cells('A3:F3')
-        ws['A3'].alignment = Alignment(horizontal='center')
-
-        headers = ['STT', 'Mã SV', 'Họ và Tên', 'Lớp', 'Trạng Thái', 'Ghi Chú']
-        ws.append([])
-        ws.append(headers)
-
-        for cell in ws[5]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCE5FF", end_color="CCE5FF", fill_type="solid")
-            cell.alignment = Alignment(horizontal='center')
-
-        for idx, sv in enumerate(students, 1):
-            ws.append([idx, sv[0], sv[1], sv[2], sv[3], sv[4]])
-            status_cell = ws.cell(row=5 + idx, column=5)
-            if sv[3] == 'Có mặt':
-                status_cell.fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-            elif sv[3] == 'Vắng mặt':
-                status_cell.fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 25
-        ws.column_dimensions['E'].width = 15
-        ws.column_dimensions['F'].width = 30
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        filename = f"DiemDanh_{ten_lop}_{ngay_hoc.replace('/', '')}.xlsx"
-        return send_file(output, download_name=filename, as_attachment=True,
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        # Excel ghi ra file tạm bằng workbook write-only rồi gửi theo từng khối
+        output = build_xlsx(info, rows)
+        return send_file(output, download_name=report_filename(info, 'xlsx'), as_attachment=True,
+                         mimetype=XLSX_MIMETYPE)
 
     except Exception as e:
         print(f"Excel Error: {e}")
@@ -657,5 +687,47 @@ def export_attendance_excel(ma_lich_hoc):
         if conn: conn.close()
 
 
+# ==========================================
+# 4. MONITORING (THỐNG KÊ TRUY VẤN DATABASE)
+# ==========================================
+
+def _metrics_allowed(require_token=False):
+    if not METRICS_TOKEN:
+        return not require_token and request.remote_addr in ('127.0.0.1', '::1')
+    token = request.headers.get('X-Metrics-Token') or request.args.get('token') or ''
+    return hmac.compare_digest(token, METRICS_TOKEN)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Thống kê theo từng câu lệnh SQL đã chuẩn hóa (số lần gọi, số dòng, độ trễ, histogram)
+    và cache response (hit/miss theo endpoint)
+    Tham số: ?sort=total_ms|avg_ms|max_ms|calls|rows  &limit=20
+    """
+    if not _metrics_allowed():
+        return jsonify({'status': 'error', 'message': 'Không có quyền truy cập'}), 403
+
+    sort_by = request.args.get('sort', 'total_ms')
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        'status': 'success',
+        'pool': get_pool().stats(),
+        'slow_query_ms': query_stats.slow_query_ms,
+        'slow_queries': query_stats.slow_count,
+        'response_cache': response_cache.stats(),
+        'queries': get_query_stats(sort_by, limit)
+    })
+
+
+@app.route('/metrics/reset', methods=['POST'])
+def reset_metrics():
+    if not _metrics_allowed(require_token=True):
+        return jsonify({'status': 'error', 'message': 'Không có quyền truy cập'}), 403
+    reset_query_stats()
+    response_cache.reset_stats()
+    return jsonify({'status': 'success', 'message': 'Đã xóa thống kê truy vấn'})
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
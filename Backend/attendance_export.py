@@ -0,0 +1,260 @@
+"""
+Xuất báo cáo điểm danh của một buổi học ra Excel (.xlsx) hoặc CSV mà không giữ cả báo cáo trong bộ nhớ.
+
+- Excel: openpyxl chế độ write-only, mỗi dòng được ghi ra file tạm ngay khi append; định dạng dùng chung
+  qua NamedStyle nên mỗi ô chỉ tham chiếu tên style thay vì tạo Font/PatternFill riêng. File hoàn chỉnh
+  rồi mới gửi theo từng khối, nhờ vậy lỗi truy vấn vẫn trả về mã lỗi bình thường.
+- CSV: sinh trực tiếp từ cursor (fetchmany) trong lúc gửi, có BOM UTF-8 để Excel đọc đúng tiếng Việt.
+
+So sánh thời gian và bộ nhớ đỉnh với cách cũ (Workbook đầy đủ trong bộ nhớ, style từng ô, lưu vào BytesIO):
+    python attendance_export.py --rows 5000,50000
+"""
+import argparse
+import csv
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+EXPORT_FETCH_ROWS = int(os.getenv('EXPORT_FETCH_ROWS', '1000'))   # số dòng mỗi lần fetchmany
+CSV_FLUSH_ROWS = 500                                               # số dòng CSV mỗi khối gửi đi
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+HEADERS = ['STT', 'Mã SV', 'Họ và Tên', 'Lớp', 'Trạng Thái', 'Ghi Chú']
+COLUMN_WIDTHS = {'B': 15, 'C': 25, 'E': 15, 'F': 30}
+
+SQL_REPORT_INFO = """
+    SELECT mh.TenMonHoc, l.TenLop, lh.NgayHoc
+    FROM LichHoc lh
+    JOIN LichDay ld ON lh.MaLichDay = ld.MaLichDay
+    JOIN MonHoc mh ON ld.MaMonHoc = mh.MaMonHoc
+    JOIN Lop l ON ld.MaLop = l.MaLop
+    WHERE lh.MaLichHoc = ?
+"""
+
+# UNION để lấy đủ cả 2 loại sinh viên (như trên Web): theo Lớp và đăng ký riêng (LichHoc_SinhVien)
+SQL_REPORT_ROWS = """
+    SELECT sv.MaSinhVien, sv.HoTen, sv.MaLop, ISNULL(dd.TrangThai, N'Chưa điểm danh'), ISNULL(dd.GhiChu, '')
+    FROM SinhVien sv
+    JOIN LichDay ld ON sv.MaLop = ld.MaLop
+    JOIN LichHoc lh ON ld.MaLichDay = lh.MaLichDay
+    LEFT JOIN DiemDanh dd ON sv.MaSinhVien = dd.MaSinhVien AND dd.MaLichHoc = lh.MaLichHoc
+    WHERE lh.MaLichHoc = ?
+
+    UNION
+
+    SELECT sv.MaSinhVien, sv.HoTen, sv.MaLop, ISNULL(dd.TrangThai, N'Chưa điểm danh'), ISNULL(dd.GhiChu, '')
+    FROM LichHoc_SinhVien lhs
+    JOIN SinhVien sv ON lhs.MaSinhVien = sv.MaSinhVien
+    LEFT JOIN DiemDanh dd ON sv.MaSinhVien = dd.MaSinhVien AND dd.MaLichHoc = lhs.MaLichHoc
+    WHERE lhs.MaLichHoc = ?
+"""
+
+# Tên style -> thuộc tính; trạng thái điểm danh -> style của ô Trạng Thái
+STYLE_SPECS = {
+    'bc_tieu_de': {'font': {'bold': True, 'size': 14}, 'align': 'center'},
+    'bc_thong_tin': {'align': 'center'},
+    'bc_cot': {'font': {'bold': True}, 'fill': 'CCE5FF', 'align': 'center'},
+    'bc_co_mat': {'fill': 'C6EFCE'},
+    'bc_vang_mat': {'fill': 'FFC7CE'},
+}
+STATUS_STYLES = {'Có mặt': 'bc_co_mat', 'Vắng mặt': 'bc_vang_mat'}
+
+
+def fetch_report_info(cursor, ma_lich_hoc):
+    """(TenMonHoc, TenLop, NgayHoc dd/mm/yyyy) của buổi học hoặc None"""
+    cursor.execute(SQL_REPORT_INFO, (ma_lich_hoc,))
+    info = cursor.fetchone()
+    if not info:
+        return None
+    return info[0], info[1], info[2].strftime('%d/%m/%Y')
+
+
+def iter_report_rows(cursor, ma_lich_hoc, batch=EXPORT_FETCH_ROWS):
+    """Các dòng (MaSinhVien, HoTen, MaLop, TrangThai, GhiChu), đọc từ cursor theo từng lô"""
+    cursor.execute(SQL_REPORT_ROWS, (ma_lich_hoc, ma_lich_hoc))
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            return
+        yield from rows
+
+
+def report_filename(info, extension):
+    _, ten_lop, ngay_hoc = info
+    return f"DiemDanh_{ten_lop}_{ngay_hoc.replace('/', '')}.{extension}"
+
+
+def _title_lines(info):
+    ten_mon, ten_lop, ngay_hoc = info
+    return ["BÁO CÁO ĐIỂM DANH", f"Môn học: {ten_mon} - Lớp: {ten_lop}", f"Ngày học: {ngay_hoc}"]
+
+
+def _register_styles(wb):
+    for name, spec in STYLE_SPECS.items():
+        style = NamedStyle(name=name)
+        if 'font' in spec:
+            style.font = Font(**spec['font'])
+        if 'fill' in spec:
+            style.fill = PatternFill(start_color=spec['fill'], end_color=spec['fill'], fill_type='solid')
+        if 'align' in spec:
+            style.alignment = Alignment(horizontal=spec['align'])
+        wb.add_named_style(style)
+
+
+def _styled(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def write_xlsx(info, rows, fileobj):
+    """Ghi báo cáo ra `fileobj` bằng workbook write-only; trả về số sinh viên"""
+    wb = Workbook(write_only=True)
+    _register_styles(wb)
+    ws = wb.create_sheet("Diem Danh")
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width  # phải đặt trước khi ghi dòng đầu tiên
+
+    for line_no, line in enumerate(_title_lines(info), 1):
+        ws.append([_styled(ws, line, 'bc_tieu_de' if line_no == 1 else 'bc_thong_tin')])
+        ws.merged_cells.add(f"A{line_no}:F{line_no}")
+    ws.append([])
+    ws.append([_styled(ws, header, 'bc_cot') for header in HEADERS])
+
+    count = 0
+    for count, sv in enumerate(rows, 1):
+        status = STATUS_STYLES.get(sv[3])
+        ws.append([count, sv[0], sv[1], sv[2], _styled(ws, sv[3], status) if status else sv[3], sv[4]])
+    wb.save(fileobj)
+    return count
+
+
+def build_xlsx(info, rows):
+    """File tạm (đã về đầu file) chứa báo cáo .xlsx; file tự xóa khi đóng"""
+    output = tempfile.TemporaryFile()
+    try:
+        write_xlsx(info, rows, output)
+        output.seek(0)
+        return output
+    except Exception:
+        output.close()
+        raise
+
+
+def iter_csv(info, rows, flush_rows=CSV_FLUSH_ROWS):
+    """Các khối bytes của báo cáo CSV (UTF-8 có BOM), sinh dần theo `rows`"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    for line in _title_lines(info):
+        writer.writerow([line])
+    writer.writerow([])
+    writer.writerow(HEADERS)
+    for idx, sv in enumerate(rows, 1):
+        writer.writerow([idx, sv[0], sv[1], sv[2], sv[3], sv[4]])
+        if idx % flush_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# ==========================================
+# ĐO HIỆU NĂNG (so với cách xuất cũ)
+# ==========================================
+
+def _legacy_xlsx(info, rows):
+    """Cách xuất cũ: Workbook đầy đủ trong bộ nhớ, tạo style cho từng ô, lưu vào BytesIO"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Diem Danh"
+    for line_no, line in enumerate(_title_lines(info), 1):
+        ws[f"A{line_no}"] = line
+        ws.merge_cells(f"A{line_no}:F{line_no}")
+        ws[f"A{line_no}"].alignment = Alignment(horizontal='center')
+    ws['A1'].font = Font(bold=True, size=14)
+    ws.append([])
+    ws.append(HEADERS)
+    for cell in ws[5]:
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCE5FF", end_color="CCE5FF", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center')
+    for idx, sv in enumerate(rows, 1):
+        ws.append([idx, sv[0], sv[1], sv[2], sv[3], sv[4]])
+        status_cell = ws.cell(row=5 + idx, column=5)
+        if sv[3] == 'Có mặt':
+            status_cell.fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+        elif sv[3] == 'Vắng mặt':
+            status_cell.fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def _synthetic_rows(n):
+    statuses = ['Có mặt', 'Có mặt', 'Có mặt', 'Vắng mặt', 'Chưa điểm danh']
+    for i in range(n):
+        note = 'Có phép' if i % 17 == 0 else ''
+        yield f"SV{i + 1:05d}", f"Nguyễn Văn Sinh Viên {i + 1}", f"L{i % 40 + 1:02d}", statuses[i % 5], note
+
+
+def _measure(fn, n):
+    """(giây đến byte đầu tiên, tổng giây, MB bộ nhớ đỉnh, KB kết quả); đo thời gian không bật tracemalloc"""
+    def run():
+        started = time.perf_counter()
+        first, size = None, 0
+        for chunk in fn(_synthetic_rows(n)):
+            first = time.perf_counter() - started if first is None else first
+            size += len(chunk)
+        return first, time.perf_counter() - started, size
+
+    first, total, size = run()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak / 1e6, size / 1e3
+
+
+def benchmark(sizes):
+    info = ("Công nghệ phần mềm", "Lớp ghép", "18/10/2026")
+
+    def legacy(rows):
+        yield _legacy_xlsx(info, rows)
+
+    def write_only(rows):
+        with build_xlsx(info, rows) as f:
+            yield from iter(lambda: f.read(64 * 1024), b'')
+
+    def as_csv(rows):
+        yield from iter_csv(info, rows)
+
+    print(f"{'dòng':>7} {'cách xuất':<18} {'byte đầu s':>10} {'tổng s':>8} {'RAM đỉnh MB':>11} {'KB':>8}")
+    for n in sizes:
+        for name, fn in (('xlsx cũ', legacy), ('xlsx write-only', write_only), ('csv', as_csv)):
+            first, total, peak, size = _measure(fn, n)
+            print(f"{n:>7} {name:<18} {first:>10.3f} {total:>8.3f} {peak:>11.1f} {size:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh cách xuất báo cáo điểm danh")
+    parser.add_argument("--rows", default="1000,10000,50000", help="Số sinh viên, cách nhau bởi dấu phẩy")
+    args = parser.parse_args()
+    if not OPENPYXL_AVAILABLE:
+        print("[ERROR] Chưa cài thư viện openpyxl. Vui lòng chạy: pip install openpyxl")
+    else:
+        benchmark([int(n) for n in args.rows.split(",") if n.strip()])
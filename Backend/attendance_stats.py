@@ -0,0 +1,289 @@
+"""
+Bảng tổng hợp số liệu điểm danh cho dashboard, cập nhật dần mỗi khi có ghi DiemDanh:
+
+    ThongKeSinhVien (MaSinhVien, SoLichHoc, SoCoMat, SoVangMat)
+    ThongKeGiaoVien (MaGiaoVien, SoVangMat)
+
+Dashboard chỉ đọc một dòng thay vì đếm lại toàn bộ lịch sử điểm danh. Các chỗ ghi DiemDanh /
+LichHoc_SinhVien (script điểm danh, service nhiều camera, route ghi chú vắng mặt) gọi record_*()
+trong cùng transaction với câu lệnh ghi. Các route đọc không bao giờ ghi: người chưa có dòng tổng hợp
+(vd sinh viên / giảng viên thêm sau lần tính lại gần nhất) được đếm trực tiếp từ dữ liệu gốc. Dòng mới được
+tạo trong rebuild_stats() và trong record_enrollment() (trước khi ghi danh toàn bộ sinh viên vào lịch học).
+
+Tạo bảng (SQL Server) và tính lại toàn bộ, ví dụ sau khi sửa DiemDanh bằng tay:
+    python attendance_stats.py
+
+Khi chưa có bảng, các hàm record_*() bỏ qua việc cập nhật; mỗi tiến trình kiểm tra lại sau
+STATS_RECHECK_SECONDS giây. Vì vậy sau khi tạo bảng lần đầu phải chạy lại lệnh trên một lần nữa khi mọi
+tiến trình đang chạy (web, điểm danh) đã nhận ra bảng (hoặc sau khi khởi động lại chúng): những lần ghi
+bị bỏ qua trước đó chỉ được tính khi tính lại toàn bộ. Tiến trình có ghi bị bỏ qua sẽ in cảnh báo khi
+nhận ra bảng.
+"""
+import os
+import time
+
+from db import current_backend, get_connection
+
+SCHEMA_SQL_SERVER = [
+    """
+    IF OBJECT_ID(N'dbo.ThongKeSinhVien', N'U') IS NULL
+    CREATE TABLE dbo.ThongKeSinhVien (
+        MaSinhVien  NVARCHAR(50) NOT NULL PRIMARY KEY,
+        SoLichHoc   INT NOT NULL DEFAULT 0,
+        SoCoMat     INT NOT NULL DEFAULT 0,
+        SoVangMat   INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    IF OBJECT_ID(N'dbo.ThongKeGiaoVien', N'U') IS NULL
+    CREATE TABLE dbo.ThongKeGiaoVien (
+        MaGiaoVien  NVARCHAR(50) NOT NULL PRIMARY KEY,
+        SoVangMat   INT NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+# Số liệu tính từ dữ liệu gốc (dùng khi khởi tạo một dòng tổng hợp hoặc tính lại toàn bộ)
+_SV_LICH_HOC = "(SELECT COUNT(DISTINCT lhs.MaLichHoc) FROM [dbo].[LichHoc_SinhVien] lhs WHERE lhs.MaSinhVien = {sv})"
+_SV_CO_MAT = "(SELECT COUNT(*) FROM [dbo].[DiemDanh] dd WHERE dd.MaSinhVien = {sv} AND dd.TrangThai = N'Có mặt')"
+_SV_VANG_MAT = "(SELECT COUNT(*) FROM [dbo].[DiemDanh] dd WHERE dd.MaSinhVien = {sv} AND dd.TrangThai = N'Vắng mặt')"
+_GV_VANG_MAT = (
+    "(SELECT COUNT(*) FROM [dbo].[DiemDanh] dd "
+    "JOIN [dbo].[LichHoc] lh ON dd.MaLichHoc = lh.MaLichHoc "
+    "JOIN [dbo].[LichDay] ld ON lh.MaLichDay = ld.MaLichDay "
+    "WHERE ld.MaGiaoVien = {gv} AND dd.TrangThai = N'Vắng mặt')"
+)
+
+# Giảng viên phụ trách một lịch học
+_GV_OF_LICH_HOC = (
+    "(SELECT ld.MaGiaoVien FROM [dbo].[LichHoc] lh "
+    "JOIN [dbo].[LichDay] ld ON lh.MaLichDay = ld.MaLichDay WHERE lh.MaLichHoc = ?)"
+)
+
+# Sinh viên của lịch học chưa có bản ghi điểm danh (đúng tập mà SQL_MARK_ABSENT sẽ ghi vắng mặt)
+_NOT_RECORDED = (
+    "SELECT lhs.MaSinhVien FROM [dbo].[LichHoc_SinhVien] lhs "
+    "WHERE lhs.MaLichHoc = ? AND NOT EXISTS (SELECT 1 FROM [dbo].[DiemDanh] dd "
+    "WHERE dd.MaLichHoc = lhs.MaLichHoc AND dd.MaSinhVien = lhs.MaSinhVien)"
+)
+
+SQL_STUDENT_STATS = (
+    "SELECT SoLichHoc, SoCoMat, SoVangMat FROM [dbo].[ThongKeSinhVien] WHERE MaSinhVien = ?"
+)
+# Khi chưa tạo bảng tổng hợp: vẫn một lượt truy vấn nhưng đếm trực tiếp
+SQL_STUDENT_STATS_DIRECT = (
+    f"SELECT {_SV_LICH_HOC.format(sv='?')}, {_SV_CO_MAT.format(sv='?')}, {_SV_VANG_MAT.format(sv='?')}"
+)
+# Tạo dòng cho các sinh viên chưa có, tính từ dữ liệu gốc
+SQL_INIT_MISSING_STUDENTS = (
+    "INSERT INTO [dbo].[ThongKeSinhVien] (MaSinhVien, SoLichHoc, SoCoMat, SoVangMat) "
+    f"SELECT sv.MaSinhVien, {_SV_LICH_HOC.format(sv='sv.MaSinhVien')}, "
+    f"{_SV_CO_MAT.format(sv='sv.MaSinhVien')}, {_SV_VANG_MAT.format(sv='sv.MaSinhVien')} "
+    "FROM [dbo].[SinhVien] sv "
+    "WHERE NOT EXISTS (SELECT 1 FROM [dbo].[ThongKeSinhVien] t WHERE t.MaSinhVien = sv.MaSinhVien)"
+)
+# Số lớp / số buổi dạy đếm trực tiếp trên LichDay (có index theo MaGiaoVien), số vắng mặt lấy từ bảng tổng hợp
+_TEACHER_STATS = (
+    "SELECT (SELECT COUNT(DISTINCT MaLop) FROM [dbo].[LichDay] WHERE MaGiaoVien = ?), "
+    "(SELECT COUNT(*) FROM [dbo].[LichDay] WHERE MaGiaoVien = ?), {absent}"
+)
+SQL_TEACHER_STATS = _TEACHER_STATS.format(
+    absent="(SELECT SoVangMat FROM [dbo].[ThongKeGiaoVien] WHERE MaGiaoVien = ?)"
+)
+SQL_TEACHER_STATS_DIRECT = _TEACHER_STATS.format(absent=_GV_VANG_MAT.format(gv='?'))
+SQL_INIT_MISSING_TEACHERS = (
+    "INSERT INTO [dbo].[ThongKeGiaoVien] (MaGiaoVien, SoVangMat) "
+    f"SELECT gv.MaGiaoVien, {_GV_VANG_MAT.format(gv='gv.MaGiaoVien')} FROM [dbo].[GiaoVien] gv "
+    "WHERE NOT EXISTS (SELECT 1 FROM [dbo].[ThongKeGiaoVien] t WHERE t.MaGiaoVien = gv.MaGiaoVien)"
+)
+
+SQL_ADD_PRESENT = "UPDATE [dbo].[ThongKeSinhVien] SET SoCoMat = SoCoMat + 1 WHERE MaSinhVien = ?"
+SQL_ADD_ABSENT = "UPDATE [dbo].[ThongKeSinhVien] SET SoVangMat = SoVangMat + 1 WHERE MaSinhVien = ?"
+SQL_ADD_TEACHER_ABSENT = (
+    f"UPDATE [dbo].[ThongKeGiaoVien] SET SoVangMat = SoVangMat + ? WHERE MaGiaoVien = {_GV_OF_LICH_HOC}"
+)
+SQL_ADD_SESSION_ABSENT = (
+    f"UPDATE [dbo].[ThongKeSinhVien] SET SoVangMat = SoVangMat + 1 WHERE MaSinhVien IN ({_NOT_RECORDED})"
+)
+SQL_ADD_SESSION_TEACHER_ABSENT = (
+    f"UPDATE [dbo].[ThongKeGiaoVien] SET SoVangMat = SoVangMat + (SELECT COUNT(*) FROM ({_NOT_RECORDED}) x) "
+    f"WHERE MaGiaoVien = {_GV_OF_LICH_HOC}"
+)
+# Sinh viên sắp được SQL_ENROLL_ALL thêm vào lịch học
+SQL_ADD_ENROLLMENT = (
+    "UPDATE [dbo].[ThongKeSinhVien] SET SoLichHoc = SoLichHoc + 1 "
+    "WHERE NOT EXISTS (SELECT 1 FROM [dbo].[LichHoc_SinhVien] lhs "
+    "WHERE lhs.MaLichHoc = ? AND lhs.MaSinhVien = ThongKeSinhVien.MaSinhVien)"
+)
+
+STATS_RECHECK_SECONDS = float(os.getenv('STATS_RECHECK_SECONDS', '60'))
+
+_available = None
+_checked_at = 0.0
+_skipped_writes = 0   # số lần record_*() bị bỏ qua vì chưa có bảng
+
+
+def stats_available(conn):
+    """
+    Bảng tổng hợp đã được tạo chưa. "Có" được nhớ cho cả tiến trình;
+    "chưa có" được kiểm tra lại sau STATS_RECHECK_SECONDS giây.
+    """
+    global _available, _checked_at, _skipped_writes
+    if _available or (_available is False and time.monotonic() - _checked_at < STATS_RECHECK_SECONDS):
+        return _available
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM [dbo].[ThongKeSinhVien] WHERE 1 = 0")
+        cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) FROM [dbo].[ThongKeGiaoVien] WHERE 1 = 0")
+        cursor.fetchone()
+        if _skipped_writes:
+            print(f"[WARNING] Bảng thống kê điểm danh vừa được tạo nhưng tiến trình này đã bỏ qua "
+                  f"{_skipped_writes} lần cập nhật: chạy lại attendance_stats.py để tính lại.")
+            _skipped_writes = 0
+        _available = True
+    except Exception as e:
+        if _available is None:
+            print(f"[WARNING] Chưa có bảng thống kê điểm danh, dashboard sẽ đếm trực tiếp "
+                  f"(chạy attendance_stats.py để tạo): {str(e)}")
+        _available = False
+    finally:
+        cursor.close()
+        _checked_at = time.monotonic()
+    return _available
+
+
+def _writable(conn):
+    global _skipped_writes
+    if stats_available(conn):
+        return True
+    _skipped_writes += 1
+    return False
+
+
+def _execute(conn, sql, params):
+    if not _writable(conn):
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+    finally:
+        cursor.close()
+
+
+def record_present(conn, ma_sinh_viens):
+    """Sau khi ghi các bản ghi "Có mặt". Không tự commit."""
+    if not ma_sinh_viens or not _writable(conn):
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(SQL_ADD_PRESENT, [(ma_sv,) for ma_sv in ma_sinh_viens])
+    finally:
+        cursor.close()
+
+
+def record_absence(conn, ma_sinh_vien, ma_lich_hoc):
+    """Sau khi ghi một bản ghi "Vắng mặt". Không tự commit."""
+    _execute(conn, SQL_ADD_ABSENT, (ma_sinh_vien,))
+    _execute(conn, SQL_ADD_TEACHER_ABSENT, (1, ma_lich_hoc))
+
+
+def record_session_absences(conn, ma_lich_hoc):
+    """Gọi NGAY TRƯỚC khi ghi vắng mặt cho các sinh viên chưa được điểm danh của lịch học. Không tự commit."""
+    _execute(conn, SQL_ADD_SESSION_TEACHER_ABSENT, (ma_lich_hoc, ma_lich_hoc))
+    _execute(conn, SQL_ADD_SESSION_ABSENT, (ma_lich_hoc,))
+
+
+def _init_missing(conn):
+    """
+    Tạo dòng tổng hợp còn thiếu (tính từ dữ liệu gốc tại thời điểm gọi).
+    Hai tiến trình cùng tạo một dòng thì câu lệnh của tiến trình sau lỗi trùng khóa: chỉ câu lệnh đó bị hủy,
+    transaction vẫn tiếp tục và người còn thiếu dòng vẫn được đếm trực tiếp khi đọc.
+    """
+    for sql in (SQL_INIT_MISSING_STUDENTS, SQL_INIT_MISSING_TEACHERS):
+        try:
+            _execute(conn, sql, ())
+        except Exception as e:
+            print(f"[WARNING] Không tạo được dòng thống kê còn thiếu (sẽ tạo ở lần sau): {str(e)}")
+
+
+def record_enrollment(conn, ma_lich_hoc):
+    """Gọi NGAY TRƯỚC khi thêm toàn bộ sinh viên vào lịch học. Không tự commit."""
+    _init_missing(conn)
+    _execute(conn, SQL_ADD_ENROLLMENT, (ma_lich_hoc,))
+
+
+def get_student_stats(conn, ma_sinh_vien):
+    """{'total', 'present', 'absent'} của một sinh viên, thường chỉ một truy vấn đọc một dòng"""
+    cursor = conn.cursor()
+    try:
+        row = None
+        if stats_available(conn):
+            cursor.execute(SQL_STUDENT_STATS, (ma_sinh_vien,))
+            row = cursor.fetchone()
+        if row is None:
+            cursor.execute(SQL_STUDENT_STATS_DIRECT, (ma_sinh_vien,) * 3)
+            row = cursor.fetchone()
+        return {'total': row[0] or 0, 'present': row[1] or 0, 'absent': row[2] or 0}
+    finally:
+        cursor.close()
+
+
+def get_teacher_stats(conn, ma_giao_vien):
+    """{'total_classes', 'total_sessions', 'absent_records'} của một giảng viên trong một truy vấn"""
+    cursor = conn.cursor()
+    try:
+        row = None
+        if stats_available(conn):
+            cursor.execute(SQL_TEACHER_STATS, (ma_giao_vien,) * 3)
+            row = cursor.fetchone()
+        if row is None or row[2] is None:
+            cursor.execute(SQL_TEACHER_STATS_DIRECT, (ma_giao_vien,) * 3)
+            row = cursor.fetchone()
+        return {'total_classes': row[0] or 0, 'total_sessions': row[1] or 0, 'absent_records': row[2] or 0}
+    finally:
+        cursor.close()
+
+
+def rebuild_stats(conn):
+    """Tạo bảng (SQL Server) và tính lại toàn bộ số liệu từ dữ liệu gốc; trả về (số sinh viên, số giảng viên)"""
+    global _available, _skipped_writes
+    cursor = conn.cursor()
+    try:
+        if current_backend().name == 'sqlserver':
+            for ddl in SCHEMA_SQL_SERVER:
+                cursor.execute(ddl)
+        cursor.execute("DELETE FROM [dbo].[ThongKeSinhVien]")
+        cursor.execute("DELETE FROM [dbo].[ThongKeGiaoVien]")
+        cursor.execute(
+            "INSERT INTO [dbo].[ThongKeSinhVien] (MaSinhVien, SoLichHoc, SoCoMat, SoVangMat) "
+            f"SELECT sv.MaSinhVien, {_SV_LICH_HOC.format(sv='sv.MaSinhVien')}, "
+            f"{_SV_CO_MAT.format(sv='sv.MaSinhVien')}, {_SV_VANG_MAT.format(sv='sv.MaSinhVien')} "
+            "FROM [dbo].[SinhVien] sv"
+        )
+        students = max(cursor.rowcount, 0)
+        cursor.execute(
+            "INSERT INTO [dbo].[ThongKeGiaoVien] (MaGiaoVien, SoVangMat) "
+            f"SELECT gv.MaGiaoVien, {_GV_VANG_MAT.format(gv='gv.MaGiaoVien')} FROM [dbo].[GiaoVien] gv"
+        )
+        teachers = max(cursor.rowcount, 0)
+        conn.commit()
+        _available = True
+        _skipped_writes = 0
+        return students, teachers
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        students, teachers = rebuild_stats(conn)
+        print(f"[SUCCESS] Đã tính lại thống kê điểm danh cho {students} sinh viên và {teachers} giảng viên "
+              f"trong {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] Lỗi khi tính lại thống kê điểm danh: {str(e)}")
+    finally:
+        conn.close()
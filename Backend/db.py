@@ -1,13 +1,39 @@
-import pyodbc
 import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# pyodbc chỉ bắt buộc khi dùng SQL Server (DB_BACKEND=sqlserver)
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
 
-def get_connection():
+# Chọn backend: 'sqlserver' (mặc định) hoặc 'sqlite' (chạy thử / đo hiệu năng không cần SQL Server)
+DB_BACKEND = os.getenv('DB_BACKEND', 'sqlserver').lower()
+
+
+# Cấu hình pool kết nối (có thể ghi đè bằng biến môi trường)
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))              # giây chờ khi pool đầy
+POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))           # giây nhàn rỗi tối đa
+POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))  # tuổi thọ tối đa của kết nối
+POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', '30'))  # chỉ ping nếu nhàn rỗi lâu hơn
+
+# Thống kê truy vấn: bật/tắt và ngưỡng ghi log truy vấn chậm (ms)
+QUERY_STATS_ENABLED = os.getenv('DB_QUERY_STATS', 'yes').lower() == 'yes'
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '200'))
+
+
+def _build_connection_string():
     """
-    Tạo kết nối đến SQL Server
+    Tạo chuỗi kết nối đến SQL Server
     Hỗ trợ cả Windows Authentication và SQL Server Authentication
     """
     server = os.getenv('DB_SERVER', 'LAPTOP-B1UCCBCI\SQL_TTTHA')
@@ -36,6 +62,16 @@ def get_connection():
         )
         print("[INFO] Kết nối bằng SQL Server Authentication")
 
+    return connection_string, database
+
+
+def create_connection():
+    """
+    Mở một kết nối vật lý mới đến SQL Server (không qua pool)
+    """
+    if pyodbc is None:
+        raise RuntimeError("Chưa cài pyodbc. Cài bằng lệnh: pip install pyodbc (hoặc đặt DB_BACKEND=sqlite)")
+    connection_string, database = _build_connection_string()
     try:
         conn = pyodbc.connect(connection_string)
         print(f"[SUCCESS] Kết nối database thành công: {database}")
@@ -45,34 +81,588 @@ def get_connection():
         raise
 
 
-def execute_query(query, params=None):
+class SqlServerBackend:
+    name = 'sqlserver'
+    label = 'SQL Server'
+    ping_query = 'SELECT 1'
+
+    def connect(self):
+        return create_connection()
+
+
+def get_backend(name=None):
+    """Tạo backend theo tên (mặc định lấy từ biến môi trường DB_BACKEND)"""
+    name = (name or DB_BACKEND).lower()
+    if name == 'sqlserver':
+        return SqlServerBackend()
+    if name == 'sqlite':
+        from db_sqlite import SqliteBackend
+        return SqliteBackend()
+    raise ValueError(f"DB_BACKEND không hợp lệ: {name} (chỉ hỗ trợ 'sqlserver' hoặc 'sqlite')")
+
+
+# ==========================================
+# THỐNG KÊ TRUY VẤN & LOG TRUY VẤN CHẬM
+# ==========================================
+
+# Cận trên (ms) của các ô histogram độ trễ; ô cuối cùng là "lớn hơn 5000 ms"
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_RE_COMMENT = re.compile(r'--[^\n]*')
+_RE_STRING = re.compile(r"N?'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r'(?<![\w@#])\d+(?:\.\d+)?\b')
+_RE_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_RE_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Chuẩn hóa câu lệnh để gom nhóm: bỏ comment, gộp khoảng trắng, thay hằng số bằng ?"""
+    sql = _RE_COMMENT.sub(' ', sql)
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMBER.sub('?', sql)
+    sql = _RE_IN_LIST.sub('(?...)', sql)
+    return _RE_SPACES.sub(' ', sql).strip()
+
+
+class _QueryStat:
+    __slots__ = ('calls', 'errors', 'rows', 'total_ms', 'min_ms', 'max_ms', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def percentile(self, q):
+        """Ước lượng phân vị từ histogram (trả về cận trên của ô chứa phân vị)"""
+        target = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class QueryStats:
     """
-    Thực thi query và trả về kết quả
+    Gom số lần gọi, số dòng, tổng/min/max thời gian và histogram độ trễ
+    theo từng câu lệnh đã chuẩn hóa; ghi log các câu lệnh chậm hơn ngưỡng.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    try:
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.slow_count = 0
+
+    def record(self, sql, elapsed_ms, rows=0, error=False):
+        key = normalize_sql(sql)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = _QueryStat()
+            stat.calls += 1
+            stat.rows += rows
+            stat.total_ms += elapsed_ms
+            stat.max_ms = max(stat.max_ms, elapsed_ms)
+            stat.min_ms = elapsed_ms if stat.min_ms is None else min(stat.min_ms, elapsed_ms)
+            if error:
+                stat.errors += 1
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    stat.buckets[i] += 1
+                    break
+            else:
+                stat.buckets[-1] += 1
+            slow = elapsed_ms >= self.slow_query_ms
+            if slow:
+                self.slow_count += 1
+
+        if slow:
+            print(f"[SLOW QUERY] {elapsed_ms:.1f} ms, {rows} dòng: {key[:300]}")
+
+    def snapshot(self, sort_by='total_ms', limit=None):
+        """Danh sách thống kê (dict) sắp xếp giảm dần theo `sort_by`"""
+        with self._lock:
+            items = [(key, stat) for key, stat in self._stats.items()]
+            result = [{
+                'sql': key,
+                'calls': stat.calls,
+                'errors': stat.errors,
+                'rows': stat.rows,
+                'total_ms': round(stat.total_ms, 3),
+                'avg_ms': round(stat.total_ms / stat.calls, 3) if stat.calls else 0,
+                'min_ms': round(stat.min_ms or 0, 3),
+                'max_ms': round(stat.max_ms, 3),
+                'p50_ms': stat.percentile(0.50),
+                'p95_ms': stat.percentile(0.95),
+                'p99_ms': stat.percentile(0.99),
+                # [cận trên ms, số lần]; cận trên None là ô "lớn hơn ô cuối"
+                'histogram': [[bound, count] for bound, count
+                              in zip(LATENCY_BUCKETS_MS + (None,), stat.buckets) if count],
+            } for key, stat in items]
+
+        if result and sort_by not in result[0]:
+            sort_by = 'total_ms'
+        result.sort(key=lambda item: item[sort_by], reverse=True)
+        return result[:limit] if limit else result
 
-        # Nếu là SELECT query
-        if query.strip().upper().startswith('SELECT'):
-            results = cursor.fetchall()
-            return results
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.slow_count = 0
+
+
+query_stats = QueryStats()
+
+
+class InstrumentedCursor:
+    """
+    Bọc cursor để đo thời gian thực thi + đọc kết quả của từng câu lệnh.
+    Một câu lệnh được ghi nhận khi cursor chạy câu tiếp theo hoặc bị đóng.
+    """
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._sql = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._sql is not None:
+            self._stats.record(self._sql, self._elapsed * 1000, self._rows)
+            self._sql = None
+
+    def _run(self, method, sql, *args):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            method(sql, *args)
+        except Exception:
+            self._stats.record(sql, (time.perf_counter() - started) * 1000, 0, error=True)
+            raise
+        self._sql = sql
+        self._elapsed = time.perf_counter() - started
+        rowcount = self._cursor.rowcount
+        self._rows = rowcount if rowcount and rowcount > 0 else 0
+        return self
+
+    def execute(self, sql, *params):
+        return self._run(self._cursor.execute, sql, *params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, seq_of_params)
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def fetchmany(self, *args):
+        rows = self._timed_fetch(self._cursor.fetchmany, *args)
+        self._rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        # rowcount, description, fast_executemany...
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
         else:
-            # Nếu là INSERT, UPDATE, DELETE
-            conn.commit()
-            return cursor.rowcount
-    except Exception as e:
-        conn.rollback()
-        print(f"[ERROR] Lỗi thực thi query: {str(e)}")
-        raise
-    finally:
-        cursor.close()
-        conn.close()
+            setattr(self._cursor, name, value)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+def get_query_stats(sort_by='total_ms', limit=None):
+    return query_stats.snapshot(sort_by, limit)
+
+
+def reset_query_stats():
+    query_stats.reset()
+
+
+class PoolError(Exception):
+    """Lỗi khi dùng pool kết nối"""
+
+
+class PoolTimeoutError(PoolError):
+    """Không lấy được kết nối từ pool trong thời gian cho phép"""
+
+
+class _PoolEntry:
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """
+    Đại diện cho một kết nối mượn từ pool.
+    Dùng giống kết nối pyodbc; gọi close() sẽ trả kết nối về pool thay vì đóng hẳn.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._cursors = weakref.WeakSet()
+
+    def cursor(self):
+        if self._entry is None:
+            raise PoolError('Kết nối đã được trả về pool')
+        cursor = self._entry.raw.cursor()
+        if QUERY_STATS_ENABLED:
+            cursor = InstrumentedCursor(cursor, query_stats)
+        self._cursors.add(cursor)
+        return cursor
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def close(self):
+        """Trả kết nối về pool (an toàn khi gọi nhiều lần)"""
+        entry, self._entry = self._entry, None
+        if entry is None:
+            return
+        for cursor in list(self._cursors):
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._pool.release(entry)
+
+    def __getattr__(self, name):
+        # commit, rollback, execute... chuyển thẳng cho kết nối gốc
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._entry is None:
+            raise PoolError('Kết nối đã được trả về pool')
+        return getattr(self._entry.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._entry is not None:
+            try:
+                self._entry.raw.rollback()
+            except Exception:
+                pass
+        self.close()
+        return False
+
+    def __del__(self):
+        # Quên close() thì vẫn trả kết nối về pool khi bị thu gom
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool kết nối an toàn đa luồng:
+    - Giới hạn số kết nối đồng thời (max_size), chờ tối đa `timeout` giây khi pool đầy
+    - Kiểm tra kết nối (ping) khi lấy ra nếu kết nối đã nhàn rỗi lâu
+    - Loại bỏ kết nối nhàn rỗi quá `max_idle` giây hoặc sống quá `max_lifetime` giây: không có luồng dọn dẹp
+      nền, kết nối quá hạn bị đóng khi acquire() gặp nó trong ngăn xếp nhàn rỗi hoặc khi được trả về
+    """
+
+    def __init__(self, factory, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 max_idle=POOL_MAX_IDLE, max_lifetime=POOL_MAX_LIFETIME,
+                 ping_interval=POOL_PING_INTERVAL, ping_query='SELECT 1'):
+        if max_size < 1:
+            raise ValueError('max_size phải >= 1')
+        self._factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.ping_query = ping_query
+
+        self._idle = []          # ngăn xếp LIFO: kết nối "nóng" nhất được dùng lại trước
+        self._size = 0           # tổng số kết nối đang mở (nhàn rỗi + đang mượn)
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        self.created_count = 0
+        self.discarded_count = 0
+        self.wait_count = 0
+
+    # ---------- Mượn / trả kết nối ----------
+
+    def acquire(self):
+        """Lấy một kết nối (PooledConnection) từ pool, chờ tối đa `timeout` giây tính cả các lần gặp kết nối hỏng"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            expired = []
+            reserved = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError('Pool đã bị đóng')
+
+                    entry = self._pop_idle_locked(expired)
+                    if entry is not None or expired:
+                        break
+
+                    if self._size < self.max_size:
+                        # Giữ chỗ rồi mở kết nối bên ngoài khóa
+                        self._size += 1
+                        reserved = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f'Không lấy được kết nối sau {self.timeout} giây (pool đầy {self.max_size} kết nối)')
+                    self.wait_count += 1
+                    self._cond.wait(remaining)
+
+            # Đóng kết nối quá hạn bên ngoài khóa (close() có thể là một lượt gọi mạng)
+            for old in expired:
+                self._discard(old)
+            if entry is None and not reserved:
+                continue
+
+            if reserved:
+                try:
+                    entry = _PoolEntry(self._factory())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.created_count += 1
+                return PooledConnection(self, entry)
+
+            if self._is_healthy(entry):
+                return PooledConnection(self, entry)
+            # Kết nối hỏng: bỏ đi và thử lại trong cùng thời hạn chờ
+            self._discard(entry)
+
+    def release(self, entry):
+        """Trả kết nối về pool; hủy giao dịch dở dang, đóng hẳn nếu kết nối hỏng"""
+        try:
+            entry.raw.rollback()
+        except Exception:
+            self._discard(entry)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            if self._closed or self._expired(entry, entry.last_used):
+                discard = True
+            else:
+                self._idle.append(entry)
+                discard = False
+            self._cond.notify()
+        if discard:
+            self._discard(entry)
+
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn: ...
+        Tự rollback khi có lỗi và luôn trả kết nối về pool
+        """
+        conn = self.acquire()
+        with conn:
+            yield conn
+
+    # ---------- Quản lý ----------
+
+    def close_all(self):
+        """Đóng toàn bộ kết nối nhàn rỗi; kết nối đang mượn sẽ bị đóng khi được trả về"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'open': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'created': self.created_count,
+                'discarded': self.discarded_count,
+                'waits': self.wait_count,
+            }
+
+    # ---------- Nội bộ ----------
+
+    def _expired(self, entry, now):
+        return (now - entry.created_at > self.max_lifetime
+                or now - entry.last_used > self.max_idle)
+
+    def _pop_idle_locked(self, expired):
+        """Lấy kết nối nhàn rỗi còn hạn; kết nối quá hạn được chuyển vào `expired` để đóng sau khi nhả khóa"""
+        now = time.monotonic()
+        while self._idle:
+            entry = self._idle.pop()
+            if not self._expired(entry, now):
+                return entry
+            expired.append(entry)
+        return None
+
+    def _is_healthy(self, entry):
+        if time.monotonic() - entry.last_used < self.ping_interval:
+            return True
+        cursor = None
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            return True
+        except Exception as e:
+            print(f"[WARNING] Kết nối trong pool không còn hoạt động, mở kết nối mới: {str(e)}")
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _discard(self, entry):
+        self._close_raw(entry)
+        with self._cond:
+            self._size -= 1
+            self.discarded_count += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_raw(entry):
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool dùng chung cho toàn bộ tiến trình (khởi tạo lười)"""
+    global _backend, _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _backend = get_backend()
+                _pool = ConnectionPool(_backend.connect, ping_query=_backend.ping_query)
+    return _pool
+
+
+def use_backend(name):
+    """Chuyển backend lúc chạy (vd. script benchmark); đóng pool cũ nếu có"""
+    global _backend, _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _backend = get_backend(name)
+        _pool = ConnectionPool(_backend.connect, ping_query=_backend.ping_query)
+    return _backend
+
+
+def current_backend():
+    get_pool()
+    return _backend
+
+
+def get_connection():
+    """
+    Lấy kết nối đến database (SQL Server hoặc SQLite tùy DB_BACKEND) từ pool.
+    Gọi conn.close() như trước đây để trả kết nối về pool.
+    """
+    return get_pool().acquire()
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager mượn kết nối từ pool:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            ...
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def execute_query(query, params=None):
+    """
+    Thực thi query và trả về kết quả
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+
+            # Nếu là SELECT query
+            if query.strip().upper().startswith('SELECT'):
+                results = cursor.fetchall()
+                return results
+            else:
+                # Nếu là INSERT, UPDATE, DELETE
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            print(f"[ERROR] Lỗi thực thi query: {str(e)}")
+            raise
+        finally:
+            cursor.close()
 
 
 def test_connection():
@@ -80,14 +670,13 @@ def test_connection():
     Test kết nối database
     """
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT @@VERSION")
-        version = cursor.fetchone()[0]
-        print(f"\n[SUCCESS] Kết nối thành công!")
-        print(f"SQL Server Version: {version[:100]}...")
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT @@VERSION")
+            version = cursor.fetchone()[0]
+            print(f"\n[SUCCESS] Kết nối thành công!")
+            print(f"{current_backend().label} Version: {version[:100]}...")
+            cursor.close()
         return True
     except Exception as e:
         print(f"\n[ERROR] Kết nối thất bại: {str(e)}")
@@ -98,4 +687,4 @@ if __name__ == "__main__":
     print("========================================")
     print("  TEST KẾT NỐI DATABASE")
     print("========================================\n")
-    test_connection()
\ No newline at end of file
+    test_connection()
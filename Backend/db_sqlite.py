@@ -0,0 +1,294 @@
+"""
+Backend SQLite thay thế SQL Server để chạy thử, đo hiệu năng và load-test trên máy cá nhân.
+
+Bật bằng biến môi trường:
+    DB_BACKEND=sqlite
+    DB_SQLITE_PATH=duong/dan/file.sqlite3   (mặc định: Backend/btl_cnpm.sqlite3, ':memory:' cho DB tạm)
+
+Các câu lệnh viết theo cú pháp T-SQL trong app.py và CodeWebCam được dịch tự động
+(ISNULL, N'...', GETDATE(), TOP n, [dbo].[Bang], EXEC sp_...) nên không cần sửa code gọi.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'btl_cnpm.sqlite3')
+
+# Lược đồ tương ứng với các bảng mà app.py và các script CodeWebCam sử dụng
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Lop (
+    MaLop       TEXT PRIMARY KEY,
+    TenLop      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS MonHoc (
+    MaMonHoc    TEXT PRIMARY KEY,
+    TenMonHoc   TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS GiaoVien (
+    MaGiaoVien  TEXT PRIMARY KEY,
+    HoTen       TEXT NOT NULL,
+    NgaySinh    DATE,
+    GioiTinh    TEXT,
+    Email       TEXT,
+    SoDienThoai TEXT,
+    ChucVu      TEXT
+);
+
+CREATE TABLE IF NOT EXISTS SinhVien (
+    MaSinhVien  TEXT PRIMARY KEY,
+    HoTen       TEXT NOT NULL,
+    NgaySinh    DATE,
+    GioiTinh    TEXT,
+    MaLop       TEXT REFERENCES Lop(MaLop),
+    MaPhuHuynh  TEXT,
+    Email       TEXT,
+    SoDienThoai TEXT
+);
+
+CREATE TABLE IF NOT EXISTS TaiKhoanSinhVien (
+    TenDangNhap TEXT PRIMARY KEY,
+    MatKhau     TEXT NOT NULL,
+    MaSinhVien  TEXT NOT NULL REFERENCES SinhVien(MaSinhVien)
+);
+
+CREATE TABLE IF NOT EXISTS TaiKhoanGiaoVien (
+    TenDangNhap TEXT PRIMARY KEY,
+    MatKhau     TEXT NOT NULL,
+    MaGiaoVien  TEXT NOT NULL REFERENCES GiaoVien(MaGiaoVien)
+);
+
+CREATE TABLE IF NOT EXISTS LichDay (
+    MaLichDay   TEXT PRIMARY KEY,
+    MaGiaoVien  TEXT REFERENCES GiaoVien(MaGiaoVien),
+    MaLop       TEXT REFERENCES Lop(MaLop),
+    MaMonHoc    TEXT REFERENCES MonHoc(MaMonHoc),
+    NgayDay     DATE,
+    GioBatDau   TIME,
+    GioKetThuc  TIME
+);
+
+CREATE TABLE IF NOT EXISTS LichHoc (
+    MaLichHoc   TEXT PRIMARY KEY,
+    MaLichDay   TEXT REFERENCES LichDay(MaLichDay),
+    MaMonHoc    TEXT REFERENCES MonHoc(MaMonHoc),
+    NgayHoc     DATE,
+    GioBatDau   TIME,
+    GioKetThuc  TIME,
+    PhongHoc    TEXT
+);
+
+CREATE TABLE IF NOT EXISTS LichHoc_SinhVien (
+    MaLichHoc   TEXT NOT NULL REFERENCES LichHoc(MaLichHoc),
+    MaSinhVien  TEXT NOT NULL REFERENCES SinhVien(MaSinhVien),
+    PRIMARY KEY (MaLichHoc, MaSinhVien)
+);
+
+CREATE TABLE IF NOT EXISTS PhienDiemDanh (
+    MaPhien         INTEGER PRIMARY KEY AUTOINCREMENT,
+    MaLichHoc       TEXT NOT NULL REFERENCES LichHoc(MaLichHoc),
+    ThoiGianBatDau  DATETIME,
+    TrangThai       TEXT
+);
+
+CREATE TABLE IF NOT EXISTS DiemDanh (
+    MaDiemDanh       INTEGER PRIMARY KEY AUTOINCREMENT,
+    MaLichHoc        TEXT NOT NULL REFERENCES LichHoc(MaLichHoc),
+    MaSinhVien       TEXT NOT NULL REFERENCES SinhVien(MaSinhVien),
+    ThoiGianDiemDanh DATETIME,
+    TrangThai        TEXT,
+    DULieuAnhMoi     TEXT,
+    GhiChu           TEXT
+);
+
+CREATE TABLE IF NOT EXISTS DuLieuKhuonMat (
+    MaDuLieu          INTEGER PRIMARY KEY AUTOINCREMENT,
+    MaSinhVien        TEXT NOT NULL REFERENCES SinhVien(MaSinhVien),
+    DuLieuAnhKhuonMat TEXT NOT NULL
+);
+
+-- Số liệu tổng hợp cho dashboard (attendance_stats.py), cập nhật dần khi ghi DiemDanh
+CREATE TABLE IF NOT EXISTS ThongKeSinhVien (
+    MaSinhVien  TEXT PRIMARY KEY,
+    SoLichHoc   INTEGER NOT NULL DEFAULT 0,
+    SoCoMat     INTEGER NOT NULL DEFAULT 0,
+    SoVangMat   INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ThongKeGiaoVien (
+    MaGiaoVien  TEXT PRIMARY KEY,
+    SoVangMat   INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS IX_SinhVien_MaLop ON SinhVien (MaLop);
+CREATE INDEX IF NOT EXISTS IX_LichDay_MaGiaoVien ON LichDay (MaGiaoVien, NgayDay);
+CREATE INDEX IF NOT EXISTS IX_LichHoc_MaLichDay ON LichHoc (MaLichDay);
+CREATE INDEX IF NOT EXISTS IX_LichHoc_SinhVien_MaSinhVien ON LichHoc_SinhVien (MaSinhVien);
+CREATE INDEX IF NOT EXISTS IX_PhienDiemDanh_MaLichHoc ON PhienDiemDanh (MaLichHoc);
+CREATE INDEX IF NOT EXISTS IX_DiemDanh_MaSinhVien ON DiemDanh (MaSinhVien, ThoiGianDiemDanh);
+CREATE INDEX IF NOT EXISTS IX_DiemDanh_MaLichHoc ON DiemDanh (MaLichHoc, MaSinhVien);
+CREATE INDEX IF NOT EXISTS IX_DuLieuKhuonMat_MaSinhVien ON DuLieuKhuonMat (MaSinhVien);
+"""
+
+# Mô phỏng các stored procedure của SQL Server (tham số theo thứ tự ?1, ?2, ...)
+PROCEDURES = {
+    'sp_ThemDuLieuKhuonMat': (
+        "INSERT INTO DuLieuKhuonMat (MaSinhVien, DuLieuAnhKhuonMat) "
+        "SELECT ?1, ?2 WHERE NOT EXISTS "
+        "(SELECT 1 FROM DuLieuKhuonMat WHERE MaSinhVien = ?1 AND DuLieuAnhKhuonMat = ?2)"
+    ),
+}
+
+
+# ---------- Kiểu dữ liệu ngày giờ ----------
+# Lưu dạng chuỗi ISO, đọc ra thành date/datetime để code dùng .strftime() như với pyodbc
+
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(sep=' '))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+sqlite3.register_converter('DATE', lambda v: date.fromisoformat(v.decode()[:10]))
+sqlite3.register_converter('DATETIME', lambda v: datetime.fromisoformat(v.decode()))
+
+
+# ---------- Dịch T-SQL sang SQLite ----------
+
+_RE_EXEC = re.compile(r'^\s*EXEC(?:UTE)?\s+(?:\[?dbo\]?\.)?\[?(\w+)\]?', re.IGNORECASE)
+_RE_TOP = re.compile(r'\bSELECT(\s+DISTINCT)?\s+TOP\s*\(?\s*(\d+)\s*\)?', re.IGNORECASE)
+_RE_DBO = re.compile(r'\[?dbo\]?\.', re.IGNORECASE)
+_RE_NSTRING = re.compile(r"(?<![\w'])N'")
+_RE_ISNULL = re.compile(r'\bISNULL\s*\(', re.IGNORECASE)
+_RE_GETDATE = re.compile(r'\bGETDATE\s*\(\s*\)', re.IGNORECASE)
+_RE_VERSION = re.compile(r'@@VERSION', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql):
+    """Chuyển câu lệnh T-SQL (dạng dùng trong dự án) sang cú pháp SQLite"""
+    match = _RE_EXEC.match(sql)
+    if match:
+        name = match.group(1)
+        if name not in PROCEDURES:
+            raise sqlite3.OperationalError(f'Stored procedure {name} chưa được mô phỏng trên SQLite')
+        return PROCEDURES[name]
+
+    sql = _RE_DBO.sub('', sql)
+    sql = _RE_NSTRING.sub("'", sql)
+    sql = _RE_ISNULL.sub('IFNULL(', sql)
+    sql = _RE_GETDATE.sub("datetime('now', 'localtime')", sql)
+    sql = _RE_VERSION.sub("'SQLite ' || sqlite_version()", sql)
+
+    top = _RE_TOP.search(sql)
+    if top:
+        sql = _RE_TOP.sub(lambda m: 'SELECT' + (m.group(1) or '') + ' ', sql, count=1)
+        sql = sql.rstrip().rstrip(';') + f' LIMIT {top.group(2)}'
+    return sql
+
+
+def _normalize_params(params):
+    # pyodbc cho phép cả execute(sql, (a, b)) lẫn execute(sql, a, b)
+    if len(params) == 1 and isinstance(params[0], (tuple, list)):
+        return tuple(params[0])
+    return tuple(params)
+
+
+class SqliteCursor:
+    """Cursor bọc sqlite3 với giao diện giống pyodbc"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.fast_executemany = False  # chỉ để tương thích với pyodbc
+
+    def execute(self, sql, *params):
+        self._cursor.execute(translate_sql(sql), _normalize_params(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate_sql(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._cursor.fetchmany()
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class SqliteConnection:
+    """Kết nối sqlite3 với giao diện giống pyodbc.Connection"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return SqliteCursor(self._conn.cursor())
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class SqliteBackend:
+    name = 'sqlite'
+    label = 'SQLite'
+    ping_query = 'SELECT 1'
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('DB_SQLITE_PATH', DEFAULT_SQLITE_PATH)
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        self._keepalive = None
+
+    def connect(self):
+        if self.path == ':memory:':
+            # DB trong bộ nhớ dùng chung giữa các kết nối của pool
+            raw = sqlite3.connect('file:btl_cnpm_memory?mode=memory&cache=shared', uri=True,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        else:
+            raw = sqlite3.connect(self.path, timeout=30,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            raw.execute('PRAGMA journal_mode=WAL')
+            raw.execute('PRAGMA synchronous=NORMAL')
+
+        with self._lock:
+            if self.path == ':memory:' and self._keepalive is None:
+                # Giữ một kết nối để DB không bị xóa khi pool đóng hết kết nối
+                self._keepalive = raw
+                raw = sqlite3.connect('file:btl_cnpm_memory?mode=memory&cache=shared', uri=True,
+                                      detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            if not self._schema_ready:
+                raw.executescript(SCHEMA)
+                raw.commit()
+                self._schema_ready = True
+
+        print(f"[SUCCESS] Kết nối SQLite thành công: {self.path}")
+        return SqliteConnection(raw)
@@ -0,0 +1,197 @@
+"""
+Sinh dữ liệu giả lập (sinh viên, lớp, lịch dạy/lịch học, điểm danh...) để đo hiệu năng.
+
+Ví dụ:
+    set DB_BACKEND=sqlite
+    python generate_data.py --students 5000 --classes 100 --sessions 2000 --reset
+
+Cùng một --seed luôn sinh ra cùng một bộ dữ liệu nên kết quả đo có thể lặp lại.
+Chạy được với cả SQLite lẫn SQL Server (chỉ dùng INSERT có tham số).
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from attendance_stats import rebuild_stats
+from db import get_connection, current_backend
+
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ']
+DEM = ['Văn', 'Thị', 'Hữu', 'Minh', 'Thu', 'Ngọc', 'Đức', 'Thanh', 'Quốc', 'Hải']
+TEN = ['An', 'Bình', 'Chi', 'Dũng', 'Giang', 'Hà', 'Hùng', 'Lan', 'Linh', 'Nam', 'Phương',
+       'Quân', 'Sơn', 'Trang', 'Tuấn', 'Việt', 'Yến']
+MON = ['Công nghệ phần mềm', 'Cơ sở dữ liệu', 'Lập trình Python', 'Mạng máy tính', 'Trí tuệ nhân tạo',
+       'Hệ điều hành', 'Cấu trúc dữ liệu', 'Xử lý ảnh', 'Toán rời rạc', 'Kỹ thuật vi xử lý']
+CA_HOC = [(dtime(7, 0), dtime(9, 30)), (dtime(9, 40), dtime(12, 10)),
+          (dtime(13, 0), dtime(15, 30)), (dtime(15, 40), dtime(18, 10))]
+
+# Xóa theo thứ tự bảng con trước, bảng cha sau
+TABLES = ['DiemDanh', 'PhienDiemDanh', 'LichHoc_SinhVien', 'DuLieuKhuonMat', 'TaiKhoanSinhVien',
+          'TaiKhoanGiaoVien', 'LichHoc', 'LichDay', 'SinhVien', 'GiaoVien', 'MonHoc', 'Lop']
+
+BATCH_SIZE = 1000
+
+
+def random_name(rng):
+    return f"{rng.choice(HO)} {rng.choice(DEM)} {rng.choice(TEN)}"
+
+
+def random_birthday(rng, year_from, year_to):
+    return date(rng.randint(year_from, year_to), rng.randint(1, 12), rng.randint(1, 28))
+
+
+def insert_many(cursor, table, columns, rows):
+    """Chèn theo lô; trả về số dòng đã chèn"""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    cursor.fast_executemany = True
+    for i in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[i:i + BATCH_SIZE])
+    return len(rows)
+
+
+def build_dataset(args):
+    """Sinh toàn bộ dữ liệu trong bộ nhớ, trả về {tên bảng: (cột, danh sách dòng)}"""
+    rng = random.Random(args.seed)
+    today = date.today()
+    semester_start = today - timedelta(weeks=args.weeks_elapsed)
+
+    lop = [(f"L{i:03d}", f"K{58 + i % 5}KTP{i:02d}") for i in range(1, args.classes + 1)]
+    mon_hoc = [(f"MH{i:03d}", f"{MON[(i - 1) % len(MON)]} {(i - 1) // len(MON) + 1}")
+               for i in range(1, args.subjects + 1)]
+
+    giao_vien = []
+    tk_giao_vien = []
+    for i in range(1, args.teachers + 1):
+        ma = f"GV{i:03d}"
+        giao_vien.append((ma, random_name(rng), random_birthday(rng, 1965, 1992), rng.choice(['Nam', 'Nữ']),
+                          f"{ma.lower()}@tnut.edu.vn", f"09{rng.randint(10000000, 99999999)}", 'Giảng viên'))
+        tk_giao_vien.append((ma.lower(), args.password, ma))
+
+    sinh_vien = []
+    tk_sinh_vien = []
+    du_lieu_khuon_mat = []
+    students_by_class = {ma_lop: [] for ma_lop, _ in lop}
+    for i in range(1, args.students + 1):
+        ma = f"SV{i:05d}"
+        ma_lop = lop[(i - 1) % len(lop)][0]
+        students_by_class[ma_lop].append(ma)
+        sinh_vien.append((ma, random_name(rng), random_birthday(rng, 2002, 2006), rng.choice(['Nam', 'Nữ']),
+                          ma_lop, None, f"{ma.lower()}@tnut.edu.vn", f"03{rng.randint(10000000, 99999999)}"))
+        tk_sinh_vien.append((ma.lower(), args.password, ma))
+        du_lieu_khuon_mat.append((ma, f"dataset/{ma}"))
+    all_students = [row[0] for row in sinh_vien]
+
+    lich_day = []
+    lich_hoc = []
+    lich_hoc_sinh_vien = []
+    phien = []
+    diem_danh = []
+    now = datetime.now()
+    total_days = args.weeks_elapsed * 7 + args.weeks_ahead * 7
+    for i in range(1, args.sessions + 1):
+        ma_lich_day = f"LD{i:05d}"
+        ma_lich_hoc = f"LH{i:05d}"
+        ma_lop = lop[rng.randrange(len(lop))][0]
+        ma_mon = mon_hoc[rng.randrange(len(mon_hoc))][0]
+        ma_gv = giao_vien[rng.randrange(len(giao_vien))][0]
+        ngay = semester_start + timedelta(days=rng.randrange(max(total_days, 1)))
+        bat_dau, ket_thuc = rng.choice(CA_HOC)
+        lich_day.append((ma_lich_day, ma_gv, ma_lop, ma_mon, ngay, bat_dau.isoformat(), ket_thuc.isoformat()))
+        lich_hoc.append((ma_lich_hoc, ma_lich_day, ma_mon, ngay, bat_dau.isoformat(), ket_thuc.isoformat(),
+                         f"A{rng.randint(1, 12)}-{rng.randint(101, 512)}"))
+
+        # Sinh viên của lớp + một ít sinh viên học ghép/học lại
+        roster = list(students_by_class[ma_lop])
+        extra = min(int(len(roster) * args.extra_ratio), len(all_students))
+        roster.extend(s for s in rng.sample(all_students, extra) if s not in roster)
+        lich_hoc_sinh_vien.extend((ma_lich_hoc, ma_sv) for ma_sv in roster)
+
+        start = datetime.combine(ngay, bat_dau)
+        if start + timedelta(minutes=15) > now:
+            continue  # Buổi học chưa diễn ra: chưa có phiên và dữ liệu điểm danh
+
+        phien.append((ma_lich_hoc, start, 'Hoàn tất'))
+        for ma_sv in roster:
+            if rng.random() < args.attendance_rate:
+                thoi_gian = start + timedelta(seconds=rng.randint(0, 15 * 60))
+                diem_danh.append((ma_lich_hoc, ma_sv, thoi_gian, 'Có mặt', f"Captured/{ma_sv}_{ma_lich_hoc}.jpg", None))
+            else:
+                diem_danh.append((ma_lich_hoc, ma_sv, start + timedelta(minutes=15), 'Vắng mặt', None,
+                                  'Nghỉ không phép'))
+
+    return {
+        'Lop': (['MaLop', 'TenLop'], lop),
+        'MonHoc': (['MaMonHoc', 'TenMonHoc'], mon_hoc),
+        'GiaoVien': (['MaGiaoVien', 'HoTen', 'NgaySinh', 'GioiTinh', 'Email', 'SoDienThoai', 'ChucVu'], giao_vien),
+        'SinhVien': (['MaSinhVien', 'HoTen', 'NgaySinh', 'GioiTinh', 'MaLop', 'MaPhuHuynh', 'Email',
+                      'SoDienThoai'], sinh_vien),
+        'TaiKhoanGiaoVien': (['TenDangNhap', 'MatKhau', 'MaGiaoVien'], tk_giao_vien),
+        'TaiKhoanSinhVien': (['TenDangNhap', 'MatKhau', 'MaSinhVien'], tk_sinh_vien),
+        'DuLieuKhuonMat': (['MaSinhVien', 'DuLieuAnhKhuonMat'], du_lieu_khuon_mat),
+        'LichDay': (['MaLichDay', 'MaGiaoVien', 'MaLop', 'MaMonHoc', 'NgayDay', 'GioBatDau', 'GioKetThuc'],
+                    lich_day),
+        'LichHoc': (['MaLichHoc', 'MaLichDay', 'MaMonHoc', 'NgayHoc', 'GioBatDau', 'GioKetThuc', 'PhongHoc'],
+                    lich_hoc),
+        'LichHoc_SinhVien': (['MaLichHoc', 'MaSinhVien'], lich_hoc_sinh_vien),
+        'PhienDiemDanh': (['MaLichHoc', 'ThoiGianBatDau', 'TrangThai'], phien),
+        'DiemDanh': (['MaLichHoc', 'MaSinhVien', 'ThoiGianDiemDanh', 'TrangThai', 'DULieuAnhMoi', 'GhiChu'],
+                     diem_danh),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sinh dữ liệu giả lập cho việc đo hiệu năng')
+    parser.add_argument('--students', type=int, default=2000, help='Số sinh viên')
+    parser.add_argument('--classes', type=int, default=40, help='Số lớp hành chính')
+    parser.add_argument('--subjects', type=int, default=20, help='Số môn học')
+    parser.add_argument('--teachers', type=int, default=50, help='Số giảng viên')
+    parser.add_argument('--sessions', type=int, default=500, help='Số buổi học (LichDay/LichHoc)')
+    parser.add_argument('--weeks-elapsed', type=int, default=10, help='Số tuần đã học của học kỳ')
+    parser.add_argument('--weeks-ahead', type=int, default=5, help='Số tuần còn lại của học kỳ')
+    parser.add_argument('--attendance-rate', type=float, default=0.85, help='Tỉ lệ có mặt')
+    parser.add_argument('--extra-ratio', type=float, default=0.05,
+                        help='Tỉ lệ sinh viên học ghép thêm vào mỗi buổi (so với sĩ số lớp)')
+    parser.add_argument('--password', default='123', help='Mật khẩu cho mọi tài khoản')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='Xóa dữ liệu cũ trước khi sinh')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = build_dataset(args)
+    print(f"[INFO] Đã sinh dữ liệu trong {time.perf_counter() - started:.2f}s")
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        if args.reset:
+            for table in TABLES:
+                cursor.execute(f"DELETE FROM {table}")
+            print("[INFO] Đã xóa dữ liệu cũ.")
+
+        total = 0
+        started = time.perf_counter()
+        for table in reversed(TABLES):
+            columns, rows = dataset[table]
+            t0 = time.perf_counter()
+            total += insert_many(cursor, table, columns, rows)
+            print(f"[INFO] {table}: {len(rows)} dòng ({time.perf_counter() - t0:.2f}s)")
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        print(f"\n[SUCCESS] Đã ghi {total} dòng vào {current_backend().label} "
+              f"trong {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} dòng/s)")
+
+        # Bảng tổng hợp cho dashboard phải khớp với DiemDanh vừa sinh
+        t0 = time.perf_counter()
+        students, teachers = rebuild_stats(conn)
+        print(f"[INFO] Thống kê điểm danh: {students} sinh viên, {teachers} giảng viên "
+              f"({time.perf_counter() - t0:.2f}s)")
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] Lỗi khi ghi dữ liệu giả lập: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
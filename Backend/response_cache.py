@@ -0,0 +1,78 @@
+"""
+Cache kết quả API trong bộ nhớ tiến trình (TTL + LRU) cho các dữ liệu ít thay đổi như lịch học, lịch dạy.
+
+Ứng dụng web không có route nào ghi lịch học / lịch dạy; dữ liệu này đổi từ tiến trình khác
+(script điểm danh, SQL trực tiếp) nên chỉ được cập nhật khi hết TTL, trừ khi route tự lưu kèm một
+"phiên bản" rẻ để so sánh (vd lịch học sinh viên lưu số dòng LichHoc_SinhVien).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_ENABLED = os.getenv('RESPONSE_CACHE', 'yes').lower() == 'yes'
+CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '300'))            # giây
+CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+
+
+class ResponseCache:
+    """Cache key -> payload (dict JSON), an toàn khi dùng từ nhiều luồng của Flask"""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, enabled=CACHE_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (hết hạn lúc, payload); cuối = dùng gần nhất
+        self._counters = {}             # endpoint (phần tử đầu của key) -> {'hits', 'misses'}
+        self._stats = {'evictions': 0, 'expired': 0}
+
+    def get(self, key):
+        """Payload đã cache hoặc None (không có / hết hạn / cache tắt)"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.setdefault(key[0], {'hits': 0, 'misses': 0})
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                counter['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            counter['hits'] += 1
+            return entry[1]
+
+    def set(self, key, payload):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for name, c in self._counters.items():
+                total = c['hits'] + c['misses']
+                endpoints[name] = dict(c, hit_rate=round(c['hits'] / total, 3) if total else 0.0)
+            return dict(self._stats, enabled=self.enabled, ttl_s=self.ttl, entries=len(self._entries),
+                        max_entries=self.max_entries, endpoints=endpoints)
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters.clear()
+            self._stats = {'evictions': 0, 'expired': 0}
+
+
+response_cache = ResponseCache()
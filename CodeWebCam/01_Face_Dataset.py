@@ -1,6 +1,14 @@
 import cv2
 import os
 from db import get_connection # type: ignore
+from enrollment import CandidateWriter, make_candidate, select_best
+from training_data import list_images, load_training_faces
+
+# Số ảnh giữ lại cho mỗi sinh viên và số khuôn mặt ứng viên chụp để chọn
+ENROLL_IMAGES = int(os.getenv("ENROLL_IMAGES", "50"))
+ENROLL_CANDIDATES = int(os.getenv("ENROLL_CANDIDATES", "150"))
+# 0..1: càng lớn càng ưu tiên ảnh khác tư thế hơn là ảnh nét nhất
+ENROLL_DIVERSITY = float(os.getenv("ENROLL_DIVERSITY", "0.5"))
 
 # Khởi động camera
 cam = cv2.VideoCapture(0)
@@ -18,49 +26,64 @@ user_folder = os.path.join('dataset', face_id)
 if not os.path.exists(user_folder):
     os.makedirs(user_folder)
 
-print("\n[INFO] Đang khởi động chụp khuôn mặt. Nhìn vào camera và đợi...")
+print("\n[INFO] Đang khởi động chụp khuôn mặt. Nhìn vào camera, xoay nhẹ đầu sang các hướng và đợi...")
 
-count = 0
-while True:
+# Ứng viên được ghi ra file tạm ở luồng nền trong lúc chụp; chụp xong mới chọn và đổi tên ảnh giữ lại
+candidates = []
+writer = CandidateWriter(user_folder)
+while len(candidates) < ENROLL_CANDIDATES:
     ret, img = cam.read()
+    if not ret:
+        print("[ERROR] Không đọc được khung hình từ camera.")
+        break
     img = cv2.flip(img, 1)  # lật ảnh theo chiều ngang
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     faces = face_detector.detectMultiScale(gray, 1.3, 5)
 
     for (x, y, w, h) in faces:
+        candidates.append(make_candidate(img, gray, (x, y, w, h)))
+        writer.add(candidates[-1].crop)
         cv2.rectangle(img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-        count += 1
-
-        # Lưu ảnh có màu vào thư mục riêng
-        face_img = img[y:y+h, x:x+w]
-        file_path = os.path.join(user_folder, f"{count}.jpg")
-        cv2.imwrite(file_path, face_img)
-
-        # Lưu đường dẫn vào database
-        conn = None
-        cursor = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("EXEC sp_ThemDuLieuKhuonMat ?, ?", (face_id, user_folder))
-            conn.commit()
-            print(f"[INFO] Đã lưu ảnh {count} và đường dẫn vào database.")
-        except Exception as e:
-            print(f"[ERROR] Lỗi khi lưu vào database: {str(e)}")
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
 
-        cv2.imshow('image', img)
+    cv2.putText(img, f"{len(candidates)}/{ENROLL_CANDIDATES}", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    cv2.imshow('image', img)
 
     k = cv2.waitKey(10) & 0xff
     if k == 27:  # Nhấn ESC để thoát
         break
-    elif count >= 50:  # Chụp 50 ảnh thì dừng
-        break
 
-print(f"\n[INFO] Đã lưu {count} ảnh vào thư mục: {user_folder}")
 cam.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
+
+# Chọn ảnh tốt nhất, trải đều tư thế; ảnh đã ghi sẵn nên chỉ cần đổi tên
+selected = select_best(candidates, ENROLL_IMAGES, ENROLL_DIVERSITY)
+print(f"\n[INFO] Đã chụp {len(candidates)} khuôn mặt, chọn {len(selected)} ảnh tốt nhất.")
+saved = writer.finish(selected)
+print(f"[INFO] Đã lưu {len(saved)} ảnh vào thư mục: {user_folder}")
+
+# Lưu đường dẫn thư mục vào database một lần cho cả bộ ảnh
+if saved:
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("EXEC sp_ThemDuLieuKhuonMat ?, ?", (face_id, user_folder))
+        conn.commit()
+        print("[INFO] Đã lưu đường dẫn dữ liệu khuôn mặt vào database.")
+    except Exception as e:
+        print(f"[ERROR] Lỗi khi lưu vào database: {str(e)}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# Tạo sẵn cache khuôn mặt (ảnh xám 200x200) để bước huấn luyện không phải xử lý lại ảnh
+try:
+    _, _, _, stats = load_training_faces([(p, 0) for p in list_images(user_folder)],
+                                         'haarcascade_frontalface_default.xml', workers=1)
+    print(f"[INFO] Đã tạo cache khuôn mặt: {stats['faces']} khuôn mặt từ {stats['images']} ảnh.")
+except Exception as e:
+    print(f"[WARNING] Không tạo được cache khuôn mặt: {str(e)}")
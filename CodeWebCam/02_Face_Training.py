@@ -1,9 +1,10 @@
 import cv2
 import numpy as np
-from PIL import Image
 import os
 import json
 from db import get_connection  # type: ignore
+from lbph_matcher import BatchLBPHMatcher, save_model
+from training_data import diff_manifest, list_images, load_manifest, load_training_faces, manifest_entry, save_manifest
 
 # Đường dẫn để lưu mô hình và nhãn
 labels_file = 'trainer/labels.json'
@@ -13,86 +14,161 @@ if not hasattr(cv2, 'face'):
     print("cv2.face module is not available. Cài đặt bằng lệnh: pip install opencv-contrib-python")
     exit()
 
-# Tạo recognizer LBPH
-try:
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    print("LBPH Face Recognizer created successfully.")
-except AttributeError:
-    print("Không thể tạo LBPH Recognizer. Cần cài opencv-contrib-python.")
-    exit()
-
-# Load bộ cascade
-detector = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
-
-# Hàm lấy ảnh và nhãn từ database
-def getImagesAndLabels():
-    faceSamples = []
-    ids = []
+# Bộ cascade dùng trong các tiến trình đọc ảnh
+CASCADE_PATH = 'haarcascade_frontalface_default.xml'
+
+# Số tiến trình đọc ảnh + phát hiện khuôn mặt (mặc định: số nhân CPU) và số ảnh mỗi cụm gửi đi
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", os.cpu_count() or 1))
+TRAINING_CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "32"))
+# Dùng cache khuôn mặt đã xử lý (_face_cache.npy trong thư mục mỗi sinh viên)
+TRAINING_CACHE = os.getenv("TRAINING_CACHE", "yes").lower() == "yes"
+
+# Manifest các ảnh đã huấn luyện, nằm cạnh trainer.yml
+model_file = 'trainer/trainer.yml'
+# Artifact nhị phân (trainer/model.npy + trainer/model.json) để lúc điểm danh load nhanh bằng memory-map
+artifact_file = 'trainer/model'
+manifest_file = 'trainer/manifest.json'
+
+# auto: chỉ huấn luyện thêm ảnh mới khi có thể (LBPH update), full: luôn huấn luyện lại từ đầu
+TRAINING_MODE = os.getenv("TRAINING_MODE", "auto").lower()
+
+# Hàm lấy danh sách ảnh và nhãn từ database
+def getImagesAndLabels(old_label_ids=None):
+    """
+    Trả về (tasks, label_ids): tasks là danh sách (đường dẫn ảnh, id).
+    Sinh viên đã có trong labels.json giữ nguyên ID cũ, sinh viên mới nhận ID tiếp theo.
+    """
+    old_label_ids = old_label_ids or {}
     label_ids = {}
-    current_id = 0
+    current_id = max(old_label_ids.values(), default=-1) + 1
+    tasks = []  # (đường dẫn ảnh, id)
 
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT MaSinhVien, DuLieuAnhKhuonMat FROM DuLieuKhuonMat")
         rows = cursor.fetchall()
-
-        for row in rows:
-            ma_sinh_vien, folder_path = row
-            if not os.path.exists(folder_path):
-                print(f"[WARNING] Folder does not exist: {folder_path}")
-                continue
-
-            # Gán ID số cho mã sinh viên
-            if ma_sinh_vien not in label_ids:
+        cursor.close()
+    finally:
+        if conn:
+            conn.close()
+
+    for row in rows:
+        ma_sinh_vien, folder_path = row
+        if not os.path.exists(folder_path):
+            print(f"[WARNING] Folder does not exist: {folder_path}")
+            continue
+
+        # Gán ID số cho mã sinh viên (giữ ID cũ nếu có)
+        if ma_sinh_vien not in label_ids:
+            if ma_sinh_vien in old_label_ids:
+                label_ids[ma_sinh_vien] = old_label_ids[ma_sinh_vien]
+            else:
                 label_ids[ma_sinh_vien] = current_id
                 current_id += 1
 
-            id = label_ids[ma_sinh_vien]
-
-            # Duyệt qua tất cả các ảnh trong thư mục
-            for img_file in os.listdir(folder_path):
-                img_path = os.path.join(folder_path, img_file)
-                if os.path.isfile(img_path) and img_file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    try:
-                        PIL_img = Image.open(img_path).convert('L')  # grayscale
-                        img_numpy = np.array(PIL_img, 'uint8')
-
-                        # Phát hiện khuôn mặt
-                        faces = detector.detectMultiScale(img_numpy)
-                        for (x, y, w, h) in faces:
-                            face_crop = img_numpy[y:y+h, x:x+w]
-                            face_resized = cv2.resize(face_crop, (200, 200))  # Resize đồng bộ
-                            faceSamples.append(face_resized)
-                            ids.append(id)
-                    except Exception as e:
-                        print(f"[ERROR] Lỗi đọc ảnh {img_path}: {e}")
-
-        return faceSamples, ids, label_ids
-    finally:
-        cursor.close()
-        conn.close()
+        id = label_ids[ma_sinh_vien]
 
-# Huấn luyện
-print("\n[INFO] Training faces. Please wait ...")
-faces, ids, label_ids = getImagesAndLabels()
+        # Liệt kê ảnh; việc đọc ảnh + phát hiện khuôn mặt chia cho các tiến trình
+        tasks.extend((img_path, id) for img_path in list_images(folder_path))
 
-# Nếu không có dữ liệu
-if len(faces) == 0:
-    print("Không tìm thấy ảnh khuôn mặt nào để train. Kiểm tra lại dữ liệu trong database.")
-    exit()
+    return tasks, label_ids
 
-recognizer.train(faces, np.array(ids))
 
-# Tạo thư mục trainer nếu chưa có
-if not os.path.exists('trainer'):
-    os.makedirs('trainer')
+def detectFaces(tasks):
+    """Lấy khuôn mặt từ cache hoặc đọc ảnh + phát hiện song song; trả về (faces, ids, image_faces)"""
+    print(f"[INFO] Đọc {len(tasks)} ảnh bằng {TRAINING_WORKERS} tiến trình.")
+    faceSamples, ids, image_faces, stats = load_training_faces(
+        tasks, CASCADE_PATH, workers=TRAINING_WORKERS, chunk_size=TRAINING_CHUNK_SIZE, use_cache=TRAINING_CACHE
+    )
+    if TRAINING_CACHE:
+        print(f"[INFO] Cache khuôn mặt: {stats['cache_hits']} ảnh lấy từ cache, "
+              f"{stats['cache_misses']} ảnh phải xử lý lại.")
+    print(f"[INFO] Đọc ảnh xong: {stats['faces']} khuôn mặt từ {stats['images']} ảnh trong "
+          f"{stats['elapsed_s']:.1f} s ({stats['images_per_s']:.1f} ảnh/giây); "
+          f"{stats['no_face']} ảnh không thấy mặt, {stats['errors']} ảnh lỗi.")
+    return faceSamples, ids, image_faces
 
-# Lưu mô hình và ánh xạ
-recognizer.write('trainer/trainer.yml')
-with open(labels_file, 'w') as f:
-    json.dump(label_ids, f)
 
-print(f"\nTraining completed successfully. Trained on {len(label_ids)} users.")
-print(f"Saved model to: trainer/trainer.yml")
-print(f"Saved label mapping to: {labels_file}")
\ No newline at end of file
+def add_to_manifest(images, tasks, image_faces):
+    """Ghi vào manifest các ảnh đã đọc được (ảnh lỗi sẽ được thử lại ở lần sau)"""
+    for img_path, label in tasks:
+        if img_path in image_faces:
+            images[img_path] = manifest_entry(img_path, label, image_faces[img_path])
+    return images
+
+
+# Trên Windows các tiến trình con import lại file này: chỉ huấn luyện ở tiến trình chính
+if __name__ == "__main__":
+    # Tạo recognizer LBPH
+    try:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        print("LBPH Face Recognizer created successfully.")
+    except AttributeError:
+        print("Không thể tạo LBPH Recognizer. Cần cài opencv-contrib-python.")
+        exit()
+
+    # Mapping cũ để giữ ổn định ID của sinh viên đã huấn luyện
+    old_label_ids = {}
+    if os.path.exists(labels_file):
+        with open(labels_file, 'r') as f:
+            old_label_ids = json.load(f)
+
+    manifest = load_manifest(manifest_file) if TRAINING_MODE != "full" else None
+    incremental = manifest is not None and bool(old_label_ids) and os.path.exists(model_file)
+
+    tasks, label_ids = getImagesAndLabels(old_label_ids)
+
+    if incremental:
+        new_tasks, changed = diff_manifest(tasks, manifest)
+        if changed:
+            # LBPH không gỡ được ảnh đã học: ảnh bị xóa/sửa thì phải huấn luyện lại toàn bộ
+            print(f"[INFO] {len(changed)} ảnh đã bị xóa hoặc thay đổi từ lần huấn luyện trước, "
+                  f"huấn luyện lại từ đầu.")
+            incremental = False
+
+    if incremental:
+        if not new_tasks:
+            print("\n[INFO] Không có ảnh mới. Mô hình đã cập nhật, không cần huấn luyện.")
+            exit()
+
+        # Huấn luyện thêm chỉ với ảnh mới
+        print(f"\n[INFO] Incremental training: {len(new_tasks)} ảnh mới. Please wait ...")
+        faces, ids, image_faces = detectFaces(new_tasks)
+        if len(faces) > 0:
+            recognizer.read(model_file)
+            recognizer.update(faces, np.array(ids))
+        current_paths = {img_path for img_path, _ in tasks}
+        images = {path: entry for path, entry in manifest.items() if path in current_paths}
+        images = add_to_manifest(images, new_tasks, image_faces)
+    else:
+        # Huấn luyện lại từ đầu
+        print("\n[INFO] Training faces. Please wait ...")
+        faces, ids, image_faces = detectFaces(tasks)
+
+        # Nếu không có dữ liệu
+        if len(faces) == 0:
+            print("Không tìm thấy ảnh khuôn mặt nào để train. Kiểm tra lại dữ liệu trong database.")
+            exit()
+
+        recognizer.train(faces, np.array(ids))
+        images = add_to_manifest({}, tasks, image_faces)
+
+    # Tạo thư mục trainer nếu chưa có
+    if not os.path.exists('trainer'):
+        os.makedirs('trainer')
+
+    # Lưu mô hình, ánh xạ và manifest (manifest ghi sau cùng)
+    if len(faces) > 0:
+        recognizer.write(model_file)
+        save_model(BatchLBPHMatcher(recognizer), artifact_file, label_ids, source_path=model_file)
+    with open(labels_file, 'w') as f:
+        json.dump(label_ids, f)
+    save_manifest(manifest_file, images)
+
+    print(f"\nTraining completed successfully. Trained on {len(label_ids)} users.")
+    print(f"Saved model to: {model_file}")
+    print(f"Saved binary model to: {artifact_file}.npy / {artifact_file}.json")
+    print(f"Saved label mapping to: {labels_file}")
+    print(f"Saved training manifest to: {manifest_file} ({len(images)} ảnh)")
@@ -1,33 +1,67 @@
 import cv2
 import numpy as np
-import json
 import os
-from datetime import datetime, timedelta
-from db import get_connection
+import time
+from datetime import datetime
+from attendance_session import SESSION_MINUTES, close_session, load_roster, open_session, session_end_time
+from attendance_writer import AttendanceQueueWriter
+from evidence_writer import EvidenceWriter
+from face_engine import FaceEngine, load_labels, load_recognizer
+from lbph_matcher import load_gallery, load_matcher
+from pipeline import RecognitionPipeline
+from tracker import FaceTracker
 
 CONFIDENCE_THRESHOLD = 75  # hoặc 65 tùy bạn điều chỉnh thử nghiệm
 
+# Số luồng phát hiện/nhận diện chạy song song (để lại một nhân cho camera và hiển thị)
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+
+# Theo dõi khuôn mặt qua các khung: mỗi người chỉ predict tới khi đủ TRACK_VOTES phiếu trùng nhau
+FACE_TRACKING = os.getenv("FACE_TRACKING", "yes").lower() == "yes"
+TRACK_VOTES = int(os.getenv("TRACK_VOTES", "3"))
+
+# Giảm chi phí phát hiện trên máy yếu: thu nhỏ khung trước khi chạy cascade (1.0 = giữ nguyên),
+# và chỉ tìm quanh các khuôn mặt cũ, quét toàn khung mỗi FULL_SCAN_INTERVAL khung
+# (ROI_DETECTION cần xử lý tuần tự: khi bật, pipeline chỉ chạy 1 luồng nhận diện bất kể RECOGNITION_WORKERS)
+DETECT_SCALE = float(os.getenv("DETECT_SCALE", "1.0"))
+ROI_DETECTION = os.getenv("ROI_DETECTION", "no").lower() == "yes"
+FULL_SCAN_INTERVAL = int(os.getenv("FULL_SCAN_INTERVAL", "10"))
+
+# Cách so khớp LBPH: "opencv" (recognizer.predict từng mặt) hoặc "batch" (NumPy, mọi mặt trong khung một lượt)
+RECOGNIZER_ENGINE = os.getenv("RECOGNIZER_ENGINE", "opencv").lower()
+
+# Chỉ so khớp với sinh viên của lịch học (dùng so khớp NumPy); gallery được cache theo danh sách sinh viên
+GALLERY_MODE = os.getenv("GALLERY_MODE", "no").lower() == "yes"
+
 # Đường dẫn model và label
 MODEL_PATH = "trainer/trainer.yml"
+# Artifact nhị phân do 02_Face_Training.py / convert_model.py tạo; engine "batch" ưu tiên dùng nếu còn khớp trainer.yml
+ARTIFACT_PATH = "trainer/model"
 LABELS_PATH = "trainer/labels.json"
+GALLERY_CACHE_DIR = "trainer/gallery"
 CASCADE_PATH = "haarcascade_frontalface_default.xml"
 # Thư mục lưu ảnh chụp khi điểm danh (có thể sửa đường dẫn)
 CAPTURED_DIR = os.path.join(os.getcwd(), "Captured")
-
-# Load mô hình đã huấn luyện
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-recognizer.read(MODEL_PATH)
-
-# Load bộ nhận diện khuôn mặt
-face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+# Ảnh Unknown: tối đa một ảnh mỗi UNKNOWN_CAPTURE_INTERVAL giây, MAX_UNKNOWN_CAPTURES ảnh mỗi phiên
+UNKNOWN_CAPTURE_INTERVAL = float(os.getenv("UNKNOWN_CAPTURE_INTERVAL", "5"))
+MAX_UNKNOWN_CAPTURES = int(os.getenv("MAX_UNKNOWN_CAPTURES", "50"))
+
+# Load mô hình đã huấn luyện (chế độ gallery: chỉ load khi chưa có cache cho lịch học)
+recognizer = None
+matcher = None
+if GALLERY_MODE:
+    pass
+elif RECOGNIZER_ENGINE == "batch":
+    load_started = time.perf_counter()
+    matcher, model_source = load_matcher(MODEL_PATH, ARTIFACT_PATH)
+    print(f"[INFO] Đã load model ({'artifact nhị phân' if model_source == 'artifact' else 'trainer.yml'}) "
+          f"trong {time.perf_counter() - load_started:.2f} s.")
+else:
+    recognizer = load_recognizer(MODEL_PATH)
 
 # Load mapping ID -> Tên người dùng
-if os.path.exists(LABELS_PATH):
-    with open(LABELS_PATH, "r") as f:
-        label_dict = json.load(f)
-    # Đảo ngược lại: ID (int) -> Tên
-    id_to_name = {v: k for k, v in label_dict.items()}
-else:
+id_to_name = load_labels(LABELS_PATH)
+if id_to_name is None:
     print("Không tìm thấy labels.json. Vui lòng huấn luyện trước.")
     exit()
 
@@ -39,90 +73,29 @@ print("\n[INFO] Chuẩn bị điểm danh.")
 # Nhập mã lịch học
 ma_lich_hoc = input("\nNhập mã lịch học (ví dụ: LH01): ")
 
-# Kiểm tra và tự động thêm dữ liệu vào LichHoc_SinhVien
-try:
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Kiểm tra xem MaLichHoc có tồn tại trong LichHoc không
-    cursor.execute(
-        "SELECT COUNT(*) FROM [dbo].[LichHoc] WHERE MaLichHoc = ?",
-        (ma_lich_hoc,),
-    )
-    lich_hoc_count = cursor.fetchone()[0]
-    if lich_hoc_count == 0:
-        print(f"[ERROR] Mã lịch học {ma_lich_hoc} không tồn tại trong bảng LichHoc.")
-        exit()
-
-    # Kiểm tra xem LichHoc_SinhVien đã có dữ liệu cho MaLichHoc chưa
-    cursor.execute(
-        "SELECT COUNT(*) FROM [dbo].[LichHoc_SinhVien] WHERE MaLichHoc = ?",
-        (ma_lich_hoc,),
-    )
-    lich_hoc_sinh_vien_count = cursor.fetchone()[0]
-
-    if lich_hoc_sinh_vien_count == 0:
-        # Lấy danh sách tất cả sinh viên từ bảng SinhVien
-        cursor.execute("SELECT MaSinhVien FROM [dbo].[SinhVien]")
-        sinh_vien_list = [row[0] for row in cursor.fetchall()]
-        
-        if not sinh_vien_list:
-            print("[ERROR] Không có sinh viên nào trong bảng SinhVien.")
-            exit()
-
-        # Thêm sinh viên vào LichHoc_SinhVien
-        for ma_sinh_vien in sinh_vien_list:
-            cursor.execute(
-                "INSERT INTO [dbo].[LichHoc_SinhVien] (MaLichHoc, MaSinhVien) VALUES (?, ?)",
-                (ma_lich_hoc, ma_sinh_vien),
-            )
-        conn.commit()
-        print(f"[INFO] Đã tự động thêm {len(sinh_vien_list)} sinh viên vào lịch học {ma_lich_hoc} trong bảng LichHoc_SinhVien.")
-    else:
-        print(f"[INFO] Lịch học {ma_lich_hoc} đã có dữ liệu sinh viên trong LichHoc_SinhVien.")
-
-except Exception as e:
-    print(f"[ERROR] Lỗi khi kiểm tra hoặc thêm dữ liệu vào LichHoc_SinhVien: {str(e)}")
+# Kiểm tra lịch học, tự động thêm sinh viên và khởi tạo hoặc lấy phiên điểm danh
+start_time = open_session(ma_lich_hoc)
+if start_time is None:
     exit()
-finally:
-    cursor.close()
-    conn.close()
 
-# Khởi tạo hoặc lấy phiên điểm danh
+# Đọc một lần danh sách sinh viên của lịch học và những ai đã được điểm danh (nếu chạy lại giữa phiên)
 try:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT ThoiGianBatDau, TrangThai FROM [dbo].[PhienDiemDanh] WHERE MaLichHoc = ?",
-        (ma_lich_hoc,),
-    )
-    phien = cursor.fetchone()
-
-    if phien is None:  # Nếu chưa có phiên điểm danh
-        start_time = datetime.now()
-        cursor.execute(
-            "INSERT INTO [dbo].[PhienDiemDanh] (MaLichHoc, ThoiGianBatDau, TrangThai) "
-            "VALUES (?, ?, ?)",
-            (ma_lich_hoc, start_time, "Đang mở"),
-        )
-        conn.commit()
-        print(
-            f"[INFO] Đã tạo phiên điểm danh mới cho lịch học {ma_lich_hoc} "
-            f"với thời gian bắt đầu {start_time}."
-        )
-    else:
-        start_time = phien[0]
-        trang_thai = phien[1]
-        if trang_thai == "Hoàn tất":
-            print(f"[WARNING] Phiên điểm danh cho lịch học {ma_lich_hoc} đã hoàn tất.")
-            exit()
-
+    roster, recorded = load_roster(ma_lich_hoc)
 except Exception as e:
-    print(f"[ERROR] Lỗi khi kiểm tra hoặc tạo phiên điểm danh: {str(e)}")
+    print(f"[ERROR] Lỗi khi đọc danh sách sinh viên của lịch học {ma_lich_hoc}: {str(e)}")
     exit()
-finally:
-    cursor.close()
-    conn.close()
+if recorded:
+    print(f"[INFO] Tiếp tục phiên đang mở: {len(recorded)} sinh viên đã được điểm danh trước đó.")
+
+if GALLERY_MODE:
+    # Chỉ giữ histogram của sinh viên thuộc lịch học
+    name_to_id = {name: label for label, name in id_to_name.items()}
+    roster_labels = {name_to_id[ma_sv] for ma_sv in roster if ma_sv in name_to_id}
+    if len(roster_labels) < len(roster):
+        print(f"[WARNING] {len(roster) - len(roster_labels)} sinh viên của lịch học chưa có dữ liệu huấn luyện.")
+    matcher, from_cache = load_gallery(MODEL_PATH, roster_labels, GALLERY_CACHE_DIR, artifact_path=ARTIFACT_PATH)
+    print(f"[INFO] Gallery của lịch học: {len(roster_labels)} sinh viên, {len(matcher)} mẫu "
+          f"({'từ cache' if from_cache else 'mới tạo'}).")
 
 # Khởi tạo webcam sau khi nhập mã lịch học
 cam = cv2.VideoCapture(0)
@@ -138,80 +111,83 @@ minH = 0.1 * cam.get(4)
 
 font = cv2.FONT_HERSHEY_SIMPLEX
 
-print("\n[INFO] Bắt đầu nhận diện. Nhấn ESC để thoát. Phiên sẽ tự động kết thúc sau 15 phút.")
-
-# Tập hợp để theo dõi sinh viên đã được xử lý trong phiên này
-processed_students = set()
-
-# Thời gian hết hạn (15 phút từ khi bắt đầu)
-end_time = start_time + timedelta(minutes=15)
+# Bộ theo dõi khuôn mặt (None nếu tắt FACE_TRACKING: predict mọi khuôn mặt ở mọi khung)
+tracker = FaceTracker(confidence_threshold=CONFIDENCE_THRESHOLD, votes_needed=TRACK_VOTES) if FACE_TRACKING else None
+
+# Luồng nền ghi ảnh bằng chứng: mỗi sinh viên giữ một ảnh tốt nhất, ảnh Unknown bị giới hạn
+evidence = EvidenceWriter(CAPTURED_DIR, unknown_interval=UNKNOWN_CAPTURE_INTERVAL, max_unknowns=MAX_UNKNOWN_CAPTURES)
+evidence.start()
+
+# Bộ phát hiện + nhận diện dùng chung cho các luồng nhận diện
+engine = FaceEngine(
+    recognizer,
+    CASCADE_PATH,
+    id_to_name,
+    min_size=(minW, minH),
+    scale_factor=1.2,
+    min_neighbors=5,
+    confidence_threshold=CONFIDENCE_THRESHOLD,
+    evidence=evidence,
+    tracker=tracker,
+    detect_scale=DETECT_SCALE,
+    roi_detection=ROI_DETECTION,
+    full_scan_interval=FULL_SCAN_INTERVAL,
+    matcher=matcher,
+)
+
+print(f"\n[INFO] Bắt đầu nhận diện. Nhấn ESC để thoát. Phiên sẽ tự động kết thúc sau {SESSION_MINUTES} phút.")
+
+# Tập hợp để theo dõi sinh viên đã được xử lý trong phiên này (gồm cả bản ghi đã có trong database)
+processed_students = set(recorded)
+# Sinh viên nhận diện được nhưng không thuộc lịch học (chỉ cảnh báo một lần)
+not_enrolled = set()
+
+# Thời gian hết hạn (SESSION_MINUTES phút từ khi bắt đầu)
+end_time = session_end_time(start_time)
+
+# Luồng nền ghi bản ghi "Có mặt" theo lô
+attendance_writer = AttendanceQueueWriter(ma_lich_hoc)
+attendance_writer.set_roster(ma_lich_hoc, roster)
+attendance_writer.start()
+
+# Luồng camera -> các luồng nhận diện -> luồng chính (điểm danh + hiển thị)
+pipeline = RecognitionPipeline(cam, engine, workers=RECOGNITION_WORKERS)
+pipeline.start()
 
 while True:
     # Kiểm tra thời gian hết hạn
     current_time = datetime.now()
     if current_time > end_time:
-        print(f"[INFO] Phiên điểm danh cho lịch học {ma_lich_hoc} đã hết thời gian (15 phút).")
-        break
-
-    ret, img = cam.read()
-    if not ret:
-        print("[ERROR] Không thể đọc từ webcam.")
+        print(f"[INFO] Phiên điểm danh cho lịch học {ma_lich_hoc} đã hết thời gian ({SESSION_MINUTES} phút).")
         break
 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    faces = face_cascade.detectMultiScale(
-        gray, scaleFactor=1.2, minNeighbors=5, minSize=(int(minW), int(minH))
-    )
+    result = pipeline.get_result(timeout=1.0)
+    if result is None:
+        if not pipeline.is_alive():
+            print("[ERROR] Không thể đọc từ webcam.")
+            break
+        continue
 
-    for (x, y, w, h) in faces:
-        roi_gray = gray[y : y + h, x : x + w]
-        id_pred, confidence = recognizer.predict(roi_gray)
+    img = result.image
 
-        # Lưu ảnh mới chụp
-        file_name = (
-            f"{id_to_name.get(id_pred, 'unknown')}_attendance_"
-            f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        )
-        file_path = os.path.join(CAPTURED_DIR, file_name)
-        cv2.imwrite(file_path, img[y : y + h, x : x + w])
+    for face in result.faces:
+        x, y, w, h = face.box
+        confidence = face.confidence
 
-        # Confidence càng nhỏ thì càng chính xác
-        if confidence < 75:
-            ma_sinh_vien = id_to_name.get(id_pred, "Unknown")
+        # Confidence càng nhỏ thì càng chính xác (khi bật tracker: track đã đủ phiếu)
+        if confidence < CONFIDENCE_THRESHOLD and face.ma_sinh_vien != "Unknown":
+            ma_sinh_vien = face.ma_sinh_vien
             confidence_text = "  {0}%".format(round(60 - confidence))
 
-            # Kiểm tra xem sinh viên đã được điểm danh trong phiên này chưa
-            if ma_sinh_vien not in processed_students and ma_sinh_vien != "Unknown":
-                try:
-                    conn = get_connection()
-                    cursor = conn.cursor()
-
-                    # Kiểm tra xem sinh viên có trong LichHoc_SinhVien không
-                    cursor.execute(
-                        "SELECT COUNT(*) FROM [dbo].[LichHoc_SinhVien] WHERE MaLichHoc = ? AND MaSinhVien = ?",
-                        (ma_lich_hoc, ma_sinh_vien),
-                    )
-                    exists = cursor.fetchone()[0]
-
-                    if exists:
-                        # Thêm bản ghi điểm danh vào bảng DiemDanh với đường dẫn ảnh
-                        cursor.execute(
-                            "INSERT INTO [dbo].[DiemDanh] (MaLichHoc, MaSinhVien, ThoiGianDiemDanh, TrangThai, DULieuAnhMoi, GhiChu) "
-                            "VALUES (?, ?, ?, ?, ?, ?)",
-                            (ma_lich_hoc, ma_sinh_vien, current_time, "Có mặt", file_path, None),
-                        )
-                        conn.commit()
-                        print(f"[INFO] Đã điểm danh sinh viên {ma_sinh_vien} cho lịch học {ma_lich_hoc}.")
-                        processed_students.add(ma_sinh_vien)
-                    else:
-                        print(f"[WARNING] Sinh viên {ma_sinh_vien} không thuộc lịch học {ma_lich_hoc}.")
-
-                except Exception as e:
-                    print(f"[ERROR] Lỗi khi điểm danh sinh viên {ma_sinh_vien}: {str(e)}")
-                finally:
-                    cursor.close()
-                    conn.close()
+            # Kiểm tra trong bộ nhớ: sinh viên thuộc lịch học và chưa được điểm danh trong phiên này
+            if ma_sinh_vien not in roster:
+                if ma_sinh_vien not in not_enrolled:
+                    not_enrolled.add(ma_sinh_vien)
+                    print(f"[WARNING] Sinh viên {ma_sinh_vien} không thuộc lịch học {ma_lich_hoc}.")
+            elif ma_sinh_vien not in processed_students:
+                # Ghi vào database ở luồng nền, không làm đứng khung hình
+                attendance_writer.submit(ma_sinh_vien, current_time, face.file_path)
+                processed_students.add(ma_sinh_vien)
 
             # Hiển thị thông tin trên frame
             cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
@@ -240,58 +216,29 @@ while True:
     # Hiển thị frame
     cv2.imshow("Face Recognition", img)
 
-    # Nhấn ESC để thoát
-    key = cv2.waitKey(30) & 0xFF
+    # Nhấn ESC để thoát (chỉ chờ 1 ms: nhịp khung hình do luồng camera quyết định)
+    key = cv2.waitKey(1) & 0xFF
     if key == 27:  # ESC
         print("[INFO] Thoát thủ công bởi người dùng.")
         break
 
-# Thêm dữ liệu cho sinh viên vắng mặt sau khi kết thúc phiên
-try:
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Lấy danh sách tất cả sinh viên của lịch học
-    cursor.execute(
-        "SELECT MaSinhVien FROM [dbo].[LichHoc_SinhVien] WHERE MaLichHoc = ?",
-        (ma_lich_hoc,),
-    )
-    all_students = [row[0] for row in cursor.fetchall()]
-
-    # Tìm sinh viên vắng mặt (không có trong processed_students)
-    absent_students = [ma_sinh_vien for ma_sinh_vien in all_students if ma_sinh_vien not in processed_students]
-
-    for ma_sinh_vien in absent_students:
-        cursor.execute(
-            "INSERT INTO [dbo].[DiemDanh] (MaLichHoc, MaSinhVien, ThoiGianDiemDanh, TrangThai, GhiChu) "
-            "VALUES (?, ?, ?, ?, ?)",
-            (ma_lich_hoc, ma_sinh_vien, datetime.now(), "Vắng mặt", "Nghỉ không phép"),
-        )
-        print(f"[INFO] Đã thêm sinh viên {ma_sinh_vien} vào danh sách vắng mặt cho lịch học {ma_lich_hoc}.")
-
-    conn.commit()
-
-except Exception as e:
-    print(f"[ERROR] Lỗi khi thêm dữ liệu sinh viên vắng mặt: {str(e)}")
-finally:
-    cursor.close()
-    conn.close()
-
-# Cập nhật trạng thái phiên điểm danh thành "Hoàn tất"
-try:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE [dbo].[PhienDiemDanh] SET TrangThai = ? WHERE MaLichHoc = ?",
-        ("Hoàn tất", ma_lich_hoc),
-    )
-    conn.commit()
-    print(f"[INFO] Đã cập nhật trạng thái phiên điểm danh cho lịch học {ma_lich_hoc} thành 'Hoàn tất'.")
-except Exception as e:
-    print(f"[ERROR] Lỗi khi cập nhật trạng thái phiên điểm danh: {str(e)}")
-finally:
-    cursor.close()
-    conn.close()
+pipeline.stop()
+pipeline.print_summary()
+if tracker:
+    t = tracker.summary()
+    print(f"[INFO] Tracker: {t['tracks_created']} track, {t['predict_calls']}/{t['faces_seen']} lần predict "
+          f"(bỏ qua {t['predict_saved_pct']:.0f}%).")
+if ROI_DETECTION:
+    d = engine.detect_stats
+    print(f"[INFO] Phát hiện: {d['full_scans']} lần quét toàn khung, {d['roi_scans']} lần quét theo vùng "
+          f"(trung bình {d['roi_pixels_pct']:.0f}% diện tích khung).")
+
+# Ghi nốt ảnh bằng chứng và các lượt điểm danh còn trong hàng đợi trước khi tính vắng mặt
+evidence.close()
+attendance_writer.close()
+
+# Ghi vắng mặt cho sinh viên chưa điểm danh và cập nhật phiên thành "Hoàn tất"
+close_session(ma_lich_hoc)
 
 # Giải phóng tài nguyên
 cam.release()
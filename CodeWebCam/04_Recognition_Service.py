@@ -0,0 +1,20 @@
+import argparse
+
+from recognition_service import load_config, RecognitionService
+
+# Điểm danh nhiều phòng học cùng lúc: mỗi camera một tiến trình, một luồng ghi database dùng chung.
+# Chạy: python 04_Recognition_Service.py --config service_config.json
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service điểm danh nhiều camera / nhiều lịch học")
+    parser.add_argument("--config", default="service_config.json",
+                        help="File JSON liệt kê các cặp (source, ma_lich_hoc)")
+    args = parser.parse_args()
+
+    options, streams = load_config(args.config)
+    if not streams:
+        print("[ERROR] File cấu hình không có camera nào.")
+        exit()
+
+    print(f"\n[INFO] Khởi động service điểm danh với {len(streams)} camera.")
+    RecognitionService(options, streams).run()
@@ -0,0 +1,158 @@
+"""
+Mở và kết thúc phiên điểm danh cho một lịch học (dùng chung cho script điểm danh và service nhiều camera).
+"""
+from datetime import datetime, timedelta
+
+from db import get_connection
+from attendance_writer import enroll_all_students, mark_absent_students
+
+SESSION_MINUTES = 15  # Phiên tự động kết thúc sau 15 phút kể từ lúc bắt đầu
+
+
+def open_session(ma_lich_hoc):
+    """
+    Kiểm tra lịch học, tự động thêm sinh viên nếu lịch học chưa có danh sách,
+    rồi tạo (hoặc lấy lại) phiên điểm danh.
+    Trả về thời gian bắt đầu phiên; None nếu không thể điểm danh (đã in lý do).
+    """
+    # Kiểm tra và tự động thêm dữ liệu vào LichHoc_SinhVien
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        # Kiểm tra xem MaLichHoc có tồn tại trong LichHoc không
+        cursor.execute(
+            "SELECT COUNT(*) FROM [dbo].[LichHoc] WHERE MaLichHoc = ?",
+            (ma_lich_hoc,),
+        )
+        lich_hoc_count = cursor.fetchone()[0]
+        if lich_hoc_count == 0:
+            print(f"[ERROR] Mã lịch học {ma_lich_hoc} không tồn tại trong bảng LichHoc.")
+            return None
+
+        # Kiểm tra xem LichHoc_SinhVien đã có dữ liệu cho MaLichHoc chưa
+        cursor.execute(
+            "SELECT COUNT(*) FROM [dbo].[LichHoc_SinhVien] WHERE MaLichHoc = ?",
+            (ma_lich_hoc,),
+        )
+        lich_hoc_sinh_vien_count = cursor.fetchone()[0]
+
+        if lich_hoc_sinh_vien_count == 0:
+            # Thêm toàn bộ sinh viên từ bảng SinhVien vào LichHoc_SinhVien bằng một câu lệnh
+            so_sinh_vien, elapsed_ms = enroll_all_students(conn, ma_lich_hoc)
+
+            if so_sinh_vien == 0:
+                print("[ERROR] Không có sinh viên nào trong bảng SinhVien.")
+                return None
+
+            conn.commit()
+            print(f"[INFO] Đã tự động thêm {so_sinh_vien} sinh viên vào lịch học {ma_lich_hoc} "
+                  f"trong bảng LichHoc_SinhVien ({elapsed_ms:.1f} ms).")
+        else:
+            print(f"[INFO] Lịch học {ma_lich_hoc} đã có dữ liệu sinh viên trong LichHoc_SinhVien.")
+
+        # Khởi tạo hoặc lấy phiên điểm danh
+        cursor.execute(
+            "SELECT ThoiGianBatDau, TrangThai FROM [dbo].[PhienDiemDanh] WHERE MaLichHoc = ?",
+            (ma_lich_hoc,),
+        )
+        phien = cursor.fetchone()
+
+        if phien is None:  # Nếu chưa có phiên điểm danh
+            start_time = datetime.now()
+            cursor.execute(
+                "INSERT INTO [dbo].[PhienDiemDanh] (MaLichHoc, ThoiGianBatDau, TrangThai) "
+                "VALUES (?, ?, ?)",
+                (ma_lich_hoc, start_time, "Đang mở"),
+            )
+            conn.commit()
+            print(
+                f"[INFO] Đã tạo phiên điểm danh mới cho lịch học {ma_lich_hoc} "
+                f"với thời gian bắt đầu {start_time}."
+            )
+        else:
+            start_time = phien[0]
+            trang_thai = phien[1]
+            if trang_thai == "Hoàn tất":
+                print(f"[WARNING] Phiên điểm danh cho lịch học {ma_lich_hoc} đã hoàn tất.")
+                return None
+
+        return start_time
+
+    except Exception as e:
+        print(f"[ERROR] Lỗi khi kiểm tra lịch học hoặc tạo phiên điểm danh {ma_lich_hoc}: {str(e)}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def load_roster(ma_lich_hoc):
+    """
+    Đọc một lần khi mở phiên: danh sách sinh viên của lịch học và những sinh viên đã có
+    bản ghi DiemDanh (khi chạy lại script giữa phiên). Trả về (roster, recorded) là hai set;
+    mọi kiểm tra sau đó làm trong bộ nhớ, không truy vấn database cho từng khuôn mặt.
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT MaSinhVien FROM [dbo].[LichHoc_SinhVien] WHERE MaLichHoc = ?",
+            (ma_lich_hoc,),
+        )
+        roster = {row[0] for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT DISTINCT MaSinhVien FROM [dbo].[DiemDanh] WHERE MaLichHoc = ?",
+            (ma_lich_hoc,),
+        )
+        recorded = {row[0] for row in cursor.fetchall()}
+        return roster, recorded
+    finally:
+        if conn:
+            conn.close()
+
+
+def session_end_time(start_time):
+    return start_time + timedelta(minutes=SESSION_MINUTES)
+
+
+def close_session(ma_lich_hoc):
+    """
+    Ghi vắng mặt cho sinh viên chưa được điểm danh và chuyển phiên sang "Hoàn tất".
+    Gọi sau khi mọi bản ghi "Có mặt" của phiên đã được ghi xong.
+    """
+    # Thêm dữ liệu cho sinh viên vắng mặt sau khi kết thúc phiên
+    conn = None
+    try:
+        conn = get_connection()
+
+        # Ghi vắng mặt cho mọi sinh viên của lịch học chưa có bản ghi điểm danh (một câu lệnh)
+        so_vang_mat, elapsed_ms = mark_absent_students(conn, ma_lich_hoc, datetime.now())
+        conn.commit()
+        print(f"[INFO] Đã thêm {so_vang_mat} sinh viên vào danh sách vắng mặt cho lịch học {ma_lich_hoc} "
+              f"({elapsed_ms:.1f} ms).")
+
+    except Exception as e:
+        print(f"[ERROR] Lỗi khi thêm dữ liệu sinh viên vắng mặt: {str(e)}")
+    finally:
+        if conn:
+            conn.close()
+
+    # Cập nhật trạng thái phiên điểm danh thành "Hoàn tất"
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE [dbo].[PhienDiemDanh] SET TrangThai = ? WHERE MaLichHoc = ?",
+            ("Hoàn tất", ma_lich_hoc),
+        )
+        conn.commit()
+        print(f"[INFO] Đã cập nhật trạng thái phiên điểm danh cho lịch học {ma_lich_hoc} thành 'Hoàn tất'.")
+    except Exception as e:
+        print(f"[ERROR] Lỗi khi cập nhật trạng thái phiên điểm danh: {str(e)}")
+    finally:
+        if conn:
+            conn.close()
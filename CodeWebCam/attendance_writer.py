@@ -0,0 +1,263 @@
+"""
+Ghi dữ liệu điểm danh theo lô: mỗi thao tác là một câu lệnh INSERT ... SELECT
+hoặc một lần executemany, thay vì một lượt gửi/nhận database cho mỗi sinh viên.
+
+AttendanceQueueWriter ghi "Có mặt" ở luồng nền (write-behind) để vòng lặp camera
+không phải chờ database.
+"""
+import queue
+import threading
+import time
+
+from attendance_stats import record_enrollment, record_present, record_session_absences
+from db import get_connection
+
+# Thêm toàn bộ sinh viên vào lịch học (bỏ qua sinh viên đã có)
+SQL_ENROLL_ALL = (
+    "INSERT INTO [dbo].[LichHoc_SinhVien] (MaLichHoc, MaSinhVien) "
+    "SELECT ?, sv.MaSinhVien FROM [dbo].[SinhVien] sv "
+    "WHERE NOT EXISTS (SELECT 1 FROM [dbo].[LichHoc_SinhVien] lhs "
+    "WHERE lhs.MaLichHoc = ? AND lhs.MaSinhVien = sv.MaSinhVien)"
+)
+
+# Đánh dấu vắng mặt mọi sinh viên của lịch học chưa có bản ghi điểm danh
+SQL_MARK_ABSENT = (
+    "INSERT INTO [dbo].[DiemDanh] (MaLichHoc, MaSinhVien, ThoiGianDiemDanh, TrangThai, GhiChu) "
+    "SELECT lhs.MaLichHoc, lhs.MaSinhVien, ?, N'Vắng mặt', N'Nghỉ không phép' "
+    "FROM [dbo].[LichHoc_SinhVien] lhs "
+    "WHERE lhs.MaLichHoc = ? AND NOT EXISTS (SELECT 1 FROM [dbo].[DiemDanh] dd "
+    "WHERE dd.MaLichHoc = lhs.MaLichHoc AND dd.MaSinhVien = lhs.MaSinhVien)"
+)
+
+SQL_INSERT_PRESENT = (
+    "INSERT INTO [dbo].[DiemDanh] (MaLichHoc, MaSinhVien, ThoiGianDiemDanh, TrangThai, DULieuAnhMoi, GhiChu) "
+    "VALUES (?, ?, ?, N'Có mặt', ?, NULL)"
+)
+
+
+def _elapsed_ms(started):
+    return (time.perf_counter() - started) * 1000
+
+
+def enroll_all_students(conn, ma_lich_hoc):
+    """
+    Thêm tất cả sinh viên trong bảng SinhVien vào LichHoc_SinhVien bằng một câu lệnh.
+    Trả về (số sinh viên được thêm, thời gian ms). Không tự commit.
+    """
+    started = time.perf_counter()
+    record_enrollment(conn, ma_lich_hoc)  # cập nhật thống kê dashboard trước khi thêm
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_ENROLL_ALL, (ma_lich_hoc, ma_lich_hoc))
+        return max(cursor.rowcount, 0), _elapsed_ms(started)
+    finally:
+        cursor.close()
+
+
+def mark_absent_students(conn, ma_lich_hoc, thoi_gian):
+    """
+    Ghi "Vắng mặt" cho các sinh viên của lịch học chưa được điểm danh, bằng một câu lệnh.
+    Trả về (số bản ghi vắng mặt, thời gian ms). Không tự commit.
+    """
+    started = time.perf_counter()
+    record_session_absences(conn, ma_lich_hoc)  # cập nhật thống kê dashboard trước khi ghi
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_MARK_ABSENT, (thoi_gian, ma_lich_hoc))
+        return max(cursor.rowcount, 0), _elapsed_ms(started)
+    finally:
+        cursor.close()
+
+
+def insert_present_rows(conn, rows):
+    """
+    Ghi nhiều bản ghi "Có mặt" trong một lần executemany.
+    rows: danh sách (MaLichHoc, MaSinhVien, ThoiGianDiemDanh, DULieuAnhMoi).
+    Trả về (số bản ghi, thời gian ms). Không tự commit.
+    """
+    if not rows:
+        return 0, 0.0
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.fast_executemany = True  # pyodbc: gửi cả lô tham số trong một lượt
+        cursor.executemany(SQL_INSERT_PRESENT, rows)
+        record_present(conn, [row[1] for row in rows])
+        return len(rows), _elapsed_ms(started)
+    finally:
+        cursor.close()
+
+
+class AttendanceQueueWriter(threading.Thread):
+    """
+    Luồng nền nhận yêu cầu điểm danh qua hàng đợi có giới hạn và ghi theo lô:
+    - ghi khi đủ `batch_size` bản ghi hoặc sau `flush_interval` giây
+    - lô bị lỗi được thử lại tối đa `max_retries` lần
+    - flush() chờ tới khi mọi yêu cầu đã gửi được ghi xong
+    - close() ghi nốt mọi thứ còn trong hàng đợi rồi mới dừng
+
+    Một writer có thể phục vụ nhiều lịch học cùng lúc: truyền ma_lich_hoc khi submit().
+    Nếu đã có danh sách sinh viên của lịch học (set_roster), writer không phải truy vấn lại
+    LichHoc_SinhVien trước mỗi lô.
+    """
+
+    _STOP = object()
+
+    def __init__(self, ma_lich_hoc=None, batch_size=50, flush_interval=1.0, max_queue=1000, max_retries=3):
+        super().__init__(name=f"AttendanceWriter-{ma_lich_hoc or 'shared'}", daemon=True)
+        self.ma_lich_hoc = ma_lich_hoc
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._rosters = {}  # ma_lich_hoc -> set mã sinh viên
+
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'not_enrolled': 0,
+            'dropped': 0,
+            'batches': 0,
+            'flush_ms_total': 0.0,
+            'flush_ms_max': 0.0,
+            'max_queue_depth': 0,
+        }
+
+    def set_roster(self, ma_lich_hoc, roster):
+        """Danh sách sinh viên của lịch học đã đọc lúc mở phiên"""
+        self._rosters[ma_lich_hoc] = set(roster)
+
+    def submit(self, ma_sinh_vien, thoi_gian, file_path=None, ma_lich_hoc=None):
+        """Đưa một lượt điểm danh vào hàng đợi; gần như không bao giờ chặn vòng lặp camera"""
+        if self._closed:
+            raise RuntimeError("AttendanceQueueWriter đã đóng")
+        # [mã lịch học, mã sinh viên, thời gian, ảnh, số lần đã thử lại]
+        item = [ma_lich_hoc or self.ma_lich_hoc, ma_sinh_vien, thoi_gian, file_path, 0]
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            print("[WARNING] Hàng đợi điểm danh đầy, đang chờ database ghi kịp...")
+            self._queue.put(item)
+        self.stats['submitted'] += 1
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._queue.qsize())
+
+    def flush(self, timeout=None):
+        """Chờ tới khi mọi yêu cầu đã submit trước đó được ghi (hoặc bị bỏ sau khi thử lại)"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Ghi nốt hàng đợi, dừng luồng và in tổng kết"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self.join(timeout)
+
+        stats = self.stats
+        avg_ms = stats['flush_ms_total'] / stats['batches'] if stats['batches'] else 0.0
+        print(f"[INFO] Ghi điểm danh nền: {stats['written']}/{stats['submitted']} bản ghi, "
+              f"{stats['batches']} lô (trung bình {avg_ms:.1f} ms, tối đa {stats['flush_ms_max']:.1f} ms), "
+              f"hàng đợi dài nhất {stats['max_queue_depth']}.")
+        if stats['dropped']:
+            print(f"[ERROR] {stats['dropped']} lượt điểm danh không ghi được vào database.")
+
+    def run(self):
+        pending = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = self.flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, threading.Event):
+                # flush(): ghi ngay, thử lại tới khi xong hoặc hết lượt
+                while pending:
+                    pending = self._flush(pending)
+                    if pending:
+                        time.sleep(0.5)
+                deadline = None
+                item.set()
+                continue
+
+            if item is self._STOP:
+                stopping = True
+            elif item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (stopping or len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                pending = self._flush(pending)
+                deadline = time.monotonic() + self.flush_interval if pending else None
+
+        # Kết thúc phiên: thử lại các lô lỗi trước khi bỏ cuộc
+        while pending:
+            time.sleep(0.5)
+            pending = self._flush(pending)
+
+    def _flush(self, items):
+        """Ghi một lô; trả về các bản ghi cần thử lại"""
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
+
+            # Kiểm tra sinh viên thuộc lịch học: dùng roster trong bộ nhớ nếu có,
+            # nếu không thì một truy vấn cho mỗi lịch học trong lô
+            enrolled = set()
+            by_session = {}
+            for item in items:
+                by_session.setdefault(item[0], set()).add(item[1])
+            for ma_lich_hoc, ids in by_session.items():
+                roster = self._rosters.get(ma_lich_hoc)
+                if roster is not None:
+                    enrolled.update((ma_lich_hoc, ma_sv) for ma_sv in ids if ma_sv in roster)
+                    continue
+                ids = list(ids)
+                cursor.execute(
+                    "SELECT MaSinhVien FROM [dbo].[LichHoc_SinhVien] WHERE MaLichHoc = ? "
+                    f"AND MaSinhVien IN ({', '.join('?' * len(ids))})",
+                    (ma_lich_hoc, *ids),
+                )
+                enrolled.update((ma_lich_hoc, row[0]) for row in cursor.fetchall())
+            cursor.close()
+
+            rows = [tuple(item[:4]) for item in items if (item[0], item[1]) in enrolled]
+            insert_present_rows(conn, rows)
+            conn.commit()
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi ghi lô điểm danh ({len(items)} sinh viên): {str(e)}")
+            retry = []
+            for item in items:
+                item[4] += 1
+                if item[4] > self.max_retries:
+                    self.stats['dropped'] += 1
+                    print(f"[ERROR] Bỏ qua điểm danh sinh viên {item[1]} sau {self.max_retries} lần thử lại.")
+                else:
+                    retry.append(item)
+            return retry
+        finally:
+            if conn:
+                conn.close()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['batches'] += 1
+        self.stats['written'] += len(rows)
+        self.stats['flush_ms_total'] += elapsed_ms
+        self.stats['flush_ms_max'] = max(self.stats['flush_ms_max'], elapsed_ms)
+
+        for item in items:
+            if (item[0], item[1]) in enrolled:
+                print(f"[INFO] Đã điểm danh sinh viên {item[1]} cho lịch học {item[0]}.")
+            else:
+                self.stats['not_enrolled'] += 1
+                print(f"[WARNING] Sinh viên {item[1]} không thuộc lịch học {item[0]}.")
+        return []
@@ -0,0 +1,65 @@
+"""
+Chuyển trainer.yml (đã huấn luyện trước đây) sang artifact nhị phân load nhanh, và so sánh thời gian load.
+
+    python convert_model.py
+    python convert_model.py --model trainer/trainer.yml --labels trainer/labels.json --out trainer/model
+
+Artifact gồm `<out>.npy` (ma trận histogram, đọc bằng memory-map) và `<out>.json` (nhãn, tham số LBPH,
+mapping mã sinh viên -> nhãn). 02_Face_Training.py tự ghi artifact sau mỗi lần huấn luyện, nên chỉ cần
+chạy script này cho mô hình cũ hoặc để đo lại thời gian khởi động.
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+from lbph_matcher import BatchLBPHMatcher, load_model, save_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyển trainer.yml sang artifact nhị phân")
+    parser.add_argument("--model", default="trainer/trainer.yml")
+    parser.add_argument("--labels", default="trainer/labels.json")
+    parser.add_argument("--out", default="trainer/model", help="Đường dẫn artifact (không có đuôi)")
+    parser.add_argument("--compare-only", action="store_true", help="Chỉ đo thời gian load, không ghi artifact")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"[ERROR] Không tìm thấy {args.model}. Vui lòng huấn luyện trước.")
+        return
+
+    label_map = {}
+    if os.path.exists(args.labels):
+        with open(args.labels, "r", encoding="utf-8") as f:
+            label_map = json.load(f)
+
+    t0 = time.perf_counter()
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(args.model)
+    yml_s = time.perf_counter() - t0
+
+    if not args.compare_only:
+        t0 = time.perf_counter()
+        matcher = BatchLBPHMatcher(recognizer)
+        save_model(matcher, args.out, label_map, source_path=args.model)
+        print(f"[INFO] Đã ghi {args.out}.npy / {args.out}.json ({len(matcher)} mẫu) "
+              f"trong {time.perf_counter() - t0:.2f} s.")
+
+    t0 = time.perf_counter()
+    loaded = load_model(args.out, args.model)
+    artifact_s = time.perf_counter() - t0
+    if loaded is None:
+        print(f"[WARNING] Chưa có artifact {args.out} hoặc artifact cũ hơn {args.model}.")
+        return
+
+    matcher, _ = loaded
+    print(f"[INFO] Load trainer.yml: {yml_s:.3f} s ({os.path.getsize(args.model) / 1e6:.1f} MB).")
+    print(f"[INFO] Load artifact nhị phân: {artifact_s:.3f} s "
+          f"({os.path.getsize(args.out + '.npy') / 1e6:.1f} MB, {len(matcher)} mẫu), "
+          f"nhanh hơn {yml_s / max(artifact_s, 1e-6):.0f} lần.")
+
+
+if __name__ == "__main__":
+    main()
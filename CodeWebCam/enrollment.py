@@ -0,0 +1,118 @@
+"""
+Chọn ảnh đăng ký khuôn mặt cho 01_Face_Dataset.py.
+
+Trong lúc chụp, mỗi ứng viên (ảnh mặt + điểm chất lượng + mô tả tư thế) được mã hóa JPEG và ghi ra
+một file tạm ở luồng nền (CandidateWriter), song song với việc chụp. Kết thúc mới chọn `n` ảnh tốt nhất:
+ưu tiên ảnh nét, mặt to (face_quality như ảnh bằng chứng) nhưng tránh chọn các khung gần như giống hệt nhau,
+để tập ảnh trải đều các tư thế đầu. Ảnh được chọn chỉ cần đổi tên thành 1.jpg, 2.jpg, ...; phần còn lại bị xóa.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from evidence_writer import face_quality
+
+POSE_SIZE = (24, 24)
+
+Candidate = namedtuple('Candidate', ['crop', 'quality', 'pose'])
+
+
+def pose_descriptor(gray, box):
+    """Ảnh mặt thu nhỏ, chuẩn hóa về trung bình 0 và độ dài 1: hai khung cùng tư thế cho khoảng cách gần 0"""
+    x, y, w, h = box
+    small = cv2.resize(gray[y : y + h, x : x + w], POSE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    small -= small.mean()
+    norm = float(np.linalg.norm(small))
+    return (small / norm).ravel() if norm > 0 else small.ravel()
+
+
+def make_candidate(img, gray, box):
+    """Ứng viên từ một khuôn mặt: ảnh màu (đã chép khỏi khung), chất lượng và mô tả tư thế"""
+    x, y, w, h = box
+    return Candidate(img[y : y + h, x : x + w].copy(), face_quality(gray, box), pose_descriptor(gray, box))
+
+
+def select_best(candidates, n, diversity=0.5):
+    """
+    Chọn tối đa `n` ứng viên. Ảnh đầu tiên là ảnh chất lượng cao nhất; mỗi ảnh tiếp theo có điểm
+    (1 - diversity) * chất lượng + diversity * khoảng cách tư thế tới ảnh đã chọn gần nhất (cả hai chuẩn hóa về 0..1).
+    Trả về danh sách chỉ số theo thứ tự được chọn.
+    """
+    if not candidates or n <= 0:
+        return []
+    quality = np.array([c.quality for c in candidates], dtype=np.float64)
+    quality /= quality.max() if quality.max() > 0 else 1.0
+    poses = np.stack([c.pose for c in candidates])
+
+    selected = [int(np.argmax(quality))]
+    min_dist = np.linalg.norm(poses - poses[selected[0]], axis=1)
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(n, len(candidates)):
+        spread = min_dist / min_dist[available].max() if min_dist[available].max() > 0 else min_dist
+        score = np.where(available, (1 - diversity) * quality + diversity * spread, -np.inf)
+        best = int(np.argmax(score))
+        selected.append(best)
+        available[best] = False
+        np.minimum(min_dist, np.linalg.norm(poses - poses[best], axis=1), out=min_dist)
+    return selected
+
+
+class CandidateWriter:
+    """
+    Ghi ảnh ứng viên ra `ung_vien_<i>.tmp` trong `folder` bằng các luồng nền ngay khi được thêm vào.
+    Đuôi .tmp không nằm trong IMAGE_EXTENSIONS nên file tạm sót lại không bị đưa vào huấn luyện.
+    """
+
+    def __init__(self, folder, workers=2, jpeg_quality=95):
+        self.folder = folder
+        self._params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._futures = []
+
+    def add(self, crop):
+        """Đưa một ảnh mặt vào hàng ghi; trả về chỉ số của ứng viên"""
+        path = os.path.join(self.folder, f"ung_vien_{len(self._futures)}.tmp")
+        self._futures.append(self._executor.submit(self._write, path, crop))
+        return len(self._futures) - 1
+
+    def _write(self, path, crop):
+        try:
+            ok, buf = cv2.imencode('.jpg', crop, self._params)
+            if not ok:
+                raise IOError("cv2.imencode trả về False")
+            buf.tofile(path)
+            return path
+        except Exception as e:
+            print(f"[ERROR] Không ghi được ảnh {path}: {str(e)}")
+            return None
+
+    def finish(self, selected):
+        """
+        Chờ ghi xong, đổi tên các ứng viên được chọn (theo thứ tự) thành `1.jpg`, `2.jpg`, ... và xóa file tạm còn lại.
+        Trả về các đường dẫn ảnh giữ lại.
+        """
+        self._executor.shutdown(wait=True)
+        temp_paths = [future.result() for future in self._futures]
+        saved = []
+        for number, index in enumerate(selected, start=1):
+            if temp_paths[index] is None:
+                continue
+            path = os.path.join(self.folder, f"{number}.jpg")
+            try:
+                os.replace(temp_paths[index], path)
+                temp_paths[index] = None
+                saved.append(path)
+            except OSError as e:
+                print(f"[ERROR] Không đổi tên được ảnh {temp_paths[index]}: {str(e)}")
+        for path in temp_paths:
+            if path is not None:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return saved
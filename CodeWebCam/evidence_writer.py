@@ -0,0 +1,143 @@
+"""
+Ghi ảnh bằng chứng điểm danh vào thư mục Captured ở luồng nền:
+- mỗi sinh viên chỉ giữ một ảnh cho cả phiên: ảnh có điểm chất lượng cao nhất
+  (đường dẫn cố định ngay từ lần đầu nên có thể ghi vào DiemDanh.DULieuAnhMoi trước khi file được ghi)
+- khuôn mặt không nhận diện được chỉ lưu mẫu: tối đa một ảnh mỗi `unknown_interval` giây
+  và `max_unknowns` ảnh mỗi phiên
+- mã hóa JPEG + ghi đĩa ở luồng riêng; nếu ảnh tốt hơn đến trước khi ảnh cũ kịp ghi thì chỉ ghi ảnh mới
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+
+def face_quality(gray, box, confidence=None):
+    """
+    Điểm chất lượng của một khuôn mặt (càng cao càng tốt): độ nét (phương sai Laplacian)
+    nhân căn bậc hai diện tích, giảm dần theo confidence của LBPH (confidence càng nhỏ càng tốt).
+    """
+    x, y, w, h = box
+    crop = gray[y : y + h, x : x + w]
+    if crop.size == 0:
+        return 0.0
+    sharpness = cv2.Laplacian(crop, cv2.CV_64F).var()
+    score = sharpness * (w * h) ** 0.5
+    if confidence is not None:
+        score /= 1.0 + max(confidence, 0.0) / 100.0
+    return float(score)
+
+
+class EvidenceWriter(threading.Thread):
+    """
+    captured_dir      : thư mục lưu ảnh của phiên
+    unknown_interval  : khoảng cách tối thiểu (giây) giữa hai ảnh Unknown được lưu
+    max_unknowns      : số ảnh Unknown tối đa mỗi phiên (0 = không lưu)
+    """
+
+    def __init__(self, captured_dir, unknown_interval=5.0, max_unknowns=50, jpeg_quality=90):
+        super().__init__(name="EvidenceWriter", daemon=True)
+        self.captured_dir = captured_dir
+        self.unknown_interval = unknown_interval
+        self.max_unknowns = max_unknowns
+        self.jpeg_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self.session_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        self._lock = threading.Condition()
+        self._pending = {}      # đường dẫn -> ảnh đang chờ ghi (chỉ giữ ảnh mới nhất)
+        self._order = []        # thứ tự đường dẫn chờ ghi
+        self._best = {}         # mã sinh viên -> điểm chất lượng cao nhất đã nhận
+        self._paths = {}        # mã sinh viên -> đường dẫn ảnh của phiên
+        self._last_unknown = None
+        self._closed = False
+
+        self.stats = {'offered': 0, 'rejected': 0, 'accepted': 0, 'written': 0, 'superseded': 0,
+                      'unknowns': 0, 'errors': 0, 'write_ms_total': 0.0}
+
+    def path_for(self, ma_sinh_vien):
+        """Đường dẫn ảnh bằng chứng của sinh viên trong phiên này"""
+        path = self._paths.get(ma_sinh_vien)
+        if path is None:
+            path = self._paths[ma_sinh_vien] = os.path.join(
+                self.captured_dir, f"{ma_sinh_vien}_attendance_{self.session_stamp}.jpg"
+            )
+        return path
+
+    def offer(self, ma_sinh_vien, img, box, quality):
+        """
+        Đề xuất ảnh khuôn mặt của một sinh viên; chỉ nhận nếu tốt hơn ảnh tốt nhất hiện có.
+        Trả về đường dẫn ảnh của sinh viên (cố định trong phiên).
+        """
+        with self._lock:
+            self.stats['offered'] += 1
+            path = self.path_for(ma_sinh_vien)
+            if quality > self._best.get(ma_sinh_vien, -1.0):
+                self._best[ma_sinh_vien] = quality
+                self._enqueue(path, img, box)
+            else:
+                self.stats['rejected'] += 1
+            return path
+
+    def offer_unknown(self, img, box):
+        """Lưu mẫu khuôn mặt chưa nhận diện được, có giới hạn tần suất; trả về đường dẫn hoặc None"""
+        now = time.monotonic()
+        with self._lock:
+            if self.stats['unknowns'] >= self.max_unknowns:
+                return None
+            if self._last_unknown is not None and now - self._last_unknown < self.unknown_interval:
+                return None
+            self._last_unknown = now
+            self.stats['unknowns'] += 1
+            path = os.path.join(self.captured_dir,
+                                f"unknown_attendance_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                                f"_{self.stats['unknowns']}.jpg")
+            self._enqueue(path, img, box)
+            return path
+
+    def _enqueue(self, path, img, box):
+        x, y, w, h = box
+        crop = img[y : y + h, x : x + w].copy()  # khung gốc sẽ bị vẽ đè khi hiển thị
+        self.stats['accepted'] += 1
+        if path in self._pending:
+            self.stats['superseded'] += 1
+        else:
+            self._order.append(path)
+        self._pending[path] = crop
+        self._lock.notify()
+
+    def run(self):
+        while True:
+            with self._lock:
+                while not self._order and not self._closed:
+                    self._lock.wait()
+                if not self._order:
+                    return
+                path = self._order.pop(0)
+                crop = self._pending.pop(path)
+
+            started = time.perf_counter()
+            try:
+                if not cv2.imwrite(path, crop, self.jpeg_params):
+                    raise IOError("cv2.imwrite trả về False")
+                self.stats['written'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"[ERROR] Không ghi được ảnh bằng chứng {path}: {str(e)}")
+            self.stats['write_ms_total'] += (time.perf_counter() - started) * 1000
+
+    def close(self, timeout=None):
+        """Ghi nốt các ảnh đang chờ rồi dừng luồng"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._lock.notify()
+        self.join(timeout)
+
+        s = self.stats
+        avg_ms = s['write_ms_total'] / s['written'] if s['written'] else 0.0
+        print(f"[INFO] Ảnh bằng chứng: ghi {s['written']} file cho {len(self._best)} sinh viên "
+              f"và {s['unknowns']} mẫu Unknown (đề xuất {s['offered']}, bỏ {s['rejected']} ảnh kém hơn, "
+              f"{s['superseded']} ảnh được thay trước khi kịp ghi), trung bình {avg_ms:.1f} ms/file.")
@@ -0,0 +1,250 @@
+"""
+Phần phát hiện + nhận diện khuôn mặt dùng chung cho script điểm danh và pipeline đa luồng.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+
+import cv2
+
+from evidence_writer import face_quality
+from tracker import iou
+
+# Kết quả cho một khuôn mặt: box = (x, y, w, h); file_path là ảnh bằng chứng đã lưu (nếu có);
+# track_id là mã track khi bật theo dõi khuôn mặt (None nếu không dùng tracker)
+FaceResult = namedtuple('FaceResult', 'box id_pred confidence ma_sinh_vien file_path track_id')
+
+
+def load_recognizer(model_path):
+    """Load mô hình LBPH đã huấn luyện"""
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    return recognizer
+
+
+def load_labels(labels_path):
+    """Đọc labels.json, trả về mapping ID (int) -> mã sinh viên; None nếu chưa huấn luyện"""
+    if not os.path.exists(labels_path):
+        return None
+    with open(labels_path, "r") as f:
+        label_dict = json.load(f)
+    # Đảo ngược lại: ID (int) -> Tên
+    return {v: k for k, v in label_dict.items()}
+
+
+class FaceEngine:
+    """
+    Phát hiện khuôn mặt (Haar cascade) và nhận diện (LBPH) trên một khung hình.
+    An toàn khi gọi từ nhiều luồng: mỗi luồng có CascadeClassifier riêng,
+    recognizer chỉ được đọc (predict) nên dùng chung.
+
+    Nếu truyền `evidence` (EvidenceWriter), ảnh khuôn mặt được đề xuất làm ảnh bằng chứng
+    (ghi ở luồng nền, mỗi sinh viên giữ ảnh tốt nhất).
+
+    Nếu truyền `matcher` (BatchLBPHMatcher), mọi khuôn mặt cần nhận diện trong khung được
+    so khớp cùng một lượt thay vì gọi recognizer.predict() từng mặt.
+
+    Nếu truyền `tracker` (FaceTracker), mỗi khuôn mặt được gán vào một track và chỉ
+    predict cho tới khi track chốt được mã sinh viên (sau đó thỉnh thoảng predict lại để kiểm tra).
+    Khi nhiều luồng cùng gọi process(), truyền `ordered` để việc ghép track chạy theo thứ tự khung.
+
+    Tùy chọn giảm chi phí phát hiện (predict vẫn chạy trên ảnh gốc):
+    detect_scale       : thu nhỏ khung trước khi chạy cascade (vd 0.5), box được nhân ngược lại
+    roi_detection      : ở các khung giữa chỉ tìm quanh các khuôn mặt của lần phát hiện trước
+                         (trạng thái này dựa vào thứ tự gọi detect(), nên chỉ dùng với một luồng
+                         xử lý; RecognitionPipeline tự giảm về 1 luồng khi bật)
+    full_scan_interval : cứ ngần này khung thì quét toàn bộ khung một lần (để thấy người mới vào)
+    roi_margin         : nới rộng vùng tìm quanh mặt cũ, theo tỉ lệ kích thước mặt
+    """
+
+    def __init__(self, recognizer, cascade_path, id_to_name, min_size=(0, 0),
+                 scale_factor=1.2, min_neighbors=5, confidence_threshold=75, evidence=None,
+                 tracker=None, detect_scale=1.0, roi_detection=False, full_scan_interval=10, roi_margin=0.5,
+                 matcher=None):
+        self.recognizer = recognizer
+        self.cascade_path = cascade_path
+        self.id_to_name = id_to_name
+        self.min_size = (int(min_size[0]), int(min_size[1]))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.confidence_threshold = confidence_threshold
+        self.evidence = evidence
+        self.tracker = tracker
+        self.matcher = matcher
+        self.detect_scale = min(max(float(detect_scale), 0.1), 1.0)
+        self.roi_detection = roi_detection
+        self.full_scan_interval = max(1, int(full_scan_interval))
+        self.roi_margin = roi_margin
+        self._local = threading.local()
+
+        # Trạng thái phát hiện theo vùng (dùng chung giữa các luồng nhận diện)
+        self._detect_lock = threading.Lock()
+        self._detect_frames = 0
+        self._last_boxes = []
+        self.detect_stats = {'full_scans': 0, 'roi_scans': 0, 'roi_pixels_pct': 0.0}
+
+    @property
+    def cascade(self):
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(self.cascade_path)
+        return cascade
+
+    def _detect_scaled(self, gray, offset=(0, 0)):
+        """Chạy cascade trên (một vùng của) ảnh xám sau khi thu nhỏ; trả về box theo tọa độ ảnh gốc"""
+        scale = self.detect_scale
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+        min_size = (int(self.min_size[0] * scale), int(self.min_size[1] * scale))
+        faces = self.cascade.detectMultiScale(
+            small, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=min_size
+        )
+        ox, oy = offset
+        return [(int(x / scale) + ox, int(y / scale) + oy, int(w / scale), int(h / scale)) for x, y, w, h in faces]
+
+    def _roi_for(self, box, frame_w, frame_h):
+        x, y, w, h = box
+        mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(frame_w, x + w + mx), min(frame_h, y + h + my)
+        return x0, y0, x1, y1
+
+    def detect(self, gray):
+        """
+        Trả về danh sách box (x, y, w, h) theo tọa độ ảnh gốc.
+        Khi bật roi_detection: quét toàn khung mỗi `full_scan_interval` khung (hoặc khi lần trước
+        không thấy ai), các khung còn lại chỉ quét vùng quanh các khuôn mặt vừa thấy.
+        "Khung" ở đây là một lần gọi detect(), nên các khung phải được gọi lần lượt theo thứ tự.
+        """
+        with self._detect_lock:
+            self._detect_frames += 1
+            previous = list(self._last_boxes)
+            full_scan = (not self.roi_detection or not previous
+                         or self._detect_frames % self.full_scan_interval == 0)
+
+        if full_scan:
+            boxes = self._detect_scaled(gray)
+            key = 'full_scans'
+        else:
+            frame_h, frame_w = gray.shape[:2]
+            boxes = []
+            pixels = 0
+            for box in previous:
+                x0, y0, x1, y1 = self._roi_for(box, frame_w, frame_h)
+                pixels += (x1 - x0) * (y1 - y0)
+                for found in self._detect_scaled(gray[y0:y1, x0:x1], (x0, y0)):
+                    # Các vùng có thể chồng nhau: bỏ box trùng với box đã có
+                    if not any(iou(found, other) > 0.5 for other in boxes):
+                        boxes.append(found)
+            key = 'roi_scans'
+
+        with self._detect_lock:
+            self._last_boxes = boxes
+            self.detect_stats[key] += 1
+            if not full_scan:
+                n = self.detect_stats['roi_scans']
+                pct = min(pixels / float(gray.shape[0] * gray.shape[1]), 1.0) * 100
+                self.detect_stats['roi_pixels_pct'] += (pct - self.detect_stats['roi_pixels_pct']) / n
+        return boxes
+
+    def predict(self, gray, box):
+        x, y, w, h = box
+        return self.recognizer.predict(gray[y : y + h, x : x + w])
+
+    def predict_many(self, gray, boxes):
+        """(id_pred, confidence) cho nhiều khuôn mặt; dùng matcher (một lượt so khớp) nếu có"""
+        if self.matcher is None:
+            return [self.predict(gray, box) for box in boxes]
+        return self.matcher.predict_batch([gray[y : y + h, x : x + w] for x, y, w, h in boxes])
+
+    def name_for(self, id_pred, confidence):
+        """Mã sinh viên nếu đủ tin cậy (confidence càng nhỏ càng chính xác), ngược lại 'Unknown'"""
+        if confidence < self.confidence_threshold:
+            return self.id_to_name.get(id_pred, "Unknown")
+        return "Unknown"
+
+    def save_capture(self, img, gray, box, id_pred, confidence):
+        """
+        Đề xuất ảnh khuôn mặt vừa chụp cho EvidenceWriter; trả về đường dẫn ảnh bằng chứng
+        (None nếu không lưu). Việc mã hóa và ghi file diễn ra ở luồng nền.
+        """
+        if self.evidence is None:
+            return None
+        ma_sinh_vien = self.name_for(id_pred, confidence)
+        if ma_sinh_vien == "Unknown":
+            return self.evidence.offer_unknown(img, box)
+        return self.evidence.offer(ma_sinh_vien, img, box, face_quality(gray, box, confidence))
+
+    def process(self, img, timings=None, ordered=None):
+        """
+        Chạy toàn bộ các bước trên một khung hình BGR, trả về danh sách FaceResult.
+        timings (dict, tùy chọn) được cộng dồn thời gian từng bước theo ms.
+        ordered (tùy chọn): hàm trả về context manager bao đoạn ghép track (vd FrameOrder.turn của pipeline),
+        để tracker nhận các khung đúng thứ tự dù nhiều luồng xử lý song song.
+        """
+        t0 = time.perf_counter()
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = self.detect(gray)
+        t1 = time.perf_counter()
+
+        results = []
+        predict_s = 0.0
+        boxes = [tuple(int(v) for v in box) for box in faces]
+        if self.tracker:
+            with (ordered() if ordered else nullcontext()):
+                tracks = self.tracker.update(boxes)
+                # Track đã nhận diện (chưa tới lượt kiểm tra lại), đang chờ lượt thử lại hoặc đang được
+                # luồng khác predict thì không cần predict
+                need = [self.tracker.needs_prediction(track) for track in tracks]
+                for track, needs in zip(tracks, need):
+                    if needs:
+                        track.pending = True
+        else:
+            tracks = [None] * len(boxes)
+            need = [True] * len(boxes)
+        p0 = time.perf_counter()
+        try:
+            predictions = iter(self.predict_many(gray, [box for box, n in zip(boxes, need) if n]))
+        except Exception:
+            for track, needs in zip(tracks, need):
+                if track is not None and needs:
+                    track.pending = False
+            raise
+        predict_s += time.perf_counter() - p0
+
+        for box, track, needs in zip(boxes, tracks, need):
+            if not needs:
+                results.append(self._track_result(box, track))
+                continue
+
+            id_pred, confidence = next(predictions)
+            file_path = self.save_capture(img, gray, box, id_pred, confidence)
+
+            if track is None:
+                results.append(FaceResult(box, id_pred, confidence, self.name_for(id_pred, confidence),
+                                          file_path, None))
+            else:
+                self.tracker.add_prediction(track, id_pred, confidence)
+                results.append(self._track_result(box, track))
+        t2 = time.perf_counter()
+
+        if timings is not None:
+            timings['detect_ms'] = timings.get('detect_ms', 0.0) + (t1 - t0) * 1000
+            timings['predict_ms'] = timings.get('predict_ms', 0.0) + predict_s * 1000
+            timings['capture_write_ms'] = timings.get('capture_write_ms', 0.0) + (t2 - t1 - predict_s) * 1000
+        return results
+
+    def _track_result(self, box, track):
+        if track.identified:
+            ma_sinh_vien = self.id_to_name.get(track.label, "Unknown")
+            if track.evidence_path is None and self.evidence is not None and ma_sinh_vien != "Unknown":
+                track.evidence_path = self.evidence.path_for(ma_sinh_vien)
+            return FaceResult(box, track.label, track.confidence, ma_sinh_vien,
+                              track.evidence_path, track.track_id)
+        # Chưa đủ phiếu: hiển thị như chưa nhận diện được
+        return FaceResult(box, track.last_id_pred, track.last_confidence, "Unknown", None, track.track_id)
@@ -0,0 +1,267 @@
+"""
+Nhập hàng loạt ảnh thẻ / ảnh chân dung của sinh viên thay vì chụp từng người bằng 01_Face_Dataset.py.
+
+    python import_dataset.py --source anh_sinh_vien/
+    python import_dataset.py --source anh_sinh_vien.zip --rejects bi_loai.csv
+
+Nguồn là thư mục hoặc file nén (.zip, .tar, .tar.gz) theo một trong hai dạng:
+- `<MaSinhVien>/<ảnh bất kỳ>` : mỗi sinh viên một thư mục con
+- `<MaSinhVien>.jpg` hoặc `<MaSinhVien>_<số>.jpg` : ảnh nằm trực tiếp trong thư mục gốc
+
+Ảnh được phát hiện khuôn mặt trong process pool; khuôn mặt lớn nhất được cắt (có lề để bước huấn luyện
+phát hiện lại được), đưa về cùng kích thước và ghi vào `dataset/<MaSinhVien>/import_<đường dẫn ảnh>.jpg`
+(đường dẫn tương đối trong thư mục của sinh viên, `/` thay bằng `_`); hai ảnh trùng tên đích thì ảnh sau
+bị loại với lý do 'duplicate_name'. Thư mục của các sinh viên nhập được đăng ký vào DuLieuKhuonMat bằng
+sp_ThemDuLieuKhuonMat như 01_Face_Dataset.py, chỉ cho các cặp (MaSinhVien, thư mục) chưa có,
+trong một transaction.
+"""
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from db import get_connection  # type: ignore
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+OUTPUT_SIZE = (240, 240)
+FACE_MARGIN = 0.25
+# Số cặp mỗi lượt lọc NOT EXISTS (2 tham số/cặp; SQL Server giới hạn 2100 tham số, SQLite 500 SELECT ghép)
+REGISTER_BATCH_SIZE = 500
+
+_detector = None
+_options = None
+
+
+def _init_worker(cascade_path, options):
+    global _detector, _options
+    cv2.setNumThreads(1)  # song song theo tiến trình, tránh mỗi tiến trình lại mở thêm luồng OpenCV
+    _detector = cv2.CascadeClassifier(cascade_path)
+    _options = options
+
+
+def find_images(root):
+    """Danh sách (MaSinhVien, đường dẫn ảnh) theo thư mục con hoặc theo tên file"""
+    items = []
+    for dirpath, _, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        for name in sorted(filenames):
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or name.startswith('.'):
+                continue
+            if rel == '.':
+                ma_sinh_vien = os.path.splitext(name)[0].split('_')[0]
+            else:
+                ma_sinh_vien = rel.split(os.sep)[0]
+            items.append((ma_sinh_vien.strip(), os.path.join(dirpath, name)))
+    return sorted(items)
+
+
+def output_name(root, src):
+    """Tên file đích: đường dẫn tương đối trong thư mục của sinh viên (hoặc tên file ở thư mục gốc)"""
+    parts = os.path.relpath(src, root).split(os.sep)
+    if len(parts) > 1:
+        parts = parts[1:]  # bỏ thư mục <MaSinhVien>
+    parts[-1] = os.path.splitext(parts[-1])[0]
+    return f"import_{'_'.join(parts)}.jpg"
+
+
+def crop_face(img, box, margin=FACE_MARGIN, size=OUTPUT_SIZE):
+    """Cắt khuôn mặt kèm lề `margin` mỗi phía (giới hạn trong ảnh) và đưa về kích thước `size`"""
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(x - dx, 0), max(y - dy, 0)
+    x1, y1 = min(x + w + dx, img.shape[1]), min(y + h + dy, img.shape[0])
+    return cv2.resize(img[y0:y1, x0:x1], size, interpolation=cv2.INTER_AREA)
+
+
+def process_image(item):
+    """
+    item: (MaSinhVien, ảnh nguồn, file đích) -> (MaSinhVien, ảnh nguồn, lý do bị loại hoặc None).
+    Chạy trong tiến trình con.
+    """
+    ma_sinh_vien, src, out_path = item
+    img = cv2.imread(src)
+    if img is None:
+        return ma_sinh_vien, src, 'unreadable'
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    min_face = _options['min_face']
+    faces = _detector.detectMultiScale(gray, 1.1, 5, minSize=(min_face, min_face))
+    if len(faces) == 0:
+        return ma_sinh_vien, src, 'no_face'
+
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    if cv2.Laplacian(gray[y:y+h, x:x+w], cv2.CV_64F).var() < _options['min_sharpness']:
+        return ma_sinh_vien, src, 'blurry'
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    if not cv2.imwrite(out_path, crop_face(img, (x, y, w, h))):
+        return ma_sinh_vien, src, 'write_failed'
+    return ma_sinh_vien, src, None
+
+
+def load_student_ids():
+    """Mã các sinh viên có trong bảng SinhVien"""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT MaSinhVien FROM [dbo].[SinhVien]")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        if conn:
+            conn.close()
+
+
+def register_datasets(conn, rows):
+    """
+    Đăng ký thư mục ảnh vào DuLieuKhuonMat qua sp_ThemDuLieuKhuonMat, bỏ qua cặp (MaSinhVien, thư mục) đã có.
+    rows: danh sách (MaSinhVien, thư mục). Trả về số dòng được thêm. Không tự commit.
+
+    Các cặp mới được lọc bằng NOT EXISTS theo từng lô (không đọc cả bảng), rồi gọi procedure một lượt
+    với mảng tham số (fast_executemany) thay vì một lượt gửi cho mỗi sinh viên.
+    """
+    rows = [tuple(row) for row in rows]
+    cursor = conn.cursor()
+    try:
+        new_rows = []
+        for start in range(0, len(rows), REGISTER_BATCH_SIZE):
+            batch = rows[start:start + REGISTER_BATCH_SIZE]
+            values = " UNION ALL ".join(["SELECT ? AS MaSinhVien, ? AS DuLieuAnhKhuonMat"] * len(batch))
+            cursor.execute(
+                f"SELECT v.MaSinhVien, v.DuLieuAnhKhuonMat FROM ({values}) AS v "
+                "WHERE NOT EXISTS (SELECT 1 FROM [dbo].[DuLieuKhuonMat] d "
+                "WHERE d.MaSinhVien = v.MaSinhVien AND d.DuLieuAnhKhuonMat = v.DuLieuAnhKhuonMat)",
+                *[value for row in batch for value in row]
+            )
+            new_rows.extend((row[0], row[1]) for row in cursor.fetchall())
+        if new_rows:
+            cursor.fast_executemany = True
+            cursor.executemany("EXEC sp_ThemDuLieuKhuonMat ?, ?", new_rows)
+        return len(new_rows)
+    finally:
+        cursor.close()
+
+
+def run_import(root, dataset_dir, cascade_path, options, workers=None, chunk_size=16):
+    """Xử lý mọi ảnh trong `root`; trả về (thư mục của sinh viên nhập được, danh sách ảnh bị loại, thống kê)"""
+    started = time.perf_counter()
+    images = find_images(root)
+    known = load_student_ids()
+
+    rejects, tasks, targets = [], [], set()
+    for ma_sv, src in images:
+        out_path = os.path.join(dataset_dir, ma_sv, output_name(root, src))
+        if ma_sv not in known:
+            rejects.append((ma_sv, src, 'unknown_student'))
+        elif out_path in targets:
+            rejects.append((ma_sv, src, 'duplicate_name'))
+        else:
+            targets.add(out_path)
+            tasks.append((ma_sv, src, out_path))
+
+    workers = workers or os.cpu_count() or 1
+    accepted = {}  # MaSinhVien -> số ảnh nhập được
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cascade_path, options)) as executor:
+        for ma_sinh_vien, src, reason in executor.map(process_image, tasks, chunksize=max(1, chunk_size)):
+            if reason:
+                rejects.append((ma_sinh_vien, src, reason))
+            else:
+                accepted[ma_sinh_vien] = accepted.get(ma_sinh_vien, 0) + 1
+
+    elapsed = time.perf_counter() - started
+    folders = {ma_sv: os.path.join(dataset_dir, ma_sv) for ma_sv in accepted}
+    reasons = {}
+    for _, _, reason in rejects:
+        reasons[reason] = reasons.get(reason, 0) + 1
+    stats = {
+        'images': len(images),
+        'students': len({ma_sv for ma_sv, _ in images}),
+        'accepted_images': sum(accepted.values()),
+        'accepted_students': len(accepted),
+        'rejects': reasons,
+        'workers': workers,
+        'elapsed_s': elapsed,
+        'images_per_s': len(images) / elapsed if elapsed > 0 else 0.0,
+    }
+    return folders, rejects, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nhập hàng loạt ảnh khuôn mặt sinh viên")
+    parser.add_argument("--source", required=True, help="Thư mục hoặc file nén chứa ảnh theo MaSinhVien")
+    parser.add_argument("--dataset", default="dataset", help="Thư mục dataset (mặc định: dataset)")
+    parser.add_argument("--cascade", default="haarcascade_frontalface_default.xml")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("IMPORT_WORKERS", "0")) or None,
+                        help="Số tiến trình (mặc định: số nhân CPU)")
+    parser.add_argument("--min-face", type=int, default=60, help="Cạnh nhỏ nhất của khuôn mặt (pixel)")
+    parser.add_argument("--min-sharpness", type=float, default=20.0,
+                        help="Ngưỡng phương sai Laplacian; ảnh mờ hơn bị loại (0 = không kiểm tra)")
+    parser.add_argument("--rejects", help="Ghi danh sách ảnh bị loại ra file CSV")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"[ERROR] Không tìm thấy {args.source}.")
+        return
+
+    temp_dir = None
+    root = args.source
+    if os.path.isfile(args.source):
+        if not args.source.lower().endswith(ARCHIVE_EXTENSIONS):
+            print(f"[ERROR] {args.source} không phải thư mục hoặc file nén được hỗ trợ.")
+            return
+        temp_dir = tempfile.mkdtemp(prefix="import_dataset_")
+        print(f"[INFO] Giải nén {args.source}...")
+        shutil.unpack_archive(args.source, temp_dir)
+        root = temp_dir
+
+    options = {'min_face': args.min_face, 'min_sharpness': args.min_sharpness}
+    try:
+        folders, rejects, stats = run_import(root, args.dataset, args.cascade, options, args.workers)
+    except Exception as e:
+        print(f"[ERROR] Lỗi khi nhập ảnh: {str(e)}")
+        return
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)  # chỉ xóa file giải nén, ảnh đã ghi vào dataset
+
+    print(f"[INFO] Đã xử lý {stats['images']} ảnh của {stats['students']} sinh viên bằng {stats['workers']} "
+          f"tiến trình trong {stats['elapsed_s']:.1f} s ({stats['images_per_s']:.1f} ảnh/giây).")
+    print(f"[INFO] Nhập được {stats['accepted_images']} ảnh cho {stats['accepted_students']} sinh viên.")
+    if rejects:
+        detail = ", ".join(f"{reason}: {count}" for reason, count in sorted(stats['rejects'].items()))
+        print(f"[WARNING] Loại {len(rejects)} ảnh ({detail}).")
+
+    if args.rejects and rejects:
+        with open(args.rejects, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(['ma_sinh_vien', 'file', 'ly_do'])
+            writer.writerows((ma_sv, os.path.relpath(src, root), reason) for ma_sv, src, reason in sorted(rejects))
+        print(f"[INFO] Đã ghi danh sách ảnh bị loại vào {args.rejects}.")
+
+    if not folders:
+        return
+    conn = None
+    try:
+        started = time.perf_counter()
+        conn = get_connection()
+        inserted = register_datasets(conn, sorted(folders.items()))
+        conn.commit()
+        print(f"[INFO] Đã đăng ký {inserted} thư mục mới vào DuLieuKhuonMat "
+              f"({len(folders) - inserted} đã có) trong {(time.perf_counter() - started) * 1000:.0f} ms.")
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"[ERROR] Lỗi khi lưu vào database: {str(e)}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+So khớp LBPH bằng NumPy: lấy toàn bộ histogram của mô hình đã huấn luyện
+(getHistograms()/getLabels()) vào một ma trận, rồi so tất cả khuôn mặt của một khung hình
+với ma trận đó trong một lượt duyệt (khoảng cách chi-square như OpenCV).
+
+Mô hình có thể lưu thành artifact nhị phân (`trainer/model.npy` + `trainer/model.json`):
+ma trận histogram dạng bin x mẫu (float32, đọc bằng memory-map), nhãn, tham số LBPH và
+mapping nhãn -> mã sinh viên. Load artifact nhanh hơn nhiều so với đọc trainer.yml.
+
+Kết quả giữ đúng hợp đồng của recognizer.predict(): (label, confidence), confidence là
+khoảng cách nhỏ nhất (càng nhỏ càng giống), label = -1 nếu không mẫu nào dưới ngưỡng của mô hình.
+"""
+import hashlib
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+FLT_EPSILON = np.finfo(np.float32).eps
+
+
+def _lbp_offsets(radius, neighbors):
+    """Các tham số nội suy song tuyến cho từng điểm lân cận, tính giống hệt OpenCV (float32)"""
+    offsets = []
+    for n in range(neighbors):
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / float(np.float32(neighbors))))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / float(np.float32(neighbors))))
+        fx, fy = int(math.floor(x)), int(math.floor(y))
+        cx, cy = int(math.ceil(x)), int(math.ceil(y))
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        one = np.float32(1)
+        w1 = (one - tx) * (one - ty)
+        w2 = tx * (one - ty)
+        w3 = (one - tx) * ty
+        w4 = tx * ty
+        offsets.append((fx, fy, cx, cy, w1, w2, w3, w4))
+    return offsets
+
+
+class BatchLBPHMatcher:
+    """
+    recognizer : cv2.face.LBPHFaceRecognizer đã huấn luyện / đã read()
+    chunk_rows : số histogram của mô hình xử lý mỗi lượt (giới hạn bộ nhớ tạm)
+    """
+
+    def __init__(self, recognizer, chunk_rows=256):
+        self.radius = int(recognizer.getRadius())
+        self.neighbors = int(recognizer.getNeighbors())
+        self.grid_x = int(recognizer.getGridX())
+        self.grid_y = int(recognizer.getGridY())
+        self.threshold = float(recognizer.getThreshold())
+        self.num_patterns = int(2 ** self.neighbors)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self._offsets = _lbp_offsets(self.radius, self.neighbors)
+
+        histograms = recognizer.getHistograms()
+        if histograms:
+            histograms = np.vstack([np.asarray(h, dtype=np.float32).reshape(1, -1) for h in histograms])
+        else:
+            histograms = np.zeros((0, self.grid_x * self.grid_y * self.num_patterns), np.float32)
+        self.labels = np.asarray(recognizer.getLabels(), dtype=np.int32).ravel()
+        self._prepare(histograms)
+
+    @classmethod
+    def from_arrays(cls, histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                    threshold=float("inf"), chunk_rows=256, row_sums=None):
+        """
+        Dựng matcher trực tiếp từ ma trận histogram (số mẫu x số bin), không cần recognizer.
+        Nếu histograms là view chuyển vị của một mảng liên tục (vd memory-map bin x mẫu) thì không bị chép.
+        """
+        self = cls.__new__(cls)
+        self.radius, self.neighbors = int(radius), int(neighbors)
+        self.grid_x, self.grid_y = int(grid_x), int(grid_y)
+        self.threshold = float(threshold)
+        self.num_patterns = int(2 ** self.neighbors)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self._offsets = _lbp_offsets(self.radius, self.neighbors)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self._prepare(np.asarray(histograms, dtype=np.float32), row_sums)
+        return self
+
+    def _prepare(self, histograms, row_sums=None):
+        # Lưu dạng chuyển vị (bin x mẫu) để lấy các bin khác 0 của truy vấn theo hàng liên tục
+        self._columns = np.ascontiguousarray(histograms.T)
+        if row_sums is None:
+            row_sums = histograms.sum(axis=1, dtype=np.float64)
+        self._row_sums = np.asarray(row_sums, dtype=np.float64)
+
+    @property
+    def histograms(self):
+        """Ma trận histogram (số mẫu x số bin), là view của dữ liệu đã lưu"""
+        return self._columns.T
+
+    def params(self):
+        return {'radius': self.radius, 'neighbors': self.neighbors, 'grid_x': self.grid_x,
+                'grid_y': self.grid_y, 'threshold': self.threshold}
+
+    def subset(self, labels):
+        """Matcher mới chỉ gồm các mẫu có nhãn thuộc `labels` (ví dụ sinh viên của một lịch học)"""
+        mask = np.isin(self.labels, np.fromiter(labels, dtype=np.int32))
+        return BatchLBPHMatcher.from_arrays(self._columns[:, mask].T, self.labels[mask],
+                                            chunk_rows=self.chunk_rows, row_sums=self._row_sums[mask],
+                                            **self.params())
+
+    def __len__(self):
+        return len(self.labels)
+
+    def lbp(self, gray):
+        """Ảnh mã LBP mở rộng (elbp của OpenCV) của ảnh xám uint8"""
+        src = np.asarray(gray)
+        r = self.radius
+        rows, cols = src.shape[:2]
+        center = src[r:rows - r, r:cols - r].astype(np.float32)
+        dst = np.zeros(center.shape, np.int32)
+
+        def window(dy, dx):
+            return src[r + dy:rows - r + dy, r + dx:cols - r + dx].astype(np.float32)
+
+        for n, (fx, fy, cx, cy, w1, w2, w3, w4) in enumerate(self._offsets):
+            t = w1 * window(fy, fx) + w2 * window(fy, cx) + w3 * window(cy, fx) + w4 * window(cy, cx)
+            bit = (t > center) | (np.abs(t - center) < FLT_EPSILON)
+            dst += bit.astype(np.int32) << n
+        return dst
+
+    def histogram(self, gray):
+        """Histogram không gian (grid_x x grid_y ô, mỗi ô chuẩn hóa theo số điểm ảnh) dạng vector float32"""
+        codes = self.lbp(gray)
+        height = codes.shape[0] // self.grid_y
+        width = codes.shape[1] // self.grid_x
+        size = self.grid_x * self.grid_y * self.num_patterns
+        if width == 0 or height == 0:
+            return np.zeros(size, np.float32)
+
+        codes = codes[:height * self.grid_y, :width * self.grid_x]
+        cell_row = (np.arange(codes.shape[0]) // height)[:, None]
+        cell_col = (np.arange(codes.shape[1]) // width)[None, :]
+        cell = cell_row * self.grid_x + cell_col
+        hist = np.bincount((cell * self.num_patterns + codes).ravel(), minlength=size).astype(np.float32)
+        return hist / np.float32(width * height)
+
+    def distances(self, queries):
+        """
+        Ma trận khoảng cách chi-square (HISTCMP_CHISQR_ALT) giữa các histogram truy vấn và mọi mẫu
+        của mô hình, kích thước (số truy vấn, số mẫu). Mô hình được duyệt một lượt theo từng khối,
+        mỗi khối so với tất cả truy vấn.
+        Dùng 2 * (sum h + sum q - 4 * sum h*q / (h+q)); số hạng cuối chỉ khác 0 ở các bin q > 0.
+        """
+        prepared = []
+        for query in queries:
+            nz = np.flatnonzero(query)
+            prepared.append((nz, query[nz][:, None], float(query.sum(dtype=np.float64))))
+
+        out = np.empty((len(prepared), len(self.labels)), np.float64)
+        for start in range(0, len(self.labels), self.chunk_rows):
+            block = self._columns[:, start:start + self.chunk_rows]
+            stop = start + block.shape[1]
+            row_sums = self._row_sums[start:stop]
+            for i, (nz, q, q_sum) in enumerate(prepared):
+                h = block[nz]          # (số bin q > 0, số mẫu trong khối), đọc liên tục theo hàng
+                num = h * q
+                h += q                 # q > 0 nên mẫu số luôn dương
+                num /= h
+                cross = num.sum(axis=0, dtype=np.float64)
+                out[i, start:stop] = 2.0 * (row_sums + q_sum - 4.0 * cross)
+        return np.maximum(out, 0.0)
+
+    def predict(self, gray):
+        return self.predict_batch([gray])[0]
+
+    def predict_batch(self, faces):
+        """Danh sách ảnh xám khuôn mặt -> danh sách (label, confidence) như recognizer.predict()"""
+        if not faces:
+            return []
+        if len(self.labels) == 0:
+            return [(-1, float(np.finfo(np.float64).max))] * len(faces)
+
+        dist = self.distances([self.histogram(face) for face in faces])
+        results = []
+        for row in dist:
+            best = int(np.argmin(row))  # như OpenCV: mẫu đầu tiên khi bằng nhau
+            confidence = float(row[best])
+            if confidence < self.threshold:
+                results.append((int(self.labels[best]), confidence))
+            else:
+                results.append((-1, float(np.finfo(np.float64).max)))
+        return results
+
+
+def roster_key(model_path, labels):
+    """Khóa cache của gallery: chữ ký file mô hình + danh sách nhãn (đã sắp xếp)"""
+    st = os.stat(model_path)
+    digest = hashlib.sha1(f"{st.st_mtime_ns}:{st.st_size}:".encode())
+    digest.update(",".join(str(label) for label in sorted(labels)).encode())
+    return digest.hexdigest()[:16]
+
+
+def load_gallery(model_path, labels, cache_dir, recognizer=None, artifact_path=None):
+    """
+    Matcher chỉ gồm các mẫu của `labels`, lấy từ cache `cache_dir/gallery_<khóa>.npz` nếu có.
+    Khi chưa có cache mới cần đọc mô hình đầy đủ (truyền `recognizer` nếu đã load sẵn;
+    nếu không thì ưu tiên artifact nhị phân, sau đó mới tới trainer.yml).
+    Trả về (matcher, lấy từ cache hay không).
+    """
+    path = os.path.join(cache_dir, f"gallery_{roster_key(model_path, labels)}.npz")
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                params = {k: data[k].item() for k in ('radius', 'neighbors', 'grid_x', 'grid_y', 'threshold')}
+                return BatchLBPHMatcher.from_arrays(data['histograms'], data['labels'], **params), True
+        except Exception as e:
+            print(f"[WARNING] Bỏ qua cache gallery hỏng {path}: {e}")
+
+    if recognizer is not None:
+        full = BatchLBPHMatcher(recognizer)
+    else:
+        full, _ = load_matcher(model_path, artifact_path)
+    gallery = full.subset(labels)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, histograms=gallery.histograms, labels=gallery.labels, **gallery.params())
+    os.replace(tmp_path, path)
+    return gallery, False
+
+
+def model_signature(model_path):
+    """Chữ ký của trainer.yml để biết artifact nhị phân còn khớp với mô hình hay không"""
+    st = os.stat(model_path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def save_model(matcher, artifact_path, label_map=None, source_path=None):
+    """
+    Ghi artifact nhị phân: `<artifact_path>.npy` (bin x mẫu, float32) và `<artifact_path>.json`
+    (tham số LBPH, nhãn, tổng từng histogram, mapping mã sinh viên -> nhãn, chữ ký trainer.yml).
+    """
+    folder = os.path.dirname(artifact_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    meta = {
+        'version': 1,
+        'samples': len(matcher),
+        'bins': int(matcher._columns.shape[0]),
+        'params': matcher.params(),
+        'labels': matcher.labels.tolist(),
+        'row_sums': matcher._row_sums.tolist(),
+        'label_map': label_map or {},
+        'source': model_signature(source_path) if source_path and os.path.exists(source_path) else None,
+    }
+    tmp = f"{artifact_path}.{os.getpid()}.tmp"
+    np.save(tmp + ".npy", matcher._columns)
+    with open(tmp + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp + ".npy", artifact_path + ".npy")
+    os.replace(tmp + ".json", artifact_path + ".json")
+
+
+def load_model(artifact_path, source_path=None, mmap=True):
+    """
+    Đọc artifact nhị phân; ma trận histogram được memory-map (chỉ đọc phần được dùng tới).
+    Trả về (matcher, label_map), hoặc None nếu chưa có artifact hay artifact cũ hơn trainer.yml.
+    """
+    meta_path = artifact_path + ".json"
+    if not (os.path.exists(meta_path) and os.path.exists(artifact_path + ".npy")):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if source_path and os.path.exists(source_path) and meta.get('source') != model_signature(source_path):
+        return None  # trainer.yml đã được huấn luyện lại sau khi ghi artifact
+
+    columns = np.load(artifact_path + ".npy", mmap_mode='r' if mmap else None)
+    matcher = BatchLBPHMatcher.from_arrays(columns.T, meta['labels'], row_sums=meta['row_sums'], **meta['params'])
+    return matcher, meta['label_map']
+
+
+def load_matcher(model_path, artifact_path=None):
+    """
+    Matcher của toàn bộ mô hình: từ artifact nhị phân nếu còn khớp với trainer.yml,
+    nếu không thì đọc trainer.yml. Trả về (matcher, 'artifact' | 'yml').
+    """
+    if artifact_path:
+        loaded = load_model(artifact_path, model_path)
+        if loaded is not None:
+            return loaded[0], 'artifact'
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    return BatchLBPHMatcher(recognizer), 'yml'
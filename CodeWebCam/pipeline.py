@@ -0,0 +1,244 @@
+"""
+Pipeline nhận diện nhiều luồng:
+
+    [luồng camera] --(hàng đợi bỏ khung cũ)--> [N luồng nhận diện] --(hàng đợi bỏ kết quả cũ)--> [hiển thị]
+
+- Luồng camera đọc liên tục nên khung đưa vào nhận diện luôn là khung mới nhất.
+- Các hàng đợi đều có giới hạn; khi đầy thì bỏ phần tử cũ nhất, nên độ trễ đầu-cuối bị chặn trên.
+- OpenCV nhả GIL trong detectMultiScale/predict nên nhiều luồng nhận diện tận dụng được nhiều nhân CPU.
+- Phần có trạng thái (ghép khuôn mặt vào track, chọn track cần predict) chạy lần lượt theo thứ tự khung
+  nhờ FrameOrder; phát hiện và predict vẫn chạy song song.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+Frame = namedtuple('Frame', 'seq timestamp image')
+FrameResult = namedtuple('FrameResult', 'seq timestamp image faces timings')
+
+
+class DropOldestQueue:
+    """Hàng đợi có giới hạn, put() không bao giờ chặn: khi đầy thì bỏ phần tử cũ nhất"""
+
+    def __init__(self, maxsize=1):
+        self._items = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Lấy phần tử cũ nhất; trả về None nếu hết thời gian chờ"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def wake_all(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class FrameOrder:
+    """
+    Vé thứ tự cho các khung đang được nhiều luồng xử lý. Luồng lấy khung và vé trong cùng `lock`
+    (nên vé tăng theo thứ tự khung), rồi chạy đoạn có trạng thái trong `with turn(vé)`: đoạn đó của
+    khung sau chỉ bắt đầu khi khung trước đã xong. Luôn gọi finish(vé) (kể cả khi lỗi) để không chặn
+    các khung sau; finish() cho vé đã dùng turn() không có tác dụng.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._issued = 0
+        self._next = 0
+        self._finished = set()
+
+    def take(self):
+        """Cấp vé tiếp theo; gọi khi đang giữ `lock`"""
+        ticket = self._issued
+        self._issued += 1
+        return ticket
+
+    @contextmanager
+    def turn(self, ticket):
+        with self._cond:
+            while self._next != ticket:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            self.finish(ticket)
+
+    def finish(self, ticket):
+        with self._cond:
+            if ticket < self._next or ticket in self._finished:
+                return
+            self._finished.add(ticket)
+            while self._next in self._finished:
+                self._finished.discard(self._next)
+                self._next += 1
+            self._cond.notify_all()
+
+
+class FrameGrabber(threading.Thread):
+    """Luồng đọc camera liên tục, đẩy khung mới nhất vào hàng đợi đầu ra"""
+
+    def __init__(self, capture, output, stop_event):
+        super().__init__(name='FrameGrabber', daemon=True)
+        self.capture = capture
+        self.output = output
+        self.stop_event = stop_event
+        self.frames = 0
+        self.failed = False
+
+    def run(self):
+        while not self.stop_event.is_set():
+            ret, img = self.capture.read()
+            if not ret:
+                self.failed = True
+                break
+            self.frames += 1
+            self.output.put(Frame(self.frames, time.perf_counter(), img))
+        self.output.wake_all()
+
+
+class RecognitionWorker(threading.Thread):
+    """Luồng lấy khung từ hàng đợi, chạy engine.process() và đẩy kết quả đi tiếp"""
+
+    def __init__(self, index, engine, source, output, stop_event, order):
+        super().__init__(name=f'RecognitionWorker-{index}', daemon=True)
+        self.engine = engine
+        self.source = source
+        self.output = output
+        self.stop_event = stop_event
+        self.order = order
+        self.processed = 0
+        self.busy_s = 0.0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with self.order.lock:
+                frame = self.source.get(timeout=0.1)
+                ticket = self.order.take() if frame is not None else None
+            if frame is None:
+                continue
+            started = time.perf_counter()
+            timings = {}
+            try:
+                faces = self.engine.process(frame.image, timings, ordered=lambda: self.order.turn(ticket))
+            finally:
+                self.order.finish(ticket)
+            self.busy_s += time.perf_counter() - started
+            self.processed += 1
+            self.output.put(FrameResult(frame.seq, frame.timestamp, frame.image, faces, timings))
+        self.output.wake_all()
+
+
+class RecognitionPipeline:
+    """Ghép luồng camera + các luồng nhận diện; luồng chính gọi get_result() để hiển thị"""
+
+    def __init__(self, capture, engine, workers=1, frame_queue_size=1, result_queue_size=2):
+        self.stop_event = threading.Event()
+        self.frames = DropOldestQueue(frame_queue_size)
+        self.results = DropOldestQueue(result_queue_size)
+        self.grabber = FrameGrabber(capture, self.frames, self.stop_event)
+        self.order = FrameOrder()
+        if workers > 1 and getattr(engine, 'roi_detection', False):
+            # Vùng tìm ROI lấy từ lần detect() trước; nhiều luồng sẽ làm lệch thứ tự khung
+            print(f"[WARNING] ROI detection cần xử lý tuần tự, dùng 1 luồng nhận diện thay vì {workers}")
+            workers = 1
+        self.workers = [RecognitionWorker(i, engine, self.frames, self.results, self.stop_event, self.order)
+                        for i in range(max(1, workers))]
+
+        self._last_seq = 0
+        self._displayed = 0
+        self._latency_s = 0.0
+        self._latency_max_s = 0.0
+        self._stage_ms = {}
+        self._started_at = None
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self.grabber.start()
+        for worker in self.workers:
+            worker.start()
+
+    def is_alive(self):
+        return self.grabber.is_alive() or len(self.frames) > 0 or len(self.results) > 0
+
+    def get_result(self, timeout=1.0):
+        """
+        Kết quả mới nhất đã sẵn sàng (bỏ qua kết quả đến trễ hơn khung đã hiển thị).
+        Trả về None nếu chưa có kết quả trong `timeout` giây.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            result = self.results.get(timeout=remaining)
+            if result is None:
+                return None
+            if result.seq <= self._last_seq:
+                continue  # nhiều luồng nhận diện có thể trả kết quả không theo thứ tự
+            self._last_seq = result.seq
+            self._record(result)
+            return result
+
+    def _record(self, result):
+        latency = time.perf_counter() - result.timestamp
+        self._displayed += 1
+        self._latency_s += latency
+        self._latency_max_s = max(self._latency_max_s, latency)
+        for stage, ms in result.timings.items():
+            self._stage_ms[stage] = self._stage_ms.get(stage, 0.0) + ms
+
+    def stop(self):
+        self.stop_event.set()
+        self.frames.wake_all()
+        self.results.wake_all()
+        self.grabber.join(timeout=2)
+        for worker in self.workers:
+            worker.join(timeout=2)
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - (self._started_at or time.perf_counter()), 1e-9)
+        processed = sum(w.processed for w in self.workers)
+        shown = max(self._displayed, 1)
+        return {
+            'elapsed_s': elapsed,
+            'workers': len(self.workers),
+            'captured': self.grabber.frames,
+            'processed': processed,
+            'displayed': self._displayed,
+            'dropped_frames': self.frames.dropped,
+            'dropped_results': self.results.dropped,
+            'capture_fps': self.grabber.frames / elapsed,
+            'processed_fps': processed / elapsed,
+            'latency_avg_ms': self._latency_s / shown * 1000,
+            'latency_max_ms': self._latency_max_s * 1000,
+            'stage_avg_ms': {stage: ms / shown for stage, ms in self._stage_ms.items()},
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        stages = ', '.join(f"{stage} {ms:.1f}" for stage, ms in s['stage_avg_ms'].items())
+        print(f"[INFO] Pipeline: {s['workers']} luồng nhận diện, camera {s['capture_fps']:.1f} fps, "
+              f"xử lý {s['processed_fps']:.1f} fps, bỏ {s['dropped_frames']} khung cũ.")
+        print(f"[INFO] Độ trễ camera -> hiển thị: trung bình {s['latency_avg_ms']:.1f} ms, "
+              f"tối đa {s['latency_max_ms']:.1f} ms. Thời gian từng bước (ms/khung): {stages}")
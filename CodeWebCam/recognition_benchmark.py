@@ -0,0 +1,205 @@
+"""
+Đo chi phí từng bước nhận diện trên dữ liệu khuôn mặt tổng hợp (không cần webcam, database hay ảnh thật):
+đọc ảnh + phát hiện khuôn mặt, huấn luyện LBPH, load mô hình (trainer.yml và artifact nhị phân),
+predict từng mặt (OpenCV) và so khớp theo lô (NumPy) ở nhiều kích thước gallery.
+
+    python recognition_benchmark.py
+    python recognition_benchmark.py --students 50,500,5000 --images 5 --json ket_qua.json
+
+Mỗi "sinh viên" tổng hợp là một mẫu nhiễu mịn cố định; mỗi ảnh của sinh viên đó được dịch, đổi độ sáng
+và thêm nhiễu ngẫu nhiên. Ảnh không giống mặt người nên Haar cascade không tìm thấy mặt: phần phát hiện chỉ đo
+thời gian quét, còn huấn luyện dùng trực tiếp ảnh tổng hợp. Kết quả JSON dùng để so sánh giữa các lần đo.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from face_engine import FaceEngine, load_recognizer
+from lbph_matcher import BatchLBPHMatcher, load_model, save_model
+from replay_benchmark import percentile
+from training_data import FACE_SIZE, load_face_samples
+
+
+def synthetic_faces(students, images, size=FACE_SIZE, seed=0, variant_seed=None):
+    """
+    Trả về (faces, labels): `images` ảnh xám uint8 cho mỗi nhãn 0..students-1.
+    Mẫu của từng sinh viên chỉ phụ thuộc `seed`; đổi `variant_seed` để có ảnh mới của cùng các sinh viên.
+    """
+    base_rng = np.random.default_rng(seed)
+    rng = np.random.default_rng(seed + 1 if variant_seed is None else variant_seed)
+    faces, labels = [], []
+    for label in range(students):
+        base = cv2.resize(base_rng.integers(0, 256, (12, 12), dtype=np.uint8), size, interpolation=cv2.INTER_CUBIC)
+        for _ in range(images):
+            faces.append(_variant(base, rng))
+            labels.append(label)
+    return faces, labels
+
+
+def _variant(base, rng):
+    """Một ảnh khác của cùng sinh viên: dịch vài pixel, đổi độ sáng, thêm nhiễu"""
+    dx, dy = rng.integers(-4, 5, size=2)
+    img = np.roll(base, (int(dy), int(dx)), axis=(0, 1)).astype(np.int16)
+    img += int(rng.integers(-20, 21))
+    img += rng.integers(-12, 13, size=img.shape, dtype=np.int16)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def bench_detection(cascade_path, frames=30, width=640, height=480, images=100, seed=0):
+    """Thời gian phát hiện trên khung hình và thông lượng đọc ảnh + phát hiện của bước huấn luyện"""
+    rng = np.random.default_rng(seed)
+    faces, _ = synthetic_faces(4, 1, seed=seed)
+    gray_frames = []
+    for _ in range(frames):
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (5, 5), 0)
+        x, y = int(rng.integers(0, width - FACE_SIZE[0])), int(rng.integers(0, height - FACE_SIZE[1]))
+        frame[y:y + FACE_SIZE[1], x:x + FACE_SIZE[0]] = faces[len(gray_frames) % len(faces)]
+        gray_frames.append(frame)
+
+    result = {'frame': f"{width}x{height}", 'frames': frames}
+    for scale in (1.0, 0.5):
+        engine = FaceEngine(None, cascade_path, {}, min_size=(0.1 * width, 0.1 * height), detect_scale=scale)
+        times = []
+        for gray in gray_frames:
+            _, elapsed = _timed(engine.detect, gray)
+            times.append(elapsed * 1000)
+        result[f"detect_ms_scale_{scale}"] = {'avg': sum(times) / len(times), 'p95': percentile(times, 95)}
+
+    # Bước đọc ảnh + phát hiện của 02_Face_Training.py (load_face_samples) trên ảnh JPEG ghi ra đĩa
+    temp_dir = tempfile.mkdtemp(prefix="recognition_benchmark_")
+    try:
+        tasks = []
+        for i in range(images):
+            path = os.path.join(temp_dir, f"{i}.jpg")
+            cv2.imwrite(path, cv2.resize(gray_frames[i % frames], (320, 240)))
+            tasks.append((path, 0))
+        _, _, _, stats = load_face_samples(tasks, cascade_path, workers=1, progress_every=0)
+        result['load_images'] = images
+        result['load_images_per_s'] = stats['images_per_s']
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return result
+
+
+def bench_gallery(students, images, queries, roster_size, seed=0):
+    """Huấn luyện, lưu, load và nhận diện với gallery `students` x `images` ảnh"""
+    faces, labels = synthetic_faces(students, images, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    query_labels = rng.integers(0, students, size=queries)
+    # Ảnh mới của cùng các sinh viên, không có trong tập huấn luyện
+    query_faces, _ = synthetic_faces(students, 1, seed=seed, variant_seed=seed + 1000)
+    query_faces = [query_faces[label] for label in query_labels]
+
+    result = {'students': students, 'images_per_student': images, 'samples': len(faces), 'queries': queries}
+    temp_dir = tempfile.mkdtemp(prefix="recognition_benchmark_")
+    try:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        _, result['train_s'] = _timed(recognizer.train, faces, np.array(labels))
+        del faces
+
+        model_path = os.path.join(temp_dir, "trainer.yml")
+        artifact_path = os.path.join(temp_dir, "model")
+        _, result['write_yml_s'] = _timed(recognizer.write, model_path)
+        result['yml_mb'] = os.path.getsize(model_path) / 1e6
+        _, result['save_artifact_s'] = _timed(save_model, BatchLBPHMatcher(recognizer), artifact_path,
+                                              source_path=model_path)
+        del recognizer
+
+        recognizer, result['load_yml_s'] = _timed(load_recognizer, model_path)
+        (matcher, _), result['load_artifact_s'] = _timed(load_model, artifact_path, model_path)
+
+        times = []
+        correct = 0
+        for face, label in zip(query_faces, query_labels):
+            (id_pred, _), elapsed = _timed(recognizer.predict, face)
+            times.append(elapsed * 1000)
+            correct += int(id_pred == label)
+        result['predict_opencv_ms'] = {'avg': sum(times) / len(times), 'p95': percentile(times, 95)}
+        result['accuracy'] = correct / queries
+
+        predictions, elapsed = _timed(matcher.predict_batch, query_faces)
+        result['predict_batch_ms_per_face'] = elapsed * 1000 / queries
+        result['batch_matches_opencv'] = all(
+            p[0] == recognizer.predict(face)[0] for p, face in zip(predictions[:10], query_faces[:10])
+        )
+
+        # Gallery của một lịch học: chỉ các sinh viên trong danh sách lớp
+        roster = set(range(min(roster_size, students)))
+        gallery, result['gallery_subset_s'] = _timed(matcher.subset, roster)
+        _, elapsed = _timed(gallery.predict_batch, query_faces)
+        result['gallery_size'] = len(roster)
+        result['predict_gallery_ms_per_face'] = elapsed * 1000 / queries
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return result
+
+
+def print_results(results):
+    d = results['detection']
+    print(f"[INFO] Phát hiện ({d['frame']}): {d['detect_ms_scale_1.0']['avg']:.1f} ms/khung, "
+          f"thu nhỏ 0.5: {d['detect_ms_scale_0.5']['avg']:.1f} ms/khung; "
+          f"đọc ảnh + phát hiện khi huấn luyện: {d['load_images_per_s']:.1f} ảnh/giây.")
+    print(f"{'SV':>6} {'mẫu':>7} {'train s':>8} {'yml MB':>7} {'load yml s':>10} {'load bin s':>10} "
+          f"{'opencv ms':>9} {'batch ms':>8} {'gallery ms':>10} {'acc':>5}")
+    for g in results['galleries']:
+        print(f"{g['students']:>6} {g['samples']:>7} {g['train_s']:>8.2f} {g['yml_mb']:>7.1f} "
+              f"{g['load_yml_s']:>10.3f} {g['load_artifact_s']:>10.3f} {g['predict_opencv_ms']['avg']:>9.2f} "
+              f"{g['predict_batch_ms_per_face']:>8.2f} {g['predict_gallery_ms_per_face']:>10.2f} "
+              f"{g['accuracy']:>5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phát hiện / huấn luyện / nhận diện với dữ liệu tổng hợp")
+    parser.add_argument("--students", default="50,200,1000",
+                        help="Các kích thước gallery (số sinh viên), cách nhau bởi dấu phẩy")
+    parser.add_argument("--images", type=int, default=5, help="Số ảnh mỗi sinh viên")
+    parser.add_argument("--queries", type=int, default=50, help="Số khuôn mặt cần nhận diện ở mỗi kích thước")
+    parser.add_argument("--roster-size", type=int, default=50, help="Số sinh viên của gallery một lịch học")
+    parser.add_argument("--cascade", default="haarcascade_frontalface_default.xml")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.students.split(",") if s.strip()]
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {'students': sizes, 'images': args.images, 'queries': args.queries,
+                   'roster_size': args.roster_size, 'seed': args.seed, 'face_size': list(FACE_SIZE)},
+        'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+    print("[INFO] Đo phát hiện khuôn mặt...")
+    results['detection'] = bench_detection(args.cascade, seed=args.seed)
+    results['galleries'] = []
+    for students in sizes:
+        print(f"[INFO] Đo gallery {students} sinh viên x {args.images} ảnh...")
+        results['galleries'].append(bench_gallery(students, args.images, args.queries, args.roster_size, args.seed))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Đã ghi kết quả vào {args.json}.")
+
+
+if __name__ == "__main__":
+    main()
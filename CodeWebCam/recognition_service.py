@@ -0,0 +1,302 @@
+"""
+Service điểm danh nhiều camera / nhiều phòng học cùng lúc.
+
+    [tiến trình camera 1] --\
+    [tiến trình camera 2] ----(hàng đợi sự kiện)--> [tiến trình chính: một AttendanceQueueWriter]
+    [tiến trình camera N] --/
+
+- Mỗi cặp (nguồn camera, MaLichHoc) chạy trong một tiến trình riêng: model LBPH và labels
+  được load đúng một lần cho mỗi tiến trình, dùng chung cho các luồng nhận diện bên trong.
+- Tiến trình camera không kết nối database; chỉ gửi sự kiện điểm danh về tiến trình chính.
+- Tiến trình chính mở phiên cho từng lịch học, ghi "Có mặt" qua một writer dùng chung và
+  kết thúc phiên (ghi vắng mặt, "Hoàn tất") ngay khi camera của lịch học đó dừng.
+
+File cấu hình (JSON):
+
+    {
+        "workers_per_stream": 1,
+        "streams": [
+            {"source": 0, "ma_lich_hoc": "LH01"},
+            {"source": "rtsp://10.0.0.12/stream1", "ma_lich_hoc": "LH02"}
+        ]
+    }
+"""
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+from datetime import datetime
+
+import cv2
+
+from attendance_session import close_session, load_roster, open_session, session_end_time
+from attendance_writer import AttendanceQueueWriter
+from evidence_writer import EvidenceWriter
+from face_engine import FaceEngine, load_labels, load_recognizer
+from lbph_matcher import load_gallery, load_matcher
+from pipeline import RecognitionPipeline
+from tracker import FaceTracker
+
+DEFAULT_OPTIONS = {
+    'model_path': "trainer/trainer.yml",
+    'artifact_path': "trainer/model",
+    'labels_path': "trainer/labels.json",
+    'cascade_path': "haarcascade_frontalface_default.xml",
+    'captured_dir': os.path.join(os.getcwd(), "Captured"),
+    'unknown_capture_interval': 5.0,
+    'max_unknown_captures': 50,
+    'confidence_threshold': 75,
+    'workers_per_stream': 1,
+    'face_tracking': True,
+    'track_votes': 3,
+    'detect_scale': 1.0,
+    'roi_detection': False,
+    'full_scan_interval': 10,
+    'recognizer_engine': 'opencv',
+    'gallery_mode': False,
+    'gallery_cache_dir': "trainer/gallery",
+    'width': 640,
+    'height': 480,
+}
+
+
+def load_config(config_path):
+    """
+    Đọc file cấu hình; trả về (options, streams).
+    Mỗi stream là dict có 'source' và 'ma_lich_hoc' (có thể ghi đè width/height riêng).
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    options = dict(DEFAULT_OPTIONS)
+    options.update({k: v for k, v in config.items() if k != 'streams'})
+
+    streams = config.get('streams') or []
+    seen = set()
+    for stream in streams:
+        if 'source' not in stream or not stream.get('ma_lich_hoc'):
+            raise ValueError(f"Cấu hình stream thiếu 'source' hoặc 'ma_lich_hoc': {stream}")
+        if stream['ma_lich_hoc'] in seen:
+            raise ValueError(f"Lịch học {stream['ma_lich_hoc']} xuất hiện nhiều lần trong cấu hình")
+        seen.add(stream['ma_lich_hoc'])
+    return options, streams
+
+
+def parse_source(source):
+    """Chỉ số webcam ("0", 1, ...) hoặc đường dẫn / URL video"""
+    if isinstance(source, int):
+        return source
+    source = str(source)
+    return int(source) if source.isdigit() else source
+
+
+def run_stream(stream, options, end_timestamp, events, stop_event):
+    """
+    Chạy trong tiến trình con: nhận diện một nguồn camera cho một lịch học tới khi hết giờ,
+    hết video hoặc có yêu cầu dừng. Gửi về `events`:
+        ('attendance', ma_lich_hoc, ma_sinh_vien, thoi_gian, file_path)
+        ('stopped', ma_lich_hoc, tổng kết)
+    """
+    ma_lich_hoc = stream['ma_lich_hoc']
+    summary = {'error': None}
+    cam = None
+    evidence = None
+    try:
+        id_to_name = load_labels(options['labels_path'])
+        if id_to_name is None:
+            raise RuntimeError("Không tìm thấy labels.json. Vui lòng huấn luyện trước.")
+
+        # Load model đúng một lần cho tiến trình này; chế độ gallery chỉ giữ sinh viên của lịch học
+        if options['gallery_mode']:
+            name_to_id = {name: label for label, name in id_to_name.items()}
+            labels = {name_to_id[ma_sv] for ma_sv in stream.get('roster', ()) if ma_sv in name_to_id}
+            recognizer = None
+            matcher, _ = load_gallery(options['model_path'], labels, options['gallery_cache_dir'],
+                                      artifact_path=options['artifact_path'])
+        elif options['recognizer_engine'] == 'batch':
+            recognizer = None
+            matcher, _ = load_matcher(options['model_path'], options['artifact_path'])
+        else:
+            recognizer = load_recognizer(options['model_path'])
+            matcher = None
+
+        cam = cv2.VideoCapture(parse_source(stream['source']))
+        if not cam.isOpened():
+            raise RuntimeError(f"Không thể mở nguồn camera {stream['source']}")
+        cam.set(3, stream.get('width', options['width']))
+        cam.set(4, stream.get('height', options['height']))
+
+        # Ảnh bằng chứng của mỗi lịch học nằm trong thư mục con riêng
+        captured_dir = os.path.join(options['captured_dir'], ma_lich_hoc)
+        os.makedirs(captured_dir, exist_ok=True)
+        evidence = EvidenceWriter(captured_dir, unknown_interval=options['unknown_capture_interval'],
+                                  max_unknowns=options['max_unknown_captures'])
+        evidence.start()
+
+        threshold = options['confidence_threshold']
+        tracker = (FaceTracker(confidence_threshold=threshold, votes_needed=options['track_votes'])
+                   if options['face_tracking'] else None)
+        engine = FaceEngine(
+            recognizer,
+            options['cascade_path'],
+            id_to_name,
+            min_size=(0.1 * cam.get(3), 0.1 * cam.get(4)),
+            confidence_threshold=threshold,
+            evidence=evidence,
+            tracker=tracker,
+            detect_scale=options['detect_scale'],
+            roi_detection=options['roi_detection'],
+            full_scan_interval=options['full_scan_interval'],
+            matcher=matcher,
+        )
+
+        pipeline = RecognitionPipeline(cam, engine, workers=options['workers_per_stream'])
+        pipeline.start()
+
+        processed_students = set()
+        try:
+            while not stop_event.is_set() and time.time() < end_timestamp:
+                result = pipeline.get_result(timeout=1.0)
+                if result is None:
+                    if not pipeline.is_alive():
+                        break
+                    continue
+
+                for face in result.faces:
+                    ma_sinh_vien = face.ma_sinh_vien
+                    if (face.confidence < threshold and ma_sinh_vien != "Unknown"
+                            and ma_sinh_vien not in processed_students):
+                        processed_students.add(ma_sinh_vien)
+                        events.put(('attendance', ma_lich_hoc, ma_sinh_vien, datetime.now(), face.file_path))
+        finally:
+            pipeline.stop()
+
+        summary.update(pipeline.summary())
+        summary['students'] = len(processed_students)
+        summary['detect'] = dict(engine.detect_stats)
+        if tracker:
+            summary['tracker'] = tracker.summary()
+    except KeyboardInterrupt:
+        pass  # Ctrl+C được gửi tới mọi tiến trình; tiến trình chính sẽ kết thúc phiên
+    except Exception as e:
+        summary['error'] = str(e)
+    finally:
+        if cam is not None:
+            cam.release()
+        if evidence is not None:
+            evidence.close()
+        events.put(('stopped', ma_lich_hoc, summary))
+
+
+class RecognitionService:
+    """Điều phối các tiến trình camera và một writer điểm danh dùng chung"""
+
+    def __init__(self, options, streams):
+        self.options = options
+        self.streams = streams
+        self._ctx = mp.get_context('spawn')  # không fork kết nối database / luồng của tiến trình chính
+        self._events = self._ctx.Queue()
+        self._stop_event = self._ctx.Event()
+        self._processes = {}  # ma_lich_hoc -> Process
+        self._rosters = {}    # ma_lich_hoc -> set sinh viên của lịch học
+        self._recorded = {}   # ma_lich_hoc -> set sinh viên đã có bản ghi DiemDanh
+        self.writer = AttendanceQueueWriter()
+
+    def _start_streams(self):
+        for stream in self.streams:
+            ma_lich_hoc = stream['ma_lich_hoc']
+            start_time = open_session(ma_lich_hoc)
+            if start_time is None:
+                print(f"[WARNING] Bỏ qua camera {stream['source']} (lịch học {ma_lich_hoc}).")
+                continue
+            try:
+                roster, recorded = load_roster(ma_lich_hoc)
+            except Exception as e:
+                print(f"[ERROR] Lỗi khi đọc danh sách sinh viên của lịch học {ma_lich_hoc}: {str(e)}")
+                continue
+            self._rosters[ma_lich_hoc] = roster
+            self._recorded[ma_lich_hoc] = recorded
+            self.writer.set_roster(ma_lich_hoc, roster)
+
+            end_timestamp = session_end_time(start_time).timestamp()
+            process = self._ctx.Process(
+                target=run_stream,
+                args=(dict(stream, roster=sorted(roster)), self.options, end_timestamp,
+                      self._events, self._stop_event),
+                name=f"Camera-{ma_lich_hoc}",
+                daemon=True,
+            )
+            process.start()
+            self._processes[ma_lich_hoc] = process
+            print(f"[INFO] Đã khởi động camera {stream['source']} cho lịch học {ma_lich_hoc} "
+                  f"(tiến trình {process.pid}).")
+
+    def _finish_stream(self, ma_lich_hoc, summary):
+        process = self._processes.pop(ma_lich_hoc)
+        process.join(timeout=5)
+
+        if summary.get('error'):
+            print(f"[ERROR] Camera của lịch học {ma_lich_hoc} dừng do lỗi: {summary['error']}")
+        elif 'processed_fps' in summary:
+            print(f"[INFO] Camera lịch học {ma_lich_hoc}: {summary['students']} sinh viên, "
+                  f"xử lý {summary['processed_fps']:.1f} fps, "
+                  f"độ trễ trung bình {summary['latency_avg_ms']:.1f} ms.")
+
+        # Ghi hết lượt "Có mặt" của phiên trước khi tính vắng mặt
+        self.writer.flush()
+        close_session(ma_lich_hoc)
+
+    def run(self):
+        self.writer.start()
+        self._start_streams()
+        if not self._processes:
+            print("[ERROR] Không có camera nào được khởi động.")
+
+        try:
+            while self._processes:
+                try:
+                    self._handle(self._events.get(timeout=1.0))
+                except queue.Empty:
+                    self._reap_crashed()
+        except KeyboardInterrupt:
+            print("[INFO] Đang dừng tất cả camera...")
+            self._stop_event.set()
+            self._drain()
+        finally:
+            self.writer.close()
+        print("[INFO] Service điểm danh đã dừng.")
+
+    def _handle(self, event):
+        kind, ma_lich_hoc = event[0], event[1]
+        if kind == 'attendance':
+            _, _, ma_sinh_vien, thoi_gian, file_path = event
+            recorded = self._recorded[ma_lich_hoc]
+            if ma_sinh_vien in recorded:
+                return  # đã điểm danh (kể cả trước khi service khởi động lại)
+            recorded.add(ma_sinh_vien)
+            if ma_sinh_vien not in self._rosters[ma_lich_hoc]:
+                print(f"[WARNING] Sinh viên {ma_sinh_vien} không thuộc lịch học {ma_lich_hoc}.")
+                return
+            self.writer.submit(ma_sinh_vien, thoi_gian, file_path, ma_lich_hoc=ma_lich_hoc)
+        elif kind == 'stopped' and ma_lich_hoc in self._processes:
+            self._finish_stream(ma_lich_hoc, event[2])
+
+    def _reap_crashed(self):
+        """Tiến trình chết mà không kịp gửi 'stopped' (ví dụ bị kill): vẫn kết thúc phiên của nó"""
+        for ma_lich_hoc, process in list(self._processes.items()):
+            if not process.is_alive():
+                # Có thể sự kiện 'stopped' đang trên đường tới: đọc nốt hàng đợi trước
+                self._drain(block=False)
+                if ma_lich_hoc in self._processes:
+                    self._finish_stream(ma_lich_hoc, {'error': f"tiến trình thoát với mã {process.exitcode}"})
+
+    def _drain(self, block=True):
+        """Xử lý hết sự kiện còn lại; block=True chờ mọi tiến trình camera dừng hẳn"""
+        while self._processes:
+            try:
+                self._handle(self._events.get(timeout=1.0 if block else 0.1))
+            except queue.Empty:
+                if not block:
+                    return
+                self._reap_crashed()
@@ -0,0 +1,293 @@
+"""
+Chạy lại video đã ghi hoặc thư mục ảnh qua đúng bước phát hiện + nhận diện của script điểm danh,
+không cần webcam và không hiển thị cửa sổ, để đo tốc độ (fps, thời gian từng bước) và độ chính xác.
+
+    python replay_benchmark.py --source lop_LH01.mp4 --truth lop_LH01.csv
+    python replay_benchmark.py --source anh_test/ --truth anh_test.csv --json ket_qua.json
+
+File ground truth (CSV, có dòng tiêu đề) gồm hai cột `frame,ma_sinh_vien`:
+- `frame` là số thứ tự khung hình (bắt đầu từ 1) với video, hoặc tên file ảnh với thư mục ảnh
+- mỗi sinh viên xuất hiện trong khung một dòng; khung không có ai thì bỏ qua hoặc để trống mã
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import cv2
+
+from evidence_writer import EvidenceWriter
+from face_engine import FaceEngine, load_labels, load_recognizer
+from lbph_matcher import load_matcher
+from tracker import FaceTracker
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class ImageDirCapture:
+    """Đọc lần lượt các ảnh trong thư mục (theo tên), dùng như cv2.VideoCapture"""
+
+    def __init__(self, path):
+        self.files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.path = path
+        self.index = 0
+        self.last_name = None
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.files)
+        return 0
+
+    def read(self):
+        while self.index < len(self.files):
+            name = self.files[self.index]
+            self.index += 1
+            img = cv2.imread(os.path.join(self.path, name))
+            if img is not None:
+                self.last_name = name
+                return True, img
+            print(f"[WARNING] Không đọc được ảnh {name}, bỏ qua.")
+        return False, None
+
+    def release(self):
+        self.files = []
+
+
+def open_source(source):
+    """Thư mục -> ImageDirCapture; còn lại (file video, URL) -> cv2.VideoCapture"""
+    if os.path.isdir(source):
+        return ImageDirCapture(source)
+    return cv2.VideoCapture(source)
+
+
+def load_ground_truth(truth_path):
+    """Đọc CSV ground truth, trả về dict khóa khung hình (str) -> set mã sinh viên"""
+    truth = {}
+    with open(truth_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            frame = (row.get('frame') or '').strip()
+            ma_sinh_vien = (row.get('ma_sinh_vien') or '').strip()
+            if not frame:
+                continue
+            students = truth.setdefault(frame, set())
+            if ma_sinh_vien:
+                students.add(ma_sinh_vien)
+    return truth
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def _ratio(a, b):
+    return a / b if b else 0.0
+
+
+def run_benchmark(capture, engine, truth=None, max_frames=None):
+    """
+    Xử lý tuần tự mọi khung hình (không bỏ khung như pipeline trực tiếp) và trả về dict kết quả.
+    truth: kết quả của load_ground_truth() hoặc None nếu chỉ đo tốc độ.
+    """
+    stage_ms = {}
+    frame_ms = []
+    identified = set()        # mã sinh viên được nhận diện ít nhất một lần
+    frame_hits = {'tp': 0, 'fp': 0, 'fn': 0}
+    frames = faces = 0
+    read_s = 0.0
+
+    started = time.perf_counter()
+    while max_frames is None or frames < max_frames:
+        r0 = time.perf_counter()
+        ret, img = capture.read()
+        read_s += time.perf_counter() - r0
+        if not ret:
+            break
+        frames += 1
+        key = getattr(capture, 'last_name', None) or str(frames)
+
+        timings = {}
+        f0 = time.perf_counter()
+        results = engine.process(img, timings)
+        frame_ms.append((time.perf_counter() - f0) * 1000)
+        for stage, ms in timings.items():
+            stage_ms.setdefault(stage, []).append(ms)
+        faces += len(results)
+
+        predicted = {face.ma_sinh_vien for face in results if face.ma_sinh_vien != "Unknown"}
+        identified |= predicted
+        if truth is not None:
+            expected = truth.get(key, set())
+            frame_hits['tp'] += len(predicted & expected)
+            frame_hits['fp'] += len(predicted - expected)
+            frame_hits['fn'] += len(expected - predicted)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'frames': frames,
+        'faces': faces,
+        'elapsed_s': elapsed,
+        'fps': _ratio(frames, elapsed),
+        'read_ms_avg': _ratio(read_s * 1000, frames),
+        'frame_ms': {
+            'avg': _ratio(sum(frame_ms), frames),
+            'p50': percentile(frame_ms, 50),
+            'p95': percentile(frame_ms, 95),
+            'max': max(frame_ms, default=0.0),
+        },
+        'stage_ms': {
+            stage: {'avg': _ratio(sum(v), len(v)), 'p95': percentile(v, 95)} for stage, v in stage_ms.items()
+        },
+        'identified': sorted(identified),
+        'detect': dict(engine.detect_stats),
+    }
+    if engine.tracker:
+        report['tracker'] = engine.tracker.summary()
+
+    if truth is not None:
+        # Theo khung: mỗi (khung, sinh viên) đúng/sai; theo phiên: ai được điểm danh có mặt
+        expected_all = set().union(*truth.values()) if truth else set()
+        tp = frame_hits['tp']
+        session_tp = len(identified & expected_all)
+        report['accuracy'] = {
+            'frame_precision': _ratio(tp, tp + frame_hits['fp']),
+            'frame_recall': _ratio(tp, tp + frame_hits['fn']),
+            **frame_hits,
+            'session_precision': _ratio(session_tp, len(identified)),
+            'session_recall': _ratio(session_tp, len(expected_all)),
+            'false_students': sorted(identified - expected_all),
+            'missed_students': sorted(expected_all - identified),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"[INFO] {report['frames']} khung, {report['faces']} khuôn mặt trong {report['elapsed_s']:.2f} s "
+          f"-> {report['fps']:.1f} fps (đọc khung {report['read_ms_avg']:.1f} ms/khung).")
+    f = report['frame_ms']
+    print(f"[INFO] Xử lý mỗi khung: trung bình {f['avg']:.1f} ms, p50 {f['p50']:.1f} ms, "
+          f"p95 {f['p95']:.1f} ms, tối đa {f['max']:.1f} ms.")
+    for stage, s in report['stage_ms'].items():
+        print(f"[INFO]   {stage}: trung bình {s['avg']:.2f} ms, p95 {s['p95']:.2f} ms")
+    d = report['detect']
+    if d['roi_scans']:
+        print(f"[INFO] Phát hiện: {d['full_scans']} lần quét toàn khung, {d['roi_scans']} lần quét theo vùng "
+              f"(trung bình {d['roi_pixels_pct']:.0f}% diện tích khung).")
+    if 'tracker' in report:
+        t = report['tracker']
+        print(f"[INFO] Tracker: {t['predict_calls']}/{t['faces_seen']} lần predict "
+              f"(bỏ qua {t['predict_saved_pct']:.0f}%).")
+
+    acc = report.get('accuracy')
+    if acc:
+        print(f"[INFO] Theo khung: precision {acc['frame_precision']:.3f}, recall {acc['frame_recall']:.3f} "
+              f"(đúng {acc['tp']}, nhận nhầm {acc['fp']}, bỏ sót {acc['fn']}).")
+        print(f"[INFO] Theo phiên: precision {acc['session_precision']:.3f}, "
+              f"recall {acc['session_recall']:.3f}.")
+        if acc['false_students']:
+            print(f"[WARNING] Nhận nhầm (không có trong ground truth): {', '.join(acc['false_students'])}")
+        if acc['missed_students']:
+            print(f"[WARNING] Không nhận diện được: {', '.join(acc['missed_students'])}")
+    else:
+        print(f"[INFO] Đã nhận diện {len(report['identified'])} sinh viên.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo tốc độ và độ chính xác nhận diện trên video / thư mục ảnh")
+    parser.add_argument("--source", required=True, help="File video hoặc thư mục ảnh")
+    parser.add_argument("--truth", help="File CSV ground truth (frame,ma_sinh_vien)")
+    parser.add_argument("--model", default="trainer/trainer.yml")
+    parser.add_argument("--artifact", default="trainer/model",
+                        help="Artifact nhị phân (không có đuôi) cho --engine batch; bỏ qua nếu cũ hơn --model")
+    parser.add_argument("--labels", default="trainer/labels.json")
+    parser.add_argument("--cascade", default="haarcascade_frontalface_default.xml")
+    parser.add_argument("--confidence", type=float, default=75)
+    parser.add_argument("--tracking", action="store_true", help="Bật theo dõi khuôn mặt như khi điểm danh")
+    parser.add_argument("--track-votes", type=int, default=3)
+    parser.add_argument("--detect-scale", type=float, default=1.0, help="Thu nhỏ khung trước khi phát hiện (vd 0.5)")
+    parser.add_argument("--roi", action="store_true", help="Chỉ tìm quanh khuôn mặt cũ, quét toàn khung định kỳ")
+    parser.add_argument("--full-scan-interval", type=int, default=10)
+    parser.add_argument("--engine", choices=("opencv", "batch"), default="opencv",
+                        help="opencv: recognizer.predict từng mặt; batch: so khớp NumPy cả khung một lượt")
+    parser.add_argument("--max-frames", type=int, help="Chỉ xử lý tối đa ngần này khung")
+    parser.add_argument("--save-captures", help="Lưu ảnh khuôn mặt vào thư mục này (mặc định: không lưu)")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    id_to_name = load_labels(args.labels)
+    if id_to_name is None:
+        print("Không tìm thấy labels.json. Vui lòng huấn luyện trước.")
+        return
+
+    t0 = time.perf_counter()
+    model_source = 'yml'
+    if args.engine == "batch":
+        recognizer = None
+        matcher, model_source = load_matcher(args.model, args.artifact)
+    else:
+        recognizer = load_recognizer(args.model)
+        matcher = None
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    capture = open_source(args.source)
+    if not capture.isOpened():
+        print(f"[ERROR] Không thể mở nguồn {args.source}.")
+        return
+
+    # Giống 03_Face_Recognization.py: mặt nhỏ hơn 10% khung hình bị bỏ qua
+    ret, first = capture.read()
+    if not ret:
+        print(f"[ERROR] Nguồn {args.source} không có khung hình nào.")
+        return
+    capture.release()
+    capture = open_source(args.source)
+    height, width = first.shape[:2]
+
+    evidence = None
+    if args.save_captures:
+        os.makedirs(args.save_captures, exist_ok=True)
+        evidence = EvidenceWriter(args.save_captures)
+        evidence.start()
+    tracker = FaceTracker(confidence_threshold=args.confidence, votes_needed=args.track_votes) if args.tracking else None
+    engine = FaceEngine(
+        recognizer,
+        args.cascade,
+        id_to_name,
+        min_size=(0.1 * width, 0.1 * height),
+        confidence_threshold=args.confidence,
+        evidence=evidence,
+        tracker=tracker,
+        detect_scale=args.detect_scale,
+        roi_detection=args.roi,
+        full_scan_interval=args.full_scan_interval,
+        matcher=matcher,
+    )
+
+    truth = load_ground_truth(args.truth) if args.truth else None
+    print(f"[INFO] Đã load model ({model_source}) trong {load_ms:.1f} ms. Bắt đầu chạy lại {args.source} ({width}x{height}).")
+    report = run_benchmark(capture, engine, truth, args.max_frames)
+    capture.release()
+    if evidence is not None:
+        evidence.close()
+
+    report['source'] = args.source
+    report['engine'] = args.engine
+    report['model_load_ms'] = load_ms
+    report['model_source'] = model_source
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Đã ghi kết quả vào {args.json}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Theo dõi khuôn mặt qua các khung hình (ghép theo IoU, dự phòng theo khoảng cách tâm)
+để chỉ chạy recognizer.predict vài lần cho mỗi người thay vì ở mọi khung hình.
+
+Mỗi track gom phiếu từ các lần predict; khi một mã sinh viên đủ phiếu thì track được
+coi là đã nhận diện và chỉ predict lại mỗi `verify_interval` khung để kiểm tra: kết quả không
+khớp nhãn (người khác bước vào đúng chỗ cũ) thì track mất nhãn và bỏ phiếu lại từ đầu.
+Track chỉ được ghép với khuôn mặt mới nếu vừa được thấy gần đây (`max_missed` khung), riêng
+ghép theo khoảng cách tâm chỉ áp dụng cho track thấy ở khung ngay trước.
+"""
+import threading
+from collections import defaultdict
+
+
+def iou(a, b):
+    """Tỉ lệ giao/hợp của hai box (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def center_distance(a, b):
+    """Khoảng cách tâm hai box, chia cho chiều rộng trung bình (để không phụ thuộc kích thước mặt)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    return (dx * dx + dy * dy) ** 0.5 / max((aw + bw) / 2, 1)
+
+
+class Track:
+    def __init__(self, track_id, box, frame_no):
+        self.track_id = track_id
+        self.box = box
+        self.first_seen = frame_no
+        self.last_seen = frame_no
+        self.predictions = 0
+        self.last_predicted = None
+        self.last_id_pred = -1
+        self.last_confidence = float('inf')
+        self.votes = defaultdict(int)            # id_pred -> số phiếu tin cậy
+        self.confidence_sum = defaultdict(float)  # id_pred -> tổng confidence của các phiếu
+        self.label = None                         # id_pred khi đã nhận diện xong
+        self.confidence = float('inf')
+        self.evidence_path = None
+        self.pending = False                      # đang có một lần predict chưa trả kết quả
+
+    def reset_votes(self):
+        self.predictions = 0
+        self.votes.clear()
+        self.confidence_sum.clear()
+        self.label = None
+        self.confidence = float('inf')
+        self.evidence_path = None
+
+    @property
+    def identified(self):
+        return self.label is not None
+
+
+class FaceTracker:
+    """
+    iou_threshold      : IoU tối thiểu để ghép box mới với track cũ
+    max_center_dist    : nếu IoU thấp, vẫn ghép khi tâm lệch ít hơn ngần này (theo chiều rộng mặt),
+                         chỉ với track thấy ở khung ngay trước
+    max_missed         : số khung liên tiếp không thấy trước khi xóa track (track đã mất dấu lâu hơn
+                         không được ghép với khuôn mặt mới)
+    votes_needed       : số phiếu tin cậy cho cùng một mã để chốt nhận diện
+    min_vote_ratio     : tỉ lệ phiếu tối thiểu của mã thắng so với tổng số lần predict
+    max_predictions    : sau ngần này lần mà chưa chốt được thì chỉ predict lại mỗi `retry_interval` khung
+    verify_interval    : track đã nhận diện được predict lại mỗi ngần này khung để kiểm tra nhãn
+
+    Một "khung" là một lần gọi update(); khi nhiều luồng dùng chung tracker, update() phải được gọi
+    theo thứ tự khung (FaceEngine.process(..., ordered=...) với pipeline.FrameOrder).
+    """
+
+    def __init__(self, confidence_threshold=75, iou_threshold=0.3, max_center_dist=0.5, max_missed=2,
+                 votes_needed=3, min_vote_ratio=0.6, max_predictions=10, retry_interval=5, verify_interval=15):
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.max_center_dist = max_center_dist
+        self.max_missed = max_missed
+        self.votes_needed = votes_needed
+        self.min_vote_ratio = min_vote_ratio
+        self.max_predictions = max_predictions
+        self.retry_interval = retry_interval
+        self.verify_interval = max(1, int(verify_interval))
+
+        self.tracks = {}
+        self._next_id = 1
+        self._frame_no = 0
+        self._lock = threading.Lock()
+
+        self.faces_seen = 0
+        self.predict_calls = 0
+
+    def update(self, boxes):
+        """
+        Ghép các box của khung hình mới với track hiện có, tạo track mới cho box chưa ghép được
+        và xóa track đã mất dấu. Trả về danh sách track theo đúng thứ tự `boxes`.
+        """
+        with self._lock:
+            self._frame_no += 1
+            frame_no = self._frame_no
+            self.faces_seen += len(boxes)
+
+            # Ghép tham lam theo IoU giảm dần, rồi đến khoảng cách tâm tăng dần
+            candidates = []
+            for i, box in enumerate(boxes):
+                for track in self.tracks.values():
+                    if frame_no - track.last_seen > self.max_missed:
+                        continue
+                    overlap = iou(box, track.box)
+                    if overlap >= self.iou_threshold:
+                        candidates.append((0, -overlap, i, track.track_id))
+                    elif frame_no - track.last_seen == 1:
+                        dist = center_distance(box, track.box)
+                        if dist <= self.max_center_dist:
+                            candidates.append((1, dist, i, track.track_id))
+            candidates.sort()
+
+            assigned = [None] * len(boxes)
+            used_tracks = set()
+            for _, _, i, track_id in candidates:
+                if assigned[i] is None and track_id not in used_tracks:
+                    assigned[i] = self.tracks[track_id]
+                    used_tracks.add(track_id)
+
+            for i, box in enumerate(boxes):
+                track = assigned[i]
+                if track is None:
+                    track = Track(self._next_id, box, frame_no)
+                    self.tracks[track.track_id] = track
+                    self._next_id += 1
+                    assigned[i] = track
+                track.box = box
+                track.last_seen = frame_no
+
+            for track_id in [t.track_id for t in self.tracks.values()
+                             if frame_no - t.last_seen > self.max_missed]:
+                del self.tracks[track_id]
+
+            return assigned
+
+    def needs_prediction(self, track):
+        """Track còn cần chạy predict ở khung hình hiện tại không"""
+        if track.pending:
+            return False
+        if track.identified:
+            return track.last_seen - track.last_predicted >= self.verify_interval
+        if track.predictions < self.max_predictions:
+            return True
+        return track.last_seen - track.last_predicted >= self.retry_interval
+
+    def add_prediction(self, track, id_pred, confidence):
+        """Ghi nhận một kết quả predict; chốt nhãn khi đủ phiếu, bỏ nhãn nếu lần kiểm tra lại không khớp"""
+        with self._lock:
+            self.predict_calls += 1
+            track.pending = False
+            if track.identified:
+                if id_pred == track.label and confidence < self.confidence_threshold:
+                    track.last_predicted = track.last_seen
+                    track.last_id_pred = id_pred
+                    track.last_confidence = confidence
+                    return
+                track.reset_votes()
+            track.predictions += 1
+            track.last_predicted = track.last_seen
+            track.last_id_pred = id_pred
+            track.last_confidence = confidence
+            if confidence >= self.confidence_threshold:
+                return
+
+            track.votes[id_pred] += 1
+            track.confidence_sum[id_pred] += confidence
+            best = max(track.votes, key=track.votes.get)
+            votes = track.votes[best]
+            if votes >= self.votes_needed and votes / track.predictions >= self.min_vote_ratio:
+                track.label = best
+                track.confidence = track.confidence_sum[best] / votes
+
+    def summary(self):
+        saved = self.faces_seen - self.predict_calls
+        ratio = saved / self.faces_seen * 100 if self.faces_seen else 0.0
+        return {
+            'faces_seen': self.faces_seen,
+            'predict_calls': self.predict_calls,
+            'predict_saved_pct': ratio,
+            'tracks_created': self._next_id - 1,
+        }
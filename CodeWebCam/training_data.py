@@ -0,0 +1,274 @@
+"""
+Đọc ảnh + phát hiện khuôn mặt cho bước huấn luyện, chia cho nhiều tiến trình.
+
+Mỗi tiến trình con có CascadeClassifier riêng; ảnh được gửi theo từng cụm (chunk)
+để giảm chi phí trao đổi giữa các tiến trình. Kết quả trả về theo đúng thứ tự đầu vào
+nên mô hình huấn luyện ra giống hệt khi chạy tuần tự.
+
+Cache khuôn mặt đã xử lý: mỗi thư mục sinh viên có `_face_cache.npy` (mảng uint8 N x 200 x 200,
+đọc bằng memory-map) và `_face_cache.json` (tên ảnh -> mtime, size, vị trí trong mảng). Lần huấn luyện
+sau chỉ đọc mảng này thay vì giải mã JPEG và chạy lại cascade; ảnh mới hoặc bị sửa mới phải xử lý lại.
+
+Manifest huấn luyện (trainer/manifest.json) ghi lại mỗi ảnh đã dùng để huấn luyện:
+đường dẫn -> {mtime, size, label, faces}, để lần sau chỉ cần update() với ảnh mới.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+FACE_SIZE = (200, 200)
+CACHE_ARRAY = '_face_cache.npy'
+CACHE_INDEX = '_face_cache.json'
+
+_detector = None
+
+
+def _init_worker(cascade_path):
+    global _detector
+    cv2.setNumThreads(1)  # song song theo tiến trình, tránh mỗi tiến trình lại mở thêm luồng OpenCV
+    _detector = cv2.CascadeClassifier(cascade_path)
+
+
+def list_images(folder_path):
+    """Các file ảnh trong thư mục của một sinh viên (theo tên)"""
+    return [
+        os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path))
+        if f.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(folder_path, f))
+    ]
+
+
+def detect_faces(img_path):
+    """Đọc ảnh xám, phát hiện khuôn mặt và trả về các mặt đã resize về FACE_SIZE"""
+    PIL_img = Image.open(img_path).convert('L')  # grayscale
+    img_numpy = np.array(PIL_img, 'uint8')
+    faces = _detector.detectMultiScale(img_numpy)
+    return [cv2.resize(img_numpy[y:y+h, x:x+w], FACE_SIZE) for (x, y, w, h) in faces]
+
+
+def _process_chunk(tasks):
+    """tasks: [(đường dẫn ảnh, nhãn)] -> [(nhãn, [mặt], lỗi hoặc None)]"""
+    results = []
+    for img_path, label in tasks:
+        try:
+            results.append((label, detect_faces(img_path), None))
+        except Exception as e:
+            results.append((label, [], f"Lỗi đọc ảnh {img_path}: {e}"))
+    return results
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_face_samples(tasks, cascade_path, workers=None, chunk_size=32, progress_every=5.0):
+    """
+    Chạy phát hiện khuôn mặt cho danh sách (đường dẫn ảnh, nhãn).
+    workers=None dùng toàn bộ nhân CPU; workers=1 chạy tuần tự trong tiến trình hiện tại.
+    Trả về (faces, ids, image_faces, stats); image_faces: đường dẫn -> số mặt của các ảnh đọc được.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = list(_chunks(tasks, max(1, chunk_size)))
+    faces, ids = [], []
+    image_faces = {}
+    stats = {'images': len(tasks), 'faces': 0, 'no_face': 0, 'errors': 0, 'workers': workers}
+
+    started = time.perf_counter()
+    last_report = started
+    done = 0
+
+    if workers == 1:
+        _init_worker(cascade_path)
+        results_iter = map(_process_chunk, chunks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cascade_path,))
+        results_iter = executor.map(_process_chunk, chunks)  # giữ thứ tự đầu vào
+
+    try:
+        for chunk, chunk_results in zip(chunks, results_iter):
+            for (img_path, _), (label, chunk_faces, error) in zip(chunk, chunk_results):
+                done += 1
+                if error:
+                    stats['errors'] += 1
+                    print(f"[ERROR] {error}")
+                    continue
+                if not chunk_faces:
+                    stats['no_face'] += 1
+                image_faces[img_path] = len(chunk_faces)
+                faces.extend(chunk_faces)
+                ids.extend([label] * len(chunk_faces))
+
+            now = time.perf_counter()
+            if progress_every and now - last_report >= progress_every:
+                last_report = now
+                print(f"[INFO] Đã xử lý {done}/{len(tasks)} ảnh ({done / (now - started):.1f} ảnh/giây)...")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    stats['faces'] = len(faces)
+    stats['elapsed_s'] = time.perf_counter() - started
+    stats['images_per_s'] = len(tasks) / stats['elapsed_s'] if stats['elapsed_s'] > 0 else 0.0
+    return faces, ids, image_faces, stats
+
+
+def file_signature(path):
+    """(mtime, size) của file: đổi nội dung hoặc chép đè đều làm chữ ký thay đổi"""
+    st = os.stat(path)
+    return round(st.st_mtime, 3), st.st_size
+
+
+def load_manifest(manifest_path):
+    """Đọc manifest; trả về dict đường dẫn -> thông tin ảnh, hoặc None nếu chưa có"""
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f).get('images', {})
+
+
+def save_manifest(manifest_path, images):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({'version': 1, 'images': images}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def manifest_entry(img_path, label, faces):
+    mtime, size = file_signature(img_path)
+    return {'mtime': mtime, 'size': size, 'label': label, 'faces': faces}
+
+
+def diff_manifest(tasks, manifest):
+    """
+    So danh sách ảnh hiện tại (đường dẫn, nhãn) với manifest.
+    Trả về (ảnh mới cần huấn luyện thêm, danh sách ảnh đã bị xóa/sửa/đổi nhãn).
+    Ảnh bị xóa hoặc sửa không thể gỡ khỏi mô hình LBPH nên buộc phải huấn luyện lại từ đầu.
+    """
+    new_tasks = []
+    changed = []
+    current = set()
+    for img_path, label in tasks:
+        current.add(img_path)
+        entry = manifest.get(img_path)
+        if entry is None:
+            new_tasks.append((img_path, label))
+        elif entry['label'] != label or (entry['mtime'], entry['size']) != file_signature(img_path):
+            changed.append(img_path)
+    changed.extend(path for path, entry in manifest.items() if path not in current and entry['faces'])
+    return new_tasks, changed
+
+
+def load_face_cache(folder_path):
+    """
+    Đọc cache của một thư mục sinh viên; trả về (mảng memory-map, index) hoặc (None, {}).
+    index: tên ảnh -> {mtime, size, start, count}
+    """
+    array_path = os.path.join(folder_path, CACHE_ARRAY)
+    index_path = os.path.join(folder_path, CACHE_INDEX)
+    if not (os.path.exists(array_path) and os.path.exists(index_path)):
+        return None, {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if tuple(index.get('face_size', ())) != FACE_SIZE:
+            return None, {}
+        return np.load(array_path, mmap_mode='r'), index['images']
+    except Exception as e:
+        print(f"[WARNING] Bỏ qua cache hỏng trong {folder_path}: {e}")
+        return None, {}
+
+
+def save_face_cache(folder_path, image_faces):
+    """image_faces: [(đường dẫn ảnh, [mặt])] theo thứ tự ảnh -> ghi lại cache của thư mục"""
+    images = {}
+    arrays = []
+    start = 0
+    for img_path, faces in image_faces:
+        mtime, size = file_signature(img_path)
+        images[os.path.basename(img_path)] = {'mtime': mtime, 'size': size, 'start': start, 'count': len(faces)}
+        arrays.extend(faces)
+        start += len(faces)
+    data = np.stack(arrays).astype(np.uint8) if arrays else np.zeros((0,) + FACE_SIZE, np.uint8)
+
+    array_path = os.path.join(folder_path, CACHE_ARRAY)
+    index_path = os.path.join(folder_path, CACHE_INDEX)
+    np.save(array_path + ".tmp.npy", data)
+    os.replace(array_path + ".tmp.npy", array_path)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({'version': 1, 'face_size': list(FACE_SIZE), 'images': images}, f)
+    os.replace(index_path + ".tmp", index_path)
+
+
+def load_training_faces(tasks, cascade_path, workers=None, chunk_size=32, use_cache=True):
+    """
+    Như load_face_samples() nhưng lấy khuôn mặt từ cache khi ảnh chưa thay đổi,
+    chỉ đưa ảnh mới/bị sửa vào process pool, rồi cập nhật cache của các thư mục đó.
+    Trả về (faces, ids, image_faces, stats) theo đúng thứ tự `tasks`.
+    """
+    started = time.perf_counter()
+    hits = {}        # đường dẫn -> (thư mục, start, count)
+    misses = []
+    caches = {}      # thư mục -> (mảng, index)
+
+    for img_path, label in tasks:
+        if not use_cache:
+            misses.append((img_path, label))
+            continue
+        folder = os.path.dirname(img_path)
+        if folder not in caches:
+            caches[folder] = load_face_cache(folder)
+        array, index = caches[folder]
+        entry = index.get(os.path.basename(img_path))
+        if array is not None and entry and (entry['mtime'], entry['size']) == file_signature(img_path):
+            hits[img_path] = (folder, entry['start'], entry['count'])
+        else:
+            misses.append((img_path, label))
+
+    # Thư mục có ảnh mới/bị sửa sẽ được ghi lại cache: chép phần đã cache ra khỏi memory-map
+    # (trên Windows không thể thay file đang được map)
+    dirty = {os.path.dirname(p) for p, _ in misses} if use_cache else set()
+    per_image = {}
+    for img_path, (folder, start, count) in hits.items():
+        rows = caches[folder][0][start:start + count]
+        per_image[img_path] = [np.array(r) for r in rows] if folder in dirty else list(rows)
+    for folder in dirty:
+        caches.pop(folder, None)
+
+    stats = {'images': len(tasks), 'cache_hits': len(hits), 'cache_misses': len(misses),
+             'no_face': sum(1 for _, _, count in hits.values() if count == 0), 'errors': 0,
+             'workers': workers or os.cpu_count() or 1}
+    if misses:
+        miss_faces, _, miss_counts, miss_stats = load_face_samples(misses, cascade_path, workers, chunk_size)
+        stats['no_face'] += miss_stats['no_face']
+        stats['errors'] = miss_stats['errors']
+        pos = 0
+        for img_path, _ in misses:
+            if img_path in miss_counts:  # ảnh lỗi không có trong miss_counts
+                n = miss_counts[img_path]
+                per_image[img_path] = miss_faces[pos:pos + n]
+                pos += n
+
+    for folder in dirty:
+        try:
+            save_face_cache(folder, [(p, per_image[p]) for p in list_images(folder) if p in per_image])
+        except Exception as e:
+            print(f"[WARNING] Không ghi được cache khuôn mặt cho {folder}: {e}")
+
+    faces, ids, image_faces = [], [], {}
+    for img_path, label in tasks:
+        if img_path in per_image:
+            faces.extend(per_image[img_path])
+            ids.extend([label] * len(per_image[img_path]))
+            image_faces[img_path] = len(per_image[img_path])
+
+    stats['faces'] = len(faces)
+    stats['elapsed_s'] = time.perf_counter() - started
+    stats['images_per_s'] = len(tasks) / stats['elapsed_s'] if stats['elapsed_s'] > 0 else 0.0
+    return faces, ids, image_faces, stats